@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, Category, BlogPost, Product, Review, Order, Artist
+from .models import UserProfile, Category, BlogPost, Product, Review, Order, OrderItem, DailySalesRollup, Artist
 
 
 @admin.register(UserProfile)
@@ -42,12 +42,29 @@ class ReviewAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    fields = ('product', 'seller', 'title', 'unit_price', 'quantity', 'category')
+    readonly_fields = fields
+    can_delete = False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('order_id', 'buyer', 'total_amount', 'status', 'created_at')
     list_filter = ('status', 'created_at', 'payment_method')
     search_fields = ('order_id', 'buyer__email')
     readonly_fields = ('order_id', 'created_at', 'updated_at')
+    inlines = [OrderItemInline]
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    list_display = ('date', 'category', 'seller', 'church', 'location', 'revenue', 'order_count')
+    list_filter = ('date', 'category')
+    search_fields = ('church', 'location', 'seller__email')
+    readonly_fields = ('date', 'seller', 'category', 'church', 'location', 'revenue', 'order_count')
 
 
 @admin.register(Artist)
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ApiConfig(AppConfig):
@@ -7,3 +8,5 @@ class ApiConfig(AppConfig):
     
     def ready(self):
         import api.signals
+        from api.search import ensure_search_triggers
+        post_migrate.connect(ensure_search_triggers, sender=self)
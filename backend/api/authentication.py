@@ -0,0 +1,173 @@
+"""
+Authentication that resolves the user's profile together with the user.
+
+ProfileJWTAuthentication loads ``User`` and ``UserProfile`` in one joined
+query, so ``request.user.profile`` (role, home church, location) is already
+in memory for permission checks and role branching. Tokens carry those
+profile fields as claims, refreshed whenever the access token is.
+
+With ``JWT_STATELESS_AUTH`` enabled, access tokens are validated purely in
+process (signature and expiry) and ``request.user`` is a lazy TokenUser:
+its id and home church/location claims are available immediately, and the
+user row is only read, together with the profile, when a view touches
+another field. Deactivation and password changes then take effect when the
+access token expires instead of on the next request. The role claim is not
+trusted in this mode: it decides what a user may see, so it is always read
+from the profile and a role change applies at once.
+
+Chat WebSockets authenticate the same access token, read from the
+``jwt-auth`` cookie or a ``?token=`` query parameter, through
+JWTWebSocketMiddleware.
+"""
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.utils.translation import gettext_lazy as _
+from dj_rest_auth.jwt_auth import CookieTokenRefreshSerializer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import TokenUser, UserProfile
+
+PROFILE_CLAIMS = ('role', 'home_church', 'location')
+# Claims a stateless request may use without loading the profile; only for listings, never access checks
+HINT_CLAIMS = ('home_church', 'location')
+
+
+def get_profile(user):
+    """user.profile without a query when it was loaded with the user, creating it for legacy users"""
+    if isinstance(user, TokenUser) and not user.is_loaded:
+        user.load()
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        user.profile = profile
+        return profile
+
+
+def profile_claim(user, name):
+    """A profile field from the token claims for stateless users (HINT_CLAIMS only), otherwise from the profile"""
+    claims = getattr(user, 'claims', None)
+    if claims is not None and name in claims:
+        return claims[name]
+    return getattr(get_profile(user), name)
+
+
+def _set_profile_claims(token, profile):
+    for claim in PROFILE_CLAIMS:
+        token[claim] = getattr(profile, claim)
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that fetches the user and profile in a single query"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        if getattr(settings, 'JWT_STATELESS_AUTH', False):
+            # simplejwt stores the id as a string; ownership checks compare it with integer foreign keys
+            try:
+                user_id = self.user_model._meta.pk.to_python(user_id)
+            except ValidationError as e:
+                raise InvalidToken(_("Token contained no recognizable user identification")) from e
+            claims = {claim: validated_token[claim] for claim in HINT_CLAIMS if claim in validated_token}
+            return TokenUser.from_claims(user_id, claims)
+
+        try:
+            user = self.user_model.objects.select_related('profile').get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+        return user
+
+
+class ProfileTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Token pair whose claims include the user's role, home church and location"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        _set_profile_claims(token, get_profile(user))
+        return token
+
+
+class ProfileRefreshToken(RefreshToken):
+    """Refresh token that re-reads the profile claims whenever it issues an access token"""
+
+    @property
+    def access_token(self):
+        profile = UserProfile.objects.filter(user_id=self.payload.get(api_settings.USER_ID_CLAIM)).first()
+        if profile is not None:
+            # Also updates this token, so a rotated refresh token carries the new values
+            _set_profile_claims(self, profile)
+        return super().access_token
+
+
+class ProfileTokenRefreshSerializer(CookieTokenRefreshSerializer):
+    token_class = ProfileRefreshToken
+
+
+def _websocket_token(scope):
+    query = parse_qs(scope.get('query_string', b'').decode())
+    if query.get('token'):
+        return query['token'][0]
+    cookie_name = getattr(settings, 'REST_AUTH', {}).get('JWT_AUTH_COOKIE')
+    for name, value in scope.get('headers', ()):
+        if name == b'cookie' and cookie_name:
+            morsel = SimpleCookie(value.decode('latin-1')).get(cookie_name)
+            if morsel is not None:
+                return morsel.value
+    return None
+
+
+@database_sync_to_async
+def _websocket_user(raw_token):
+    authentication = ProfileJWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    if isinstance(user, TokenUser):
+        # Load the row now, in this thread, so the async consumer never hits a deferred field
+        try:
+            user.load()
+        except PermissionDenied:
+            return None
+    return user
+
+
+class JWTWebSocketMiddleware:
+    """Sets scope['user'] from a JWT access token when the session did not authenticate the socket"""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        user = scope.get('user')
+        if user is None or not user.is_authenticated:
+            raw_token = _websocket_token(scope)
+            resolved = await _websocket_user(raw_token) if raw_token else None
+            if resolved is not None:
+                scope = dict(scope, user=resolved)
+        return await self.inner(scope, receive, send)
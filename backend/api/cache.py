@@ -0,0 +1,163 @@
+"""
+Versioned response caching for anonymous, read-only catalog endpoints.
+
+Every cached response key embeds version numbers for the data it was built
+from: the ViewSet model's list version (or, for detail responses, the
+object's own version) plus one version per dependency model. Saving or
+deleting a row bumps its object and model versions, so only entries built
+from that data stop matching. Stale entries are never deleted; they expire
+with their TTL.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+VERSION_PREFIX = 'respver'
+RESPONSE_PREFIX = 'resp'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _record(basename, outcome):
+    from .metrics import response_cache_lookups  # metrics imports this module
+    with _stats_lock:
+        _stats[(basename, outcome)] += 1
+    response_cache_lookups.inc(viewset=basename, outcome=outcome)
+
+
+def response_cache_stats():
+    """Hit/miss/error counters for this worker process, grouped by ViewSet"""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    report = {}
+    for (basename, outcome), count in snapshot.items():
+        entry = report.setdefault(basename, {'hits': 0, 'misses': 0, 'errors': 0})
+        entry[outcome] += count
+    for entry in report.values():
+        lookups = entry['hits'] + entry['misses']
+        entry['hit_ratio'] = round(entry['hits'] / lookups, 4) if lookups else None
+    return report
+
+
+def reset_response_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def get_redis_client():
+    """Raw client behind the default cache, or None when it is not django-redis"""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def version_key(model, pk=None):
+    key = f'{VERSION_PREFIX}:{model._meta.label_lower}'
+    return key if pk is None else f'{key}:{pk}'
+
+
+def _fresh_version():
+    # Time-based so a version evicted from Redis never restarts below an old value
+    return time.time_ns() // 1000
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _fresh_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model, pk=None):
+    """Invalidate every cached response built from model (or from one row of it)"""
+    bump_versions(model, [] if pk is None else [pk])
+
+
+def bump_versions(model, pks):
+    """bump_version for several rows written by one queryset update()"""
+    keys = [version_key(model)] + [version_key(model, pk) for pk in pks]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+        except Exception:
+            logger.warning("Could not bump response cache version %s", key, exc_info=True)
+
+
+class CachedResponseMixin:
+    """
+    Cache anonymous list/retrieve responses of a ViewSet.
+
+    ``cache_dependencies`` lists other models rendered into the payload
+    (e.g. nested categories or seller profiles); changing any of their rows
+    invalidates every entry of this ViewSet.
+    """
+    cache_timeout = 300
+    cache_dependencies = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, args, kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, args, kwargs)
+
+    def cached_response(self, request, handler, args, kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        basename = getattr(self, 'basename', None) or type(self).__name__
+        try:
+            key = self.get_response_cache_key(request, basename)
+            data = cache.get(key)
+        except Exception:
+            logger.warning("Response cache unavailable for %s", basename, exc_info=True)
+            _record(basename, 'errors')
+            return handler(request, *args, **kwargs)
+
+        if data is not None:
+            _record(basename, 'hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _record(basename, 'misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            try:
+                cache.set(key, response.data, self.cache_timeout)
+            except Exception:
+                logger.warning("Could not store response cache entry for %s", basename, exc_info=True)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def get_response_cache_key(self, request, basename):
+        model = self.get_queryset().model
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        keys = [version_key(model, lookup) if lookup is not None else version_key(model)]
+        keys += [version_key(dependency) for dependency in self.cache_dependencies]
+        versions = get_versions(keys)
+
+        # Normalize so ?a=1&b=2 and ?b=2&a=1 share an entry
+        params = sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values if value != ''
+        )
+        fingerprint = hashlib.sha1(
+            repr((request.get_host(), request.path, params)).encode('utf-8')
+        ).hexdigest()
+        version_tag = '.'.join(str(v) for v in versions)
+        return f'{RESPONSE_PREFIX}:{basename}:{self.action}:{version_tag}:{fingerprint}'
@@ -1,108 +1,198 @@
-import json
-from channels.generic.websocket import JsonWebsocketConsumer
-from asgiref.sync import async_to_sync
+import asyncio
+import logging
+import weakref
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from .discovery import accessible_rooms
 from .models import ChatRoom, ChatMessage
-from django.contrib.auth.models import User
+from .renderers import dumps, loads
+from .metrics import group_send_duration, websocket_connections
 
-class ChatConsumer(JsonWebsocketConsumer):
-    def connect(self):
+logger = logging.getLogger(__name__)
+
+
+def _persist_messages(messages):
+    """Bulk insert buffered messages and move each room's last_message pointer"""
+    created = ChatMessage.objects.bulk_create(messages)
+
+    # bulk_create skips post_save, so do what update_room_last_message would
+    latest = {message.room_id: message for message in created}
+    for room_id, message in latest.items():
+        if message.pk:
+            ChatRoom.objects.filter(pk=room_id).update(last_message_id=message.pk)
+        else:
+            newest = ChatMessage.objects.filter(room_id=OuterRef('pk')).order_by('-timestamp', '-id').values('id')[:1]
+            ChatRoom.objects.filter(pk=room_id).update(last_message=Subquery(newest))
+
+
+class MessageBuffer:
+    """
+    Write-behind buffer for chat messages.
+
+    Messages are broadcast immediately and written with one bulk INSERT once
+    `max_size` are pending or `interval` seconds have passed, whichever comes
+    first. Anything still pending when the worker dies is lost.
+    """
+
+    def __init__(self, max_size, interval):
+        self.max_size = max_size
+        self.interval = interval
+        self._pending = []
+        self._lock = asyncio.Lock()
+        self._timer = None
+
+    async def add(self, message):
+        self._pending.append(message)
+        if len(self._pending) >= self.max_size:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                await database_sync_to_async(_persist_messages)(batch)
+            except Exception:
+                logger.exception("Failed to persist %d chat messages", len(batch))
+
+
+_buffers = weakref.WeakKeyDictionary()
+
+
+def get_message_buffer():
+    """One buffer per event loop, shared by every socket the worker serves"""
+    loop = asyncio.get_running_loop()
+    if loop not in _buffers:
+        _buffers[loop] = MessageBuffer(
+            max_size=getattr(settings, 'CHAT_MESSAGE_FLUSH_BATCH', 100),
+            interval=getattr(settings, 'CHAT_MESSAGE_FLUSH_INTERVAL_MS', 200) / 1000,
+        )
+    return _buffers[loop]
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    @classmethod
+    async def decode_json(cls, text_data):
+        return loads(text_data)
+
+    @classmethod
+    async def encode_json(cls, content):
+        return dumps(content).decode('utf-8')
+
+    async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f'chat_{self.room_id}'
         self.user = self.scope['user']
+        self.room = None
+        # Messages are attributed to the authenticated user only, never to a client-supplied id
+        if not self.user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        # Same rule as joining over HTTP; rooms the user can't see look missing
+        self.room = await database_sync_to_async(
+            lambda: accessible_rooms(self.user).filter(id=self.room_id).only('id').first()
+        )()
+        if self.room is None:
+            await self.close(code=4404)
+            return
 
         # Join room group
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
 
-        self.accept()
+        await self.accept()
+        websocket_connections.inc(room=self.room_id)
 
         # Notify others that user joined
-        if self.user.is_authenticated:
-            self.send_presence('online')
+        await self.send_presence('online')
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'room', None) is None:
+            return
+        websocket_connections.dec(remove_at_zero=True, room=self.room_id)
 
-    def disconnect(self, close_code):
         # Notify others that user left
-        if self.user.is_authenticated:
-            self.send_presence('offline')
+        await self.send_presence('offline')
 
         # Leave room group
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        await get_message_buffer().flush()
 
-    def receive_json(self, content):
+    async def receive_json(self, content):
         msg_type = content.get('type', 'message')
-        user_id = content.get('user_id')
-        
+        user = self.user
+
         if msg_type == 'message':
             message = content.get('message')
-            try:
-                user = User.objects.get(id=user_id)
-                room = ChatRoom.objects.get(id=self.room_id)
-                
-                ChatMessage.objects.create(
-                    room=room,
-                    sender=user,
-                    content=message
-                )
-
-                async_to_sync(self.channel_layer.group_send)(
-                    self.room_group_name,
-                    {
-                        'type': 'chat_message',
-                        'message': message,
-                        'user_id': user.id,
-                        'username': user.username
-                    }
-                )
-            except User.DoesNotExist:
-                pass
-        
+            if not message:
+                return
+
+            await get_message_buffer().add(
+                ChatMessage(room_id=self.room.id, sender_id=user.id, content=message)
+            )
+
+            await self.group_send({
+                'type': 'chat_message',
+                'message': message,
+                'user_id': user.id,
+                'username': user.username
+            })
+
         elif msg_type == 'typing':
             is_typing = content.get('typing', False)
-            username = content.get('username', 'Someone')
-            async_to_sync(self.channel_layer.group_send)(
-                self.room_group_name,
-                {
-                    'type': 'user_typing',
-                    'username': username,
-                    'typing': is_typing,
-                    'user_id': user_id
-                }
-            )
+            await self.group_send({
+                'type': 'user_typing',
+                'username': user.username,
+                'typing': is_typing,
+                'user_id': user.id
+            })
 
-    def chat_message(self, event):
-        self.send_json({
+    async def chat_message(self, event):
+        await self.send_json({
             'type': 'message',
             'message': event['message'],
             'user_id': event['user_id'],
             'username': event['username']
         })
 
-    def user_typing(self, event):
-        self.send_json({
+    async def user_typing(self, event):
+        await self.send_json({
             'type': 'typing',
             'username': event['username'],
             'typing': event['typing'],
             'user_id': event['user_id']
         })
 
-    def send_presence(self, status):
-        async_to_sync(self.channel_layer.group_send)(
-            self.room_group_name,
-            {
-                'type': 'presence_update',
-                'username': self.user.username,
-                'status': status,
-                'user_id': self.user.id
-            }
-        )
+    async def send_presence(self, status):
+        await self.group_send({
+            'type': 'presence_update',
+            'username': self.user.username,
+            'status': status,
+            'user_id': self.user.id
+        })
+
+    async def group_send(self, event):
+        """Broadcast event to the room, timing the channel layer round trip"""
+        with group_send_duration.time(event=event['type']):
+            await self.channel_layer.group_send(self.room_group_name, event)
 
-    def presence_update(self, event):
-        self.send_json({
+    async def presence_update(self, event):
+        await self.send_json({
             'type': 'presence',
             'username': event['username'],
             'status': event['status'],
@@ -0,0 +1,212 @@
+"""
+Chat room discovery index kept in Redis.
+
+Each discoverable (non-personal) room id is stored in one set per church,
+one per location, and a set of public channels. A user's own room ids are
+cached in a member set rebuilt from the database whenever their membership
+changes, so discovery is a SUNION of the user's church/location sets minus
+their member set. When Redis is unavailable the same lookup runs in SQL.
+"""
+import logging
+
+from django.db.models import Q
+
+from .authentication import get_profile, profile_claim
+from .cache import get_redis_client
+from .models import ChatRoom
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'harvestconnect:discovery'
+READY_KEY = f'{KEY_PREFIX}:ready'
+REBUILD_LOCK_KEY = f'{KEY_PREFIX}:rebuild-lock'
+CHANNELS_KEY = f'{KEY_PREFIX}:channels'
+MEMBER_TTL = 60 * 60 * 24
+# Stored in every member set so "no rooms" is distinguishable from "not cached"
+EMPTY_MEMBER = 0
+
+SUMMARY_FIELDS = ('id', 'name', 'room_type', 'church', 'location')
+
+
+def church_key(church):
+    return f'{KEY_PREFIX}:church:{church}'
+
+
+def location_key(location):
+    return f'{KEY_PREFIX}:location:{location}'
+
+
+def member_key(user_id):
+    return f'{KEY_PREFIX}:member:{user_id}'
+
+
+def room_keys_key(room_id):
+    return f'{KEY_PREFIX}:room:{room_id}'
+
+
+def room_index_keys(room_type, church, location):
+    if room_type == 'personal':
+        return set()
+    keys = set()
+    if church:
+        keys.add(church_key(church))
+    if location:
+        keys.add(location_key(location))
+    if room_type == 'channel':
+        keys.add(CHANNELS_KEY)
+    return keys
+
+
+def index_room(room):
+    """Move room into the sets matching its current church/location/type"""
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        old_keys = {key.decode() for key in client.smembers(room_keys_key(room.pk))}
+        new_keys = room_index_keys(room.room_type, room.church, room.location)
+        pipe = client.pipeline()
+        for key in old_keys - new_keys:
+            pipe.srem(key, room.pk)
+        for key in new_keys:
+            pipe.sadd(key, room.pk)
+        pipe.delete(room_keys_key(room.pk))
+        if new_keys:
+            pipe.sadd(room_keys_key(room.pk), *new_keys)
+        pipe.execute()
+    except Exception:
+        logger.warning("Could not update discovery index for room %s", room.pk, exc_info=True)
+
+
+def unindex_room(room_id):
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        keys = client.smembers(room_keys_key(room_id))
+        pipe = client.pipeline()
+        for key in keys:
+            pipe.srem(key, room_id)
+        pipe.delete(room_keys_key(room_id))
+        pipe.execute()
+    except Exception:
+        logger.warning("Could not remove room %s from discovery index", room_id, exc_info=True)
+
+
+def forget_memberships(user_ids):
+    """Drop cached member sets; they are reloaded on the next discovery"""
+    client = get_redis_client()
+    if client is None or not user_ids:
+        return
+    try:
+        client.delete(*[member_key(user_id) for user_id in user_ids])
+    except Exception:
+        logger.warning("Could not invalidate discovery member sets", exc_info=True)
+
+
+def rebuild_discovery_index():
+    """Replace every index set from the database; returns the number of rooms indexed"""
+    client = get_redis_client()
+    if client is None:
+        return 0
+    sets = {}
+    indexed = 0
+    rooms = ChatRoom.objects.exclude(room_type='personal').values_list('id', 'room_type', 'church', 'location')
+    for room_id, room_type, church, location in rooms.iterator():
+        keys = room_index_keys(room_type, church, location)
+        for key in keys:
+            sets.setdefault(key, []).append(room_id)
+        if keys:
+            sets[room_keys_key(room_id)] = list(keys)
+            indexed += 1
+
+    stale = [
+        key for key in client.scan_iter(match=f'{KEY_PREFIX}:*', count=1000)
+        if key.decode() != REBUILD_LOCK_KEY
+    ]
+    pipe = client.pipeline(transaction=True)
+    if stale:
+        pipe.delete(*stale)
+    for key, members in sets.items():
+        pipe.sadd(key, *members)
+    pipe.set(READY_KEY, 1)
+    pipe.execute()
+    return indexed
+
+
+def _member_room_ids(client, user):
+    key = member_key(user.pk)
+    members = client.smembers(key)
+    if not members:
+        room_ids = list(user.chat_rooms.values_list('id', flat=True))
+        pipe = client.pipeline()
+        pipe.sadd(key, EMPTY_MEMBER, *room_ids)
+        pipe.expire(key, MEMBER_TTL)
+        pipe.execute()
+        return set(room_ids)
+    return {int(member) for member in members}
+
+
+def _indexed_room_ids(keys, user):
+    """Candidate room ids from Redis, or None when the index cannot be used"""
+    client = get_redis_client()
+    if client is None:
+        return None
+    try:
+        if not client.exists(READY_KEY):
+            if not client.set(REBUILD_LOCK_KEY, 1, nx=True, ex=60):
+                return None
+            rebuild_discovery_index()
+        candidates = {int(room_id) for room_id in client.sunion(list(keys))}
+        return candidates - _member_room_ids(client, user)
+    except Exception:
+        logger.warning("Discovery index unavailable, querying the database", exc_info=True)
+        return None
+
+
+def discover_rooms(user, include_channels=False, limit=None):
+    """Compact summaries of rooms the user could join, newest first"""
+    home_church, location = profile_claim(user, 'home_church'), profile_claim(user, 'location')
+    keys = set()
+    if home_church:
+        keys.add(church_key(home_church))
+    if location:
+        keys.add(location_key(location))
+    if include_channels:
+        keys.add(CHANNELS_KEY)
+    if not keys:
+        return []
+
+    room_ids = _indexed_room_ids(keys, user)
+    if room_ids is not None:
+        room_ids = sorted(room_ids, reverse=True)[:limit]
+        rooms = ChatRoom.objects.filter(id__in=room_ids)
+    else:
+        rooms = _discoverable(home_church, location, include_channels).exclude(id__in=user.chat_rooms.values('id'))
+    rooms = rooms.order_by('-id').values(*SUMMARY_FIELDS)
+    return list(rooms[:limit] if limit else rooms)
+
+
+def _discoverable(home_church, location, include_channels):
+    condition = Q()
+    if home_church:
+        condition |= Q(church=home_church)
+    if location:
+        condition |= Q(location=location)
+    if include_channels:
+        condition |= Q(room_type='channel')
+    if not condition:
+        return ChatRoom.objects.none()
+    return ChatRoom.objects.filter(condition).exclude(room_type='personal')
+
+
+def joinable_rooms(user):
+    """Rooms the user may join: those discover_rooms offers them, including public channels"""
+    # An access check, so read the profile rather than possibly stale token claims
+    profile = get_profile(user)
+    return _discoverable(profile.home_church, profile.location, True)
+
+
+def accessible_rooms(user):
+    """Rooms the user may open a chat socket for: the ones they're in plus the ones they may join"""
+    return ChatRoom.objects.filter(Q(participants=user) | Q(pk__in=joinable_rooms(user).values('pk'))).distinct()
@@ -0,0 +1,131 @@
+"""
+Geohash bucketing and proximity queries for seller locations.
+
+UserProfile keeps a geohash of its latitude/longitude in an indexed column.
+A radius search first narrows rows to the geohash cells covering the
+search bounding box (B-tree range scans on that column), then to the box
+itself, and finally computes the exact haversine distance in SQL.
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Upper bound on range scans per query; coarser cells are used beyond it
+MAX_COVERING_CELLS = 12
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def _cell_size(precision):
+    """Height and width of a geohash cell in degrees"""
+    lng_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def _wrap_longitude(longitude):
+    return (longitude + 180.0) % 360.0 - 180.0
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng); longitudes may cross ±180"""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    if min_lat == -90.0 or max_lat == 90.0:
+        return min_lat, max_lat, -180.0, 180.0
+    lng_delta = math.degrees(
+        math.asin(min(math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude)), 1.0))
+    )
+    return min_lat, max_lat, longitude - lng_delta, longitude + lng_delta
+
+
+def covering_cells(box):
+    """Geohash prefixes that together cover the bounding box"""
+    min_lat, max_lat, min_lng, max_lng = box
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lng_step = _cell_size(precision)
+        rows = math.floor(max_lat / lat_step) - math.floor(min_lat / lat_step) + 1
+        columns = math.floor(max_lng / lng_step) - math.floor(min_lng / lng_step) + 1
+        if rows * columns <= MAX_COVERING_CELLS:
+            break
+    else:
+        return []  # Box spans most of the globe; scanning everything is cheaper
+
+    cells = set()
+    lat_start = math.floor(min_lat / lat_step) * lat_step
+    lng_start = math.floor(min_lng / lng_step) * lng_step
+    for row in range(rows):
+        for column in range(columns):
+            # Sample the cell centre so floating point edges land in the right cell
+            lat = min(lat_start + (row + 0.5) * lat_step, 90.0)
+            lng = _wrap_longitude(lng_start + (column + 0.5) * lng_step)
+            cells.add(encode_geohash(lat, lng, precision))
+    return sorted(cells)
+
+
+def geohash_filter(field, cells):
+    condition = Q()
+    for cell in cells:
+        # Range instead of startswith so both SQLite and PostgreSQL use the B-tree index
+        condition |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '~'})
+    return condition
+
+
+def box_filter(lat_field, lng_field, box):
+    min_lat, max_lat, min_lng, max_lng = box
+    condition = Q(**{f'{lat_field}__gte': min_lat, f'{lat_field}__lte': max_lat})
+    if min_lng < -180.0 or max_lng > 180.0:
+        return condition & (
+            Q(**{f'{lng_field}__gte': _wrap_longitude(min_lng)})
+            | Q(**{f'{lng_field}__lte': _wrap_longitude(max_lng)})
+        )
+    return condition & Q(**{f'{lng_field}__gte': min_lng, f'{lng_field}__lte': max_lng})
+
+
+def haversine_expression(lat_field, lng_field, latitude, longitude):
+    """Great-circle distance in km from (latitude, longitude) to the row's coordinates"""
+    lat1 = math.radians(latitude)
+    lat2 = Radians(F(lat_field))
+    half_dlat = (lat2 - Value(lat1)) / 2
+    half_dlng = (Radians(F(lng_field)) - Value(math.radians(longitude))) / 2
+    a = Power(Sin(half_dlat), 2) + Value(math.cos(lat1)) * Cos(lat2) * Power(Sin(half_dlng), 2)
+    # Rounding can push a fraction past 1.0, outside asin's domain
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(Least(a, Value(1.0))), output_field=FloatField())
+
+
+def within_radius(queryset, prefix, latitude, longitude, radius_km):
+    """
+    Annotate distance_km and keep rows within radius_km of the point.
+    ``prefix`` is the lookup path to the UserProfile, e.g. 'seller__profile'.
+    """
+    lat_field, lng_field = f'{prefix}__latitude', f'{prefix}__longitude'
+    box = bounding_box(latitude, longitude, radius_km)
+    cells = covering_cells(box)
+    if cells:
+        queryset = queryset.filter(geohash_filter(f'{prefix}__geohash', cells))
+    return queryset.filter(box_filter(lat_field, lng_field, box)).annotate(
+        distance_km=haversine_expression(lat_field, lng_field, latitude, longitude)
+    ).filter(distance_km__lte=radius_km)
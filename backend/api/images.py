@@ -0,0 +1,199 @@
+"""
+Thumbnail and responsive-width derivatives for uploaded images.
+
+When a model with DERIVATIVE_FIELDS is saved with a new file in one of
+its image fields, a ``thumbnails.build`` background job is queued (see
+api.jobs). The job resizes the original once per variant, encodes each
+variant as WebP and JPEG, stores them next to the media files and records
+them in the row's ``image_derivatives`` manifest, keyed by field name:
+
+    {"image": {"source": "products/kale.jpg", "width": 2400, "height": 1600,
+               "thumbnail": {"width": 320, "height": 320, "webp": "...", "jpeg": "..."},
+               "widths": [{"width": 480, "height": 320, "webp": "...", "jpeg": "..."}, ...]}}
+
+List fields such as ``Product.images`` map each stored name to its own
+entry. Serializers turn an entry into a srcset-style structure with
+``srcset()``; entries whose source no longer matches the field are ignored,
+so clients fall back to the original until the new derivatives exist.
+"""
+import hashlib
+import io
+import logging
+import posixpath
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .cache import bump_version
+from .jobs import enqueue
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'derivatives'
+THUMBNAIL_SIZE = (320, 320)
+RESPONSIVE_WIDTHS = (480, 960, 1600)
+# Manifest key: (Pillow format, file extension, encoder options)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def derivative_fields(model):
+    return getattr(model, 'DERIVATIVE_FIELDS', ())
+
+
+def _stored_names(value):
+    """Storage names held by an image field or a list of names; remote URLs are skipped"""
+    names = value if isinstance(value, (list, tuple)) else [getattr(value, 'name', value)]
+    return [name for name in names if isinstance(name, str) and name and '://' not in name]
+
+
+def stale_fields(instance):
+    """Derivative fields whose current files have no manifest entry yet"""
+    manifest = instance.image_derivatives or {}
+    stale = []
+    for field in derivative_fields(type(instance)):
+        value = getattr(instance, field)
+        entry = manifest.get(field) or {}
+        if isinstance(value, (list, tuple)):
+            if any(name not in entry for name in _stored_names(value)):
+                stale.append(field)
+        elif _stored_names(value)[:1] != ([entry['source']] if 'source' in entry else []):
+            stale.append(field)
+    return stale
+
+
+def _derivative_name(source, label, extension):
+    directory, filename = posixpath.split(source)
+    stem = posixpath.splitext(filename)[0]
+    digest = hashlib.sha1(source.encode()).hexdigest()[:8]
+    return posixpath.join(DERIVATIVES_DIR, directory, f'{stem}-{digest}', f'{label}.{extension}')
+
+
+def _save_variant(image, source, label):
+    from PIL import Image
+
+    variant = {'width': image.width, 'height': image.height}
+    for key, (format_name, extension, options) in FORMATS.items():
+        encoded = image
+        if format_name == 'JPEG' and image.mode != 'RGB':
+            # JPEG has no alpha channel; flatten transparent areas onto white
+            encoded = Image.new('RGB', image.size, 'white')
+            encoded.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        buffer = io.BytesIO()
+        encoded.save(buffer, format_name, **options)
+        name = _derivative_name(source, label, extension)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        variant[key] = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return variant
+
+
+def generate_derivatives(source):
+    """Encode the thumbnail and responsive widths of one stored image and return its manifest entry"""
+    from PIL import Image, ImageOps
+
+    with default_storage.open(source, 'rb') as handle:
+        with Image.open(handle) as original:
+            image = ImageOps.exif_transpose(original)
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    entry = {'source': source, 'width': image.width, 'height': image.height}
+    thumbnail = ImageOps.fit(image, THUMBNAIL_SIZE, Image.LANCZOS)
+    entry['thumbnail'] = _save_variant(thumbnail, source, 'thumb')
+
+    # Never upscale; an image narrower than every width gets one re-encoded copy
+    widths = [w for w in RESPONSIVE_WIDTHS if w < image.width] or [image.width]
+    entry['widths'] = []
+    for width in widths:
+        height = max(round(image.height * width / image.width), 1)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        entry['widths'].append(_save_variant(resized, source, f'w{width}'))
+    return entry
+
+
+def _entry_for(source):
+    try:
+        return generate_derivatives(source)
+    except Exception as exc:
+        # Recorded so the same broken file is not retried on every save
+        logger.warning("Could not build image derivatives for %s", source, exc_info=True)
+        return {'source': source, 'error': str(exc)[:200]}
+
+
+def _entry_files(entry):
+    variants = [entry.get('thumbnail')] + list(entry.get('widths', ()))
+    return [v[ext] for v in variants if v for ext in FORMATS if v.get(ext)]
+
+
+def _delete_files(names):
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except Exception:
+            logger.warning("Could not delete image derivative %s", name, exc_info=True)
+
+
+def build_derivatives(label, pk, force=False):
+    """Bring one row's manifest up to date; returns the names of the fields rebuilt"""
+    model = apps.get_model(label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return []
+    fields = list(derivative_fields(model)) if force else stale_fields(instance)
+    if not fields:
+        return []
+
+    manifest = instance.image_derivatives or {}
+    updates, obsolete = {}, []
+    for field in fields:
+        value = getattr(instance, field)
+        previous = manifest.get(field) or {}
+        if isinstance(value, (list, tuple)):
+            entries = {}
+            for name in _stored_names(value):
+                entries[name] = previous.get(name) if name in previous and not force else _entry_for(name)
+            obsolete += [f for name, e in previous.items() if name not in entries for f in _entry_files(e)]
+            updates[field] = entries
+        else:
+            names = _stored_names(value)
+            updates[field] = _entry_for(names[0]) if names else {}
+            if previous.get('source') not in names:
+                obsolete += _entry_files(previous)
+
+    with transaction.atomic():
+        # Merge into the stored manifest so concurrent jobs for other fields are kept
+        current = model.objects.select_for_update().filter(pk=pk).values_list('image_derivatives', flat=True).first()
+        if current is None:
+            return []
+        model.objects.filter(pk=pk).update(image_derivatives={**(current or {}), **updates})
+    _delete_files(obsolete)
+    bump_version(model, pk)
+    return fields
+
+
+def schedule_derivatives(instance):
+    """Queue a job building instance's derivatives once the current transaction commits"""
+    enqueue('thumbnails.build', instance._meta.label, instance.pk, unique=True)
+
+
+def _url(name):
+    return default_storage.url(name) if name else None
+
+
+def srcset(entry, source=None):
+    """Thumbnail URLs plus one srcset string per format for a manifest entry, or None if it is stale"""
+    if not entry or 'widths' not in entry or (source is not None and entry.get('source') != source):
+        return None
+    thumbnail = entry['thumbnail']
+    data = {
+        'width': entry['width'],
+        'height': entry['height'],
+        'thumbnail': {ext: _url(thumbnail.get(ext)) for ext in FORMATS},
+    }
+    for ext in FORMATS:
+        data[ext] = ', '.join(f"{_url(v[ext])} {v['width']}w" for v in entry['widths'] if v.get(ext))
+    return data
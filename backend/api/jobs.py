@@ -0,0 +1,341 @@
+"""
+Background jobs for side effects that should not hold up a request.
+
+``enqueue(name, *args)`` pushes a job once the current transaction commits;
+``manage.py run_workers`` runs them. Jobs live in Redis: a ready list, a
+sorted set of retries waiting out their backoff, and a capped list of jobs
+that failed every attempt. When the default cache is not Redis they are kept
+in process memory instead and run by a few daemon threads of the process
+that queued them.
+
+A job that raises is retried with exponential backoff until it has used
+max_attempts. Arguments must be JSON-serialisable and handlers idempotent:
+a job may run more than once, and a ``unique`` job is dropped while an
+identical one is still waiting. Workers report in with a heartbeat; if no
+worker is alive, or the queue cannot be reached, the job runs inline after
+the commit, so side effects are delayed at worst, never stranded. With
+JOBS_EAGER they run immediately where they are enqueued, as tests expect.
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from datetime import date
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .cache import get_redis_client
+from .models import DailySalesRollup, Product
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'harvestconnect:jobs'
+READY_KEY = f'{KEY_PREFIX}:ready'
+DELAYED_KEY = f'{KEY_PREFIX}:delayed'
+FAILED_KEY = f'{KEY_PREFIX}:failed'
+WORKERS_KEY = f'{KEY_PREFIX}:workers'
+FAILED_LIMIT = 1000
+# A unique job lost with a crashed worker stops suppressing new copies after this long
+UNIQUE_TTL = 3600
+# Workers refresh their heartbeat this often and count as gone after WORKER_TTL without one
+HEARTBEAT_INTERVAL = 5
+WORKER_TTL = 30
+
+JobType = namedtuple('JobType', 'func max_attempts')
+_registry = {}
+
+
+def job(name, max_attempts=5):
+    """Register the decorated function as the handler for jobs called name"""
+    def register(func):
+        _registry[name] = JobType(func, max_attempts)
+        return func
+    return register
+
+
+class RedisJobQueue:
+    def __init__(self, client):
+        self.client = client
+        self.workers_checked = (0, False)
+
+    def heartbeat(self, worker_id):
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.zadd(WORKERS_KEY, {worker_id: now + WORKER_TTL})
+        pipe.zremrangebyscore(WORKERS_KEY, '-inf', now)
+        pipe.execute()
+
+    def retire(self, worker_id):
+        self.client.zrem(WORKERS_KEY, worker_id)
+
+    def has_workers(self):
+        # Cached briefly so enqueueing doesn't cost an extra round trip every time
+        checked_at, alive = self.workers_checked
+        if time.monotonic() - checked_at > HEARTBEAT_INTERVAL:
+            alive = bool(self.client.zcount(WORKERS_KEY, time.time(), '+inf'))
+            self.workers_checked = (time.monotonic(), alive)
+        return alive
+
+    def push(self, payload, unique_key=None):
+        if unique_key and not self.client.set(f'{KEY_PREFIX}:unique:{unique_key}', 1, nx=True, ex=UNIQUE_TTL):
+            return False
+        self.client.lpush(READY_KEY, payload)
+        return True
+
+    def reserve(self, timeout=0):
+        self._promote_due()
+        if not timeout:
+            return self.client.rpop(READY_KEY)
+        item = self.client.brpop(READY_KEY, timeout=timeout)
+        return item[1] if item else None
+
+    def _promote_due(self):
+        for payload in self.client.zrangebyscore(DELAYED_KEY, '-inf', time.time(), start=0, num=100):
+            # Only one worker's ZREM succeeds, so a retry is never promoted twice
+            if self.client.zrem(DELAYED_KEY, payload):
+                self.client.lpush(READY_KEY, payload)
+
+    def release(self, unique_key):
+        self.client.delete(f'{KEY_PREFIX}:unique:{unique_key}')
+
+    def retry(self, payload, delay):
+        self.client.zadd(DELAYED_KEY, {payload: time.time() + delay})
+
+    def bury(self, payload):
+        pipe = self.client.pipeline()
+        pipe.lpush(FAILED_KEY, payload)
+        pipe.ltrim(FAILED_KEY, 0, FAILED_LIMIT - 1)
+        pipe.execute()
+
+    def stats(self):
+        pipe = self.client.pipeline()
+        pipe.llen(READY_KEY)
+        pipe.zcard(DELAYED_KEY)
+        pipe.llen(FAILED_KEY)
+        ready, delayed, failed = pipe.execute()
+        return {'ready': ready, 'delayed': delayed, 'failed': failed}
+
+
+class LocalJobQueue:
+    """Per-process fallback used when the default cache is not Redis
+
+    workers > 0 runs jobs on daemon threads of this process; with workers=0
+    they wait for the caller to run them (tests use run_pending()).
+    """
+
+    def __init__(self, workers=0):
+        self.condition = threading.Condition()
+        self.ready = deque()
+        self.delayed = []
+        self.failed = deque(maxlen=FAILED_LIMIT)
+        self.unique = set()
+        self.sequence = itertools.count()
+        self.workers = workers
+        self.threads = []
+
+    def push(self, payload, unique_key=None):
+        with self.condition:
+            if unique_key:
+                if unique_key in self.unique:
+                    return False
+                self.unique.add(unique_key)
+            self.ready.append(payload)
+            self.condition.notify()
+            if len(self.threads) < self.workers:
+                self._start_workers()
+        return True
+
+    def heartbeat(self, worker_id):
+        pass
+
+    def retire(self, worker_id):
+        pass
+
+    def has_workers(self):
+        return True
+
+    def _start_workers(self):
+        for i in range(len(self.threads), self.workers):
+            thread = threading.Thread(target=work, args=(self,), name=f'jobs-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def reserve(self, timeout=0):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                now = time.time()
+                while self.delayed and self.delayed[0][0] <= now:
+                    self.ready.append(heapq.heappop(self.delayed)[2])
+                if self.ready:
+                    return self.ready.popleft()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                if self.delayed:
+                    remaining = min(remaining, self.delayed[0][0] - now)
+                self.condition.wait(remaining)
+
+    def release(self, unique_key):
+        with self.condition:
+            self.unique.discard(unique_key)
+
+    def retry(self, payload, delay):
+        with self.condition:
+            heapq.heappush(self.delayed, (time.time() + delay, next(self.sequence), payload))
+            self.condition.notify()
+
+    def bury(self, payload):
+        with self.condition:
+            self.failed.append(payload)
+
+    def stats(self):
+        with self.condition:
+            return {'ready': len(self.ready), 'delayed': len(self.delayed), 'failed': len(self.failed)}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                client = get_redis_client()
+                _queue = RedisJobQueue(client) if client is not None else LocalJobQueue(max(settings.JOB_WORKERS, 1))
+    return _queue
+
+
+def enqueue(name, *args, unique=False):
+    """Run job name(*args) in the background once the current transaction commits"""
+    if name not in _registry:
+        raise ValueError(f'Unknown job type: {name}')
+    if getattr(settings, 'JOBS_EAGER', False):
+        _registry[name].func(*args)
+        return
+    # Serialised now, so unserialisable arguments fail in the caller rather than the worker
+    unique_key = f'{name}:{json.dumps(args)}' if unique else None
+    payload = json.dumps({'id': uuid.uuid4().hex, 'name': name, 'args': args, 'attempts': 0, 'unique': unique_key})
+    transaction.on_commit(lambda: _push(payload, unique_key))
+
+
+def _push(payload, unique_key):
+    job = json.loads(payload)
+    try:
+        queue = get_job_queue()
+        if queue.has_workers():
+            queue.push(payload, unique_key)
+            return
+        logger.warning("No job worker is running, running %s inline", job['name'])
+    except Exception:
+        logger.warning("Job queue unavailable, running %s inline", job['name'], exc_info=True)
+    try:
+        _registry[job['name']].func(*job['args'])
+    except Exception:
+        logger.exception("Inline job %s failed", job['name'])
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a job that has failed attempts times"""
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+    # Jitter keeps jobs that failed together (say, on a Redis blip) from retrying in lockstep
+    return delay * random.uniform(1, 1.2)
+
+
+def run_next(queue=None, timeout=0):
+    """Run one job, waiting up to timeout seconds for it; returns False if none was ready"""
+    queue = get_job_queue() if queue is None else queue
+    payload = queue.reserve(timeout)
+    if payload is None:
+        return False
+    job = json.loads(payload)
+    if job.get('unique'):
+        # Changes made while this job runs must queue another one
+        queue.release(job['unique'])
+    job_type = _registry.get(job['name'])
+    if job_type is None:
+        logger.error("Unknown job type %s; moved to the failed list", job['name'])
+        queue.bury(payload)
+        return True
+
+    try:
+        job_type.func(*job['args'])
+    except Exception as exc:
+        job['attempts'] += 1
+        job['error'] = f'{type(exc).__name__}: {exc}'[:500]
+        if job['attempts'] >= job_type.max_attempts:
+            logger.exception("Job %s %s failed after %d attempts", job['name'], job['id'], job['attempts'])
+            queue.bury(json.dumps(job))
+        else:
+            delay = retry_delay(job['attempts'])
+            logger.warning("Job %s %s failed (attempt %d), retrying in %.1fs",
+                           job['name'], job['id'], job['attempts'], delay, exc_info=True)
+            queue.retry(json.dumps(job), delay)
+    return True
+
+
+def run_pending(queue=None):
+    """Run jobs until none is ready; returns how many ran"""
+    ran = 0
+    while run_next(queue):
+        ran += 1
+    return ran
+
+
+def work(queue=None, stop=None, timeout=1):
+    """Worker loop: run jobs until stop is set; returns how many ran"""
+    queue = get_job_queue() if queue is None else queue
+    worker_id = f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+    ran, beat_at = 0, 0
+    while stop is None or not stop.is_set():
+        try:
+            if time.monotonic() - beat_at >= HEARTBEAT_INTERVAL:
+                queue.heartbeat(worker_id)
+                beat_at = time.monotonic()
+            ran += run_next(queue, timeout)
+        except Exception:
+            # The queue itself is unreachable; wait instead of spinning
+            logger.exception("Could not reserve a job")
+            time.sleep(timeout)
+        finally:
+            # Drop connections that broke or outlived CONN_MAX_AGE, as request handling does
+            close_old_connections()
+    try:
+        queue.retire(worker_id)
+    except Exception:
+        logger.warning("Could not deregister job worker %s", worker_id, exc_info=True)
+    return ran
+
+
+# Reviews and orders keep these counters current as they are written; the two
+# jobs below only repair drift, queued by reconcile_ratings / rebuild_sales_rollup --queue
+@job('ratings.recompute')
+def recompute_ratings(product_ids=None, seller_ids=None):
+    Product.reconcile_ratings(product_ids=product_ids, seller_ids=seller_ids)
+
+
+@job('rollups.rebuild')
+def rebuild_rollups(days=None):
+    DailySalesRollup.rebuild(dates=None if days is None else [date.fromisoformat(day) for day in days])
+
+
+@job('thumbnails.build')
+def build_thumbnails(label, pk):
+    from .images import build_derivatives
+    build_derivatives(label, pk)
+
+
+@job('email.send', max_attempts=8)
+def send_email(message):
+    from .mail import deliver
+    deliver(message)
@@ -0,0 +1,84 @@
+"""
+Email delivery through the background job queue.
+
+QueuedEmailBackend turns each outgoing message into an ``email.send`` job,
+so sign-up, verification and password-reset requests return without waiting
+on the mail server. Workers deliver the message with EMAIL_DELIVERY_BACKEND
+and retry with backoff while the server is unreachable.
+"""
+import base64
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .jobs import enqueue
+
+
+def serialize_message(message):
+    """JSON-safe dict holding everything needed to rebuild message"""
+    attachments = []
+    for filename, content, mimetype in message.attachments:
+        binary = isinstance(content, bytes)
+        attachments.append({
+            'filename': filename,
+            'content': base64.b64encode(content).decode() if binary else content,
+            'mimetype': mimetype,
+            'base64': binary,
+        })
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': dict(message.extra_headers),
+        'content_subtype': message.content_subtype,
+        'alternatives': [list(alternative) for alternative in getattr(message, 'alternatives', ())],
+        'attachments': attachments,
+    }
+
+
+def deserialize_message(data):
+    message = EmailMultiAlternatives(
+        subject=data['subject'], body=data['body'], from_email=data['from_email'],
+        to=data['to'], cc=data['cc'], bcc=data['bcc'], reply_to=data['reply_to'], headers=data['headers'],
+        alternatives=[tuple(alternative) for alternative in data['alternatives']],
+    )
+    message.content_subtype = data['content_subtype']
+    for attachment in data['attachments']:
+        content = attachment['content']
+        message.attach(
+            attachment['filename'], base64.b64decode(content) if attachment['base64'] else content,
+            attachment['mimetype'],
+        )
+    return message
+
+
+def deliver(data):
+    """Send one serialized message through the real backend; errors propagate so the job is retried"""
+    with get_connection(settings.EMAIL_DELIVERY_BACKEND, fail_silently=False) as connection:
+        return connection.send_messages([deserialize_message(data)])
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Email backend that queues one background job per message"""
+
+    def send_messages(self, email_messages):
+        queued = 0
+        direct = []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            if any(not isinstance(attachment, tuple) for attachment in message.attachments):
+                # Prebuilt MIME parts don't survive JSON; hand these to the real backend now
+                direct.append(message)
+                continue
+            enqueue('email.send', serialize_message(message))
+            queued += 1
+        if direct:
+            with get_connection(settings.EMAIL_DELIVERY_BACKEND, fail_silently=self.fail_silently) as connection:
+                queued += connection.send_messages(direct) or 0
+        return queued
@@ -0,0 +1,74 @@
+"""
+Django management command to compare authenticated request overhead with database and stateless JWT validation
+Usage: python manage.py benchmark_auth --requests 200 --paths /api/projects/ /api/users/stats/
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+
+from api.authentication import ProfileTokenObtainPairSerializer
+from api.profiling import QueryRecorder, percentile
+
+MODES = (('database', False), ('stateless', True))
+
+
+class Command(BaseCommand):
+    help = 'Time authenticated API requests with JWT_STATELESS_AUTH off and on (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per path and mode')
+        parser.add_argument('--paths', nargs='+',
+                            default=['/api/projects/', '/api/users/stats/', '/api/chat-rooms/discovery/'],
+                            help='Authenticated GET endpoints to exercise')
+        parser.add_argument('--user', help='Email of the user to authenticate as (default: a temporary user)')
+
+    def handle(self, *args, **options):
+        # Cache misses log a warning per request without Redis; they would drown the table
+        logging.disable(logging.WARNING)
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        client = Client(HTTP_HOST=host)
+        self.stdout.write(
+            f"{'path':<30} {'mode':<10} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8}"
+        )
+        try:
+            with transaction.atomic():
+                user = self.get_user(options['user'])
+                access = str(ProfileTokenObtainPairSerializer.get_token(user).access_token)
+                for path in options['paths']:
+                    for mode, stateless in MODES:
+                        with override_settings(JWT_STATELESS_AUTH=stateless):
+                            timings, queries = self.run(client, path, access, options['requests'])
+                        self.stdout.write(
+                            f"{path:<30} {mode:<10} {sum(timings) / len(timings):>8.3f} "
+                            f"{percentile(timings, 50):>8.3f} {percentile(timings, 95):>8.3f} {queries:>8}"
+                        )
+                transaction.set_rollback(True)
+        finally:
+            logging.disable(logging.NOTSET)
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete'))
+
+    def get_user(self, email):
+        if email:
+            return User.objects.get(email=email)
+        return User.objects.create_user(username='auth-benchmark', email='auth-benchmark@example.com')
+
+    def run(self, client, path, access, count):
+        """Sorted per-request milliseconds and the query count of one request"""
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = client.get(path, **headers)
+        if response.status_code != 200:
+            raise CommandError(f'{path} returned {response.status_code}')
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            client.get(path, **headers)
+            timings.append((time.perf_counter() - started) * 1000)
+        return sorted(timings), recorder.count
@@ -0,0 +1,65 @@
+"""
+Django management command to compare JSON rendering speed for product pages
+Usage: python manage.py benchmark_json --sizes 10 100 1000 --repeat 50
+"""
+import timeit
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Category, Product, UserProfile
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = 'Time stdlib vs fast JSON rendering of serialized product pages (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                            help='Products per page to benchmark')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Renders per page size and renderer')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; both renderers use the stdlib'))
+
+        page = {'next': 'http://testserver/api/products/?cursor=abc', 'previous': None}
+        stdlib, fast = JSONRenderer(), FastJSONRenderer()
+        self.stdout.write(f"{'products':>10} {'bytes':>10} {'stdlib ms':>10} {'fast ms':>10} {'speedup':>8}")
+        for size in options['sizes']:
+            data = {**page, 'results': ProductSerializer(self.build_products(size), many=True).data}
+            stdlib_ms = self.time(stdlib, data, options['repeat'])
+            fast_ms = self.time(fast, data, options['repeat'])
+            self.stdout.write(
+                f"{size:>10} {len(fast.render(data)):>10} {stdlib_ms:>10.3f} {fast_ms:>10.3f} "
+                f"{stdlib_ms / fast_ms if fast_ms else 0:>7.1f}x"
+            )
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete'))
+
+    def time(self, renderer, data, repeat):
+        return timeit.timeit(lambda: renderer.render(data), number=repeat) / repeat * 1000
+
+    def build_products(self, count):
+        """Unsaved products with sellers, profiles and categories attached in memory"""
+        now = timezone.now()
+        category = Category(id=1, name='Produce', slug='produce', description='Fresh food', icon='leaf')
+        products = []
+        for i in range(count):
+            seller = User(id=i + 1, username=f'seller{i}', email=f'seller{i}@example.com',
+                          first_name='Ama', last_name='Mensah')
+            seller.profile = UserProfile(
+                id=i + 1, user=seller, role='farmer', bio='Grower in Accra ' * 5, location='Accra',
+                home_church='Grace Chapel', latitude=5.6037, longitude=-0.187, created_at=now, updated_at=now
+            )
+            products.append(Product(
+                id=i + 1, seller=seller, category=category, title=f'Heirloom tomatoes {i}',
+                slug=f'heirloom-tomatoes-{i}', description='Sun ripened, picked this morning. ' * 10,
+                price=Decimal('12.50'), quantity=40, status='active', images=['a.jpg', 'b.jpg'],
+                rating=4.5, reviews_count=12, created_at=now, updated_at=now
+            ))
+        return products
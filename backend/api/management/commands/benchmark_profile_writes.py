@@ -0,0 +1,118 @@
+"""
+Django management command to count the SQL statements issued per login, registration and profile update
+Usage: python manage.py benchmark_profile_writes --repeat 5
+"""
+import logging
+import uuid
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.serializers import RegisterSerializer
+from api.views import UserProfileViewSet
+
+PASSWORD = 'Sheaves&Barley-2024'
+STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = 'Count SELECT/INSERT/UPDATE statements per auth flow, split by table (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Times to run each flow; counts are averaged')
+
+    def handle(self, *args, **options):
+        # Cache version bumps fail loudly without Redis and are not database writes
+        logging.disable(logging.WARNING)
+        self.factory = APIRequestFactory()
+        flows = [
+            ('registration', self.register),
+            ('login', self.login),
+            ('profile update', self.update_profile),
+            ('profile no-op', self.update_profile_unchanged),
+        ]
+        self.stdout.write(
+            f"{'flow':<16} {'SELECT':>7} {'INSERT':>7} {'UPDATE':>7} {'DELETE':>7} "
+            f"{'auth_user w':>12} {'profile w':>10}"
+        )
+        try:
+            for name, flow in flows:
+                totals = Counter()
+                for _ in range(options['repeat']):
+                    totals.update(self.measure(flow))
+                averages = {key: totals[key] / options['repeat'] for key in totals}
+                self.stdout.write(
+                    f"{name:<16} " + ' '.join(f'{averages.get(kind, 0):>7.1f}' for kind in STATEMENTS)
+                    + f" {averages.get('auth_user', 0):>12.1f} {averages.get('api_userprofile', 0):>10.1f}"
+                )
+        finally:
+            logging.disable(logging.NOTSET)
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark complete'))
+
+    def measure(self, flow):
+        """Statement counts for one run of flow inside a transaction that is rolled back"""
+        counts = Counter()
+        with transaction.atomic():
+            context = flow()
+            with CaptureQueriesContext(connection) as queries:
+                context()
+            for query in queries.captured_queries:
+                sql = query['sql'].lstrip()
+                kind = sql.split(None, 1)[0].upper()
+                counts[kind] += 1
+                if kind in ('INSERT', 'UPDATE', 'DELETE'):
+                    # The first quoted identifier is the table being written
+                    counts[sql.split('"', 2)[1]] += 1
+            transaction.set_rollback(True)
+        return counts
+
+    def request(self, method, path, data=None):
+        request = getattr(self.factory, method)(path, data, format='json')
+        request.session = SessionStore()
+        return request
+
+    def new_user(self):
+        email = f'bench-{uuid.uuid4().hex[:12]}@example.com'
+        return User.objects.create_user(username=email, email=email, password=PASSWORD)
+
+    def register(self):
+        """Sign-up through the registration serializer, as POST /api/auth/registration/ does"""
+        email = f'bench-{uuid.uuid4().hex[:12]}@example.com'
+        request = Request(self.request('post', '/api/auth/registration/'))
+        serializer = RegisterSerializer(data={
+            'email': email, 'password1': PASSWORD, 'password2': PASSWORD,
+            'first_name': 'Ama', 'last_name': 'Mensah', 'role': 'farmer',
+        }, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return lambda: serializer.save(request)
+
+    def login(self):
+        """The user_logged_in signal fired by every successful login"""
+        user = User.objects.get(pk=self.new_user().pk)
+        request = self.request('post', '/api/auth/login/')
+        return lambda: user_logged_in.send(sender=User, request=request, user=user)
+
+    def update_profile(self, data=None):
+        """PATCH /api/users/me/"""
+        user = User.objects.get(pk=self.new_user().pk)
+        data = data or {'bio': 'Grower in Accra', 'first_name': 'Ama'}
+        view = UserProfileViewSet.as_view({'patch': 'me'})
+
+        def run():
+            request = self.request('patch', '/api/users/me/', data)
+            force_authenticate(request, user=user)
+            response = view(request)
+            assert response.status_code == 200, response.data
+        return run
+
+    def update_profile_unchanged(self):
+        """PATCH /api/users/me/ sending values the profile already has"""
+        return self.update_profile({'role': 'buyer'})
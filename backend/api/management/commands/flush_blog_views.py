@@ -0,0 +1,23 @@
+"""
+Django management command to write buffered blog views to the database
+Usage: python manage.py flush_blog_views
+"""
+from django.core.management.base import BaseCommand
+
+from api.counters import flush_blog_views
+
+
+class Command(BaseCommand):
+    help = 'Fold buffered blog view counts into BlogPost.views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of posts drained from the buffer per round'
+        )
+
+    def handle(self, *args, **options):
+        flushed = flush_blog_views(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✓ Flushed views for {flushed} posts"))
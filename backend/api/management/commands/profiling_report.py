@@ -0,0 +1,66 @@
+"""
+Django management command to print the request profiling report
+Usage: python manage.py profiling_report --sort p95 --limit 20
+"""
+from django.core.management.base import BaseCommand
+
+from api.profiling import PERCENTILES, profiling_report, reset_profiling
+
+
+class Command(BaseCommand):
+    help = 'Show per-route latency and query percentiles collected by ProfilingMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sort',
+            choices=[f'p{pct}' for pct in PERCENTILES] + ['requests', 'queries'],
+            default='p95',
+            help='Order routes by this wall time percentile, request count or p95 query count'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Only show the first N routes'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Clear the collected samples after printing'
+        )
+
+    def handle(self, *args, **options):
+        report = profiling_report()
+        if not report:
+            self.stdout.write('No profiling samples recorded. Set REQUEST_PROFILING=True to collect them.')
+            return
+
+        sort = options['sort']
+        if sort == 'requests':
+            key = lambda item: item[1]['requests']
+        elif sort == 'queries':
+            key = lambda item: item[1]['queries']['p95']
+        else:
+            key = lambda item: item[1]['wall_ms'][sort]
+        rows = sorted(report.items(), key=key, reverse=True)[:options['limit']]
+
+        self.stdout.write(
+            f"{'route':<40} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+            f"{'db p95':>9} {'q p50':>6} {'q p95':>6} {'dups':>5} {'cache':>6}"
+        )
+        for route, stats in rows:
+            wall, cache_ratio = stats['wall_ms'], stats['cache_hit_ratio']
+            self.stdout.write(
+                f"{route[:40]:<40} {stats['requests']:>6} {wall['p50']:>9.1f} {wall['p95']:>9.1f} "
+                f"{wall['p99']:>9.1f} {stats['db_ms']['p95']:>9.1f} {stats['queries']['p50']:>6} "
+                f"{stats['queries']['p95']:>6} {stats['duplicate_queries']['max']:>5} "
+                f"{'-' if cache_ratio is None else f'{cache_ratio:.0%}':>6}"
+            )
+        for route, stats in rows:
+            sql = stats['duplicate_queries']['most_repeated_sql']
+            if sql:
+                self.stdout.write(self.style.WARNING(f"{route} repeats: {sql}"))
+
+        if options['reset']:
+            reset_profiling()
+            self.stdout.write(self.style.SUCCESS('✓ Cleared profiling samples'))
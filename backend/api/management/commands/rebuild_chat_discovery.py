@@ -0,0 +1,18 @@
+"""
+Django management command to rebuild the chat room discovery index in Redis
+Usage: python manage.py rebuild_chat_discovery
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import get_redis_client
+from api.discovery import rebuild_discovery_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Redis church/location/channel discovery sets from the database'
+
+    def handle(self, *args, **options):
+        if get_redis_client() is None:
+            raise CommandError('The default cache is not Redis; discovery runs against the database')
+        indexed = rebuild_discovery_index()
+        self.stdout.write(self.style.SUCCESS(f"✓ Indexed {indexed} chat rooms"))
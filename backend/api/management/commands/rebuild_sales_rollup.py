@@ -0,0 +1,39 @@
+"""
+Django management command to rebuild the daily sales rollup from orders
+Usage: python manage.py rebuild_sales_rollup --batch-size 1000 [--queue]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import enqueue
+from api.models import DailySalesRollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute DailySalesRollup rows from the orders table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rollup rows written per INSERT'
+        )
+        parser.add_argument(
+            '--queue',
+            action='store_true',
+            help='Hand the rebuild to the job workers instead of running it here'
+        )
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            enqueue('rollups.rebuild', unique=True)
+            self.stdout.write(self.style.SUCCESS('✓ Queued a rollup rebuild'))
+            return
+        self.stdout.write('Rebuilding daily sales rollup...')
+        started = time.monotonic()
+        written = DailySalesRollup.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Wrote {written} rollup rows in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,31 @@
+"""
+Django management command to repair drift in product and seller rating counters
+Usage: python manage.py reconcile_ratings [--queue]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import enqueue
+from api.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute Product and seller rating counters from the reviews table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='store_true',
+                            help='Hand the reconcile to the job workers instead of running it here')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            enqueue('ratings.recompute', unique=True)
+            self.stdout.write(self.style.SUCCESS('✓ Queued a rating reconcile'))
+            return
+        self.stdout.write('Reconciling rating counters...')
+        started = time.monotonic()
+        products_fixed, sellers_fixed = Product.reconcile_ratings()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Corrected {products_fixed} products and {sellers_fixed} sellers "
+            f"in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,59 @@
+"""
+Django management command to run background job workers
+Usage: python manage.py run_workers --concurrency 4 [--burst]
+"""
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.jobs import LocalJobQueue, get_job_queue, run_pending, work
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (rating recomputation, sales rollups, thumbnails, email) until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOB_WORKERS,
+                            help='Worker threads, each running one job at a time')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is ready instead of waiting for more')
+        parser.add_argument('--poll', type=float, default=1,
+                            help='Seconds a worker blocks waiting for a job before checking for shutdown')
+
+    def handle(self, *args, **options):
+        queue = get_job_queue()
+        if isinstance(queue, LocalJobQueue):
+            raise CommandError('The default cache is not Redis; jobs run on threads of the process that queues them')
+        try:
+            stats = queue.stats()
+        except Exception as exc:
+            raise CommandError(f'Cannot reach the job queue: {exc}') from exc
+        self.stdout.write(f"Job queue: {', '.join(f'{n} {state}' for state, n in stats.items())}")
+
+        if options['burst']:
+            ran = run_pending(queue)
+            self.stdout.write(self.style.SUCCESS(f'✓ Ran {ran} jobs'))
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        counts = [0] * max(options['concurrency'], 1)
+
+        def run(index):
+            counts[index] = work(queue, stop, options['poll'])
+
+        threads = [threading.Thread(target=run, args=(i,), name=f'jobs-{i}') for i in range(len(counts))]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f'Started {len(threads)} workers; Ctrl+C or SIGTERM stops them after their current job')
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(f'✓ Workers stopped after running {sum(counts)} jobs'))
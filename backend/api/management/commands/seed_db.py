@@ -1,7 +1,10 @@
 """
 Django management command to seed the database with test data
 Usage: python manage.py seed_db --users 10 --products 20 --posts 15
+       python manage.py seed_db --scale 100k --batch-size 2000
 """
+import time
+
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.contrib.auth.models import User
@@ -10,6 +13,12 @@ from api.factories import (
     ProductFactory, ReviewFactory, OrderFactory, ArtistFactory
 )
 from api.models import UserProfile
+from api.seeding import BulkSeeder, SCALE_PRESETS, SEED_PASSWORD
+
+DEFAULT_COUNTS = {
+    'users': 10, 'categories': 5, 'products': 20, 'posts': 15,
+    'reviews': 30, 'orders': 10, 'artists': 5,
+}
 
 
 class Command(BaseCommand):
@@ -19,45 +28,67 @@ class Command(BaseCommand):
         parser.add_argument(
             '--users',
             type=int,
-            default=10,
+            default=None,
             help='Number of users to create'
         )
         parser.add_argument(
             '--categories',
             type=int,
-            default=5,
+            default=None,
             help='Number of categories to create'
         )
         parser.add_argument(
             '--products',
             type=int,
-            default=20,
+            default=None,
             help='Number of products to create'
         )
         parser.add_argument(
             '--posts',
             type=int,
-            default=15,
+            default=None,
             help='Number of blog posts to create'
         )
         parser.add_argument(
             '--reviews',
             type=int,
-            default=30,
+            default=None,
             help='Number of reviews to create'
         )
         parser.add_argument(
             '--orders',
             type=int,
-            default=10,
+            default=None,
             help='Number of orders to create'
         )
         parser.add_argument(
             '--artists',
             type=int,
-            default=5,
+            default=None,
             help='Number of featured artists to create'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Generate rows in memory and write them with bulk_create (no per-row signals)'
+        )
+        parser.add_argument(
+            '--scale',
+            choices=sorted(SCALE_PRESETS),
+            help='Preset row counts for load testing (implies --bulk); explicit counts override it'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per INSERT in bulk mode'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed for reproducible bulk data'
+        )
         parser.add_argument(
             '--clear',
             action='store_true',
@@ -72,6 +103,13 @@ class Command(BaseCommand):
         if options['clear']:
             self.clear_data()
 
+        preset = SCALE_PRESETS.get(options['scale'], DEFAULT_COUNTS)
+        for name, default in preset.items():
+            if options[name] is None:
+                options[name] = default
+        if options['bulk'] or options['scale']:
+            return self.seed_bulk(options)
+
         try:
             # Create categories first
             self.stdout.write('Creating categories...')
@@ -84,10 +122,8 @@ class Command(BaseCommand):
             self.stdout.write('Creating users and profiles...')
             users = []
             for _ in range(options['users']):
-                user = UserFactory.create()
-                # Ensure UserProfile exists (it should be auto-created via signals)
-                UserProfile.objects.get_or_create(user=user)
-                users.append(user)
+                # The UserProfile is created by the User post_save signal
+                users.append(UserFactory.create())
             self.stdout.write(self.style.SUCCESS(
                 f"✓ Created {len(users)} users with profiles"
             ))
@@ -108,9 +144,8 @@ class Command(BaseCommand):
             for _ in range(options['products']):
                 # Only sellers can have products
                 seller = users[_ % len(users)]
-                seller_profile, _ = UserProfile.objects.get_or_create(user=seller)
-                seller_profile.role = 'seller'
-                seller_profile.save()
+                seller.profile.role = 'seller'
+                seller.profile.save()  # Only writes the first time the role changes
                 
                 product = ProductFactory.create(
                     seller=seller,
@@ -166,9 +201,8 @@ class Command(BaseCommand):
             for _ in range(options['artists']):
                 # Make some users as artisans
                 artisan = users[_ % len(users)]
-                artisan_profile, _ = UserProfile.objects.get_or_create(user=artisan)
-                artisan_profile.role = 'artisan'
-                artisan_profile.save()
+                artisan.profile.role = 'artisan'
+                artisan.profile.save()
                 
                 artist = ArtistFactory.create(user=artisan)
                 artists.append(artist)
@@ -196,6 +230,24 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'❌ Error during seeding: {str(e)}'))
             raise
 
+    def seed_bulk(self, options):
+        """Insert rows with bulk_create and report throughput per model"""
+        counts = {name: options[name] for name in DEFAULT_COUNTS}
+        self.stdout.write(
+            'Bulk seeding ' + ', '.join(f'{count:,} {name}' for name, count in counts.items())
+            + f" in batches of {options['batch_size']}..."
+        )
+        started = time.monotonic()
+        seeder = BulkSeeder(batch_size=options['batch_size'], seed=options['seed'], log=self.stdout.write)
+        stats = seeder.run(counts)
+        if not stats:
+            self.stdout.write(self.style.WARNING('Nothing to seed without users'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Bulk seeding completed in {time.monotonic() - started:.2f}s"
+        ))
+        self.stdout.write(f'💡 Every seeded user can log in with password: {SEED_PASSWORD}')
+
     def clear_data(self):
         """Clear existing data before seeding"""
         self.stdout.write('Clearing existing data...')
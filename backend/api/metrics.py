@@ -0,0 +1,269 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms live in the worker's memory behind a lock
+held for a dictionary update, so recording is cheap from request threads
+and from the event loop alike. Each worker reports its own series; scrape
+every worker (or every instance) and aggregate in Prometheus. Values that
+already exist elsewhere, such as the response cache hit ratio and open
+database connections, are read by collectors when ``/metrics`` is rendered.
+"""
+import math
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .cache import response_cache_stats
+from .profiling import route_name
+
+NAMESPACE = 'harvestconnect'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+GROUP_SEND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = f'{NAMESPACE}_{name}'
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            yield self.name, key, value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for name, key, value in self.samples():
+            lines.append(f'{name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, remove_at_zero=False, **labels):
+        """Decrement; with remove_at_zero the series disappears instead of reporting 0"""
+        key = self._key(labels)
+        with self._lock:
+            value = self._values.get(key, 0) - amount
+            if remove_at_zero and value <= 0:
+                self._values.pop(key, None)
+            else:
+                self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def value(self, **labels):
+        """(count, sum) observed for labels, or None"""
+        state = super().value(**labels)
+        return None if state is None else (sum(state[:-1]), state[-1])
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        names = self.labelnames + ('le',)
+        for _, key, state in self.samples():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(names, key + (_format_value(float(bound)),))} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(state[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """Decorator for callables that refresh gauges right before rendering"""
+        self.collectors.append(func)
+        return func
+
+    def render(self):
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    'http_requests_total', 'HTTP requests served, by route, method and status code',
+    ('route', 'method', 'status')
+))
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time spent serving HTTP requests, by route', ('route',)
+))
+websocket_connections = registry.register(Gauge(
+    'websocket_connections', 'Open chat WebSocket connections, by room', ('room',)
+))
+group_send_duration = registry.register(Histogram(
+    'channel_group_send_seconds', 'Channel layer group_send latency, by event type', ('event',),
+    buckets=GROUP_SEND_BUCKETS
+))
+db_connections_opened = registry.register(Counter(
+    'db_connections_opened_total', 'Database connections opened by this worker', ('alias',)
+))
+db_connections_open = registry.register(Gauge(
+    'db_connections_open', 'Database connections currently held open by this worker', ('alias',)
+))
+db_connections_in_transaction = registry.register(Gauge(
+    'db_connections_in_transaction', 'Open database connections inside an atomic block', ('alias',)
+))
+response_cache_lookups = registry.register(Counter(
+    'response_cache_lookups_total', 'Response cache lookups, by ViewSet and outcome', ('viewset', 'outcome')
+))
+response_cache_hit_ratio = registry.register(Gauge(
+    'response_cache_hit_ratio', 'Response cache hits / (hits + misses), by ViewSet', ('viewset',)
+))
+
+# Every DatabaseWrapper this worker created; Django keeps one per thread and alias
+_wrappers = weakref.WeakSet()
+
+
+def _track_connection(sender, connection, **kwargs):
+    _wrappers.add(connection)
+    db_connections_opened.inc(alias=connection.alias)
+
+
+connection_created.connect(_track_connection, dispatch_uid='metrics_track_connection')
+
+
+@registry.collector
+def collect_db_connections():
+    db_connections_open.clear()
+    db_connections_in_transaction.clear()
+    for alias in connections:
+        db_connections_open.set(0, alias=alias)
+        db_connections_in_transaction.set(0, alias=alias)
+    for wrapper in list(_wrappers):
+        if wrapper.connection is not None:
+            db_connections_open.inc(alias=wrapper.alias)
+            if wrapper.in_atomic_block:
+                db_connections_in_transaction.inc(alias=wrapper.alias)
+
+
+@registry.collector
+def collect_response_cache():
+    response_cache_hit_ratio.clear()
+    for viewset, stats in response_cache_stats().items():
+        if stats['hit_ratio'] is not None:
+            response_cache_hit_ratio.set(stats['hit_ratio'], viewset=viewset)
+
+
+class MetricsMiddleware:
+    """Count and time every HTTP request by the route that served it"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        route = getattr(request, '_metrics_route', None) or 'unresolved'
+        http_request_duration.observe(time.perf_counter() - started, route=route)
+        http_requests.inc(route=route, method=request.method, status=response.status_code)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_route = route_name(request, view_func)
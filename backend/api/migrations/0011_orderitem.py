@@ -0,0 +1,91 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:42
+
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def backfill_order_items(apps, schema_editor):
+    """Explode every existing Order.products JSON blob into OrderItem rows"""
+    Order = apps.get_model('api', 'Order')
+    OrderItem = apps.get_model('api', 'OrderItem')
+    Product = apps.get_model('api', 'Product')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    products = {p.id: p for p in Product.objects.select_related('category')}
+    user_ids = set(User.objects.values_list('id', flat=True))
+
+    batch = []
+    for order in Order.objects.only('id', 'products', 'created_at').iterator(chunk_size=1000):
+        for line in order.products or []:
+            if not isinstance(line, dict):
+                continue
+            product = products.get(_int_or_none(line.get('id', line.get('product'))))
+            seller_id = product.seller_id if product else _int_or_none(line.get('seller_id'))
+            if seller_id not in user_ids:
+                seller_id = None
+
+            category = line.get('category')
+            if isinstance(category, dict):
+                category = category.get('name')
+            if not category and product and product.category:
+                category = product.category.name
+
+            try:
+                unit_price = Decimal(str(line.get('price', product.price if product else 0)))
+            except (InvalidOperation, ValueError):
+                unit_price = Decimal('0')
+
+            batch.append(OrderItem(
+                order_id=order.id,
+                product=product,
+                seller_id=seller_id,
+                title=str(line.get('title') or (product.title if product else ''))[:255],
+                unit_price=unit_price,
+                quantity=_int_or_none(line.get('quantity')) or 1,
+                category=(category or 'Other')[:100],
+                created_at=order.created_at,
+            ))
+        if len(batch) >= 1000:
+            OrderItem.objects.bulk_create(batch)
+            batch = []
+    OrderItem.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0010_alter_chatroom_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('category', models.CharField(default='Other', max_length=100)),
+                ('created_at', models.DateTimeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.order')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='api.product')),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sold_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['seller', 'created_at'], name='api_orderit_seller__5532f1_idx'), models.Index(fields=['product'], name='api_orderit_product_1a13b6_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_order_items, migrations.RunPython.noop),
+    ]
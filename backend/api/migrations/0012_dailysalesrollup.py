@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+import django.db.models.deletion
+
+
+def backfill_rollup(apps, schema_editor):
+    """Seed the rollup from existing orders; same buckets as DailySalesRollup.rebuild"""
+    Order = apps.get_model('api', 'Order')
+    OrderItem = apps.get_model('api', 'OrderItem')
+    DailySalesRollup = apps.get_model('api', 'DailySalesRollup')
+
+    def dimensions(prefix):
+        return {
+            'day': TruncDate('created_at'),
+            'church_name': Coalesce(f'{prefix}buyer__profile__home_church', Value('')),
+            'location_name': Coalesce(f'{prefix}buyer__profile__location', Value('')),
+        }
+
+    order_rows = Order.objects.exclude(status='cancelled').values(**dimensions('')) \
+        .annotate(total=Sum('total_amount'), orders=Count('id')).order_by()
+    line_rows = OrderItem.objects.exclude(order__status='cancelled').values('seller_id', 'category', **dimensions('order__')) \
+        .annotate(total=Sum(F('unit_price') * F('quantity')), orders=Count('order', distinct=True)).order_by()
+
+    rollups = [
+        DailySalesRollup(
+            seller_id=row.get('seller_id'),
+            category=row.get('category') or ('Other' if 'category' in row else ''),
+            date=row['day'], church=row['church_name'], location=row['location_name'],
+            revenue=row['total'] or 0, order_count=row['orders'],
+        )
+        for rows in (order_rows, line_rows) for row in rows.iterator()
+    ]
+    DailySalesRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0011_orderitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(blank=True, default='', max_length=100)),
+                ('church', models.CharField(blank=True, default='', max_length=255)),
+                ('location', models.CharField(blank=True, default='', max_length=255)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('seller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'category'], name='api_dailysa_date_31e32d_idx'), models.Index(fields=['seller', 'date'], name='api_dailysa_seller__e68950_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
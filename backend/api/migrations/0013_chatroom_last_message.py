@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:50
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_last_message(apps, schema_editor):
+    ChatRoom = apps.get_model('api', 'ChatRoom')
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+    latest = ChatMessage.objects.filter(room=OuterRef('pk')).order_by('-timestamp', '-id').values('id')[:1]
+    ChatRoom.objects.update(last_message=Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.chatmessage'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['room', '-timestamp'], name='api_chatmes_room_id_bc4622_idx'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+# Frozen copy of api.search as of this migration, so later changes there don't alter history
+SEARCH_CONFIG = 'english'
+SEARCH_FIELDS = {
+    'Product': (('title', 'A'), ('description', 'B')),
+    'BlogPost': (('title', 'A'), ('excerpt', 'B'), ('content', 'C')),
+}
+
+SQLITE_INSTALL = {
+    'Product': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS api_product_fts USING fts5("
+        "title, description, content='api_product', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS api_product_fts_ai AFTER INSERT ON api_product BEGIN "
+        "INSERT INTO api_product_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS api_product_fts_ad AFTER DELETE ON api_product BEGIN "
+        "INSERT INTO api_product_fts(api_product_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS api_product_fts_au AFTER UPDATE OF title, description ON api_product BEGIN "
+        "INSERT INTO api_product_fts(api_product_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO api_product_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "INSERT INTO api_product_fts(api_product_fts) VALUES ('rebuild')",
+    ],
+    'BlogPost': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS api_blogpost_fts USING fts5("
+        "title, excerpt, content, content='api_blogpost', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS api_blogpost_fts_ai AFTER INSERT ON api_blogpost BEGIN "
+        "INSERT INTO api_blogpost_fts(rowid, title, excerpt, content) "
+        "VALUES (new.id, new.title, new.excerpt, new.content); END",
+        "CREATE TRIGGER IF NOT EXISTS api_blogpost_fts_ad AFTER DELETE ON api_blogpost BEGIN "
+        "INSERT INTO api_blogpost_fts(api_blogpost_fts, rowid, title, excerpt, content) "
+        "VALUES ('delete', old.id, old.title, old.excerpt, old.content); END",
+        "CREATE TRIGGER IF NOT EXISTS api_blogpost_fts_au AFTER UPDATE OF title, excerpt, content ON api_blogpost BEGIN "
+        "INSERT INTO api_blogpost_fts(api_blogpost_fts, rowid, title, excerpt, content) "
+        "VALUES ('delete', old.id, old.title, old.excerpt, old.content); "
+        "INSERT INTO api_blogpost_fts(rowid, title, excerpt, content) "
+        "VALUES (new.id, new.title, new.excerpt, new.content); END",
+        "INSERT INTO api_blogpost_fts(api_blogpost_fts) VALUES ('rebuild')",
+    ],
+}
+
+SQLITE_REMOVE = {
+    'Product': [
+        'DROP TRIGGER IF EXISTS api_product_fts_ai',
+        'DROP TRIGGER IF EXISTS api_product_fts_ad',
+        'DROP TRIGGER IF EXISTS api_product_fts_au',
+        'DROP TABLE IF EXISTS api_product_fts',
+    ],
+    'BlogPost': [
+        'DROP TRIGGER IF EXISTS api_blogpost_fts_ai',
+        'DROP TRIGGER IF EXISTS api_blogpost_fts_ad',
+        'DROP TRIGGER IF EXISTS api_blogpost_fts_au',
+        'DROP TABLE IF EXISTS api_blogpost_fts',
+    ],
+}
+
+
+def search_index(name):
+    vector = None
+    for field, weight in SEARCH_FIELDS[name]:
+        part = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return GinIndex(vector, name=f'api_{name.lower()}_search_idx')
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for name in SEARCH_FIELDS:
+        if vendor == 'postgresql':
+            schema_editor.add_index(apps.get_model('api', name), search_index(name))
+        elif vendor == 'sqlite':
+            for statement in SQLITE_INSTALL[name]:
+                schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for name in SEARCH_FIELDS:
+        if vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS api_{name.lower()}_search_idx')
+        elif vendor == 'sqlite':
+            for statement in SQLITE_REMOVE[name]:
+                schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_chatroom_last_message'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
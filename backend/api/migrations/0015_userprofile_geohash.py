@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:03
+
+from django.db import migrations, models
+
+# Frozen copy of api.geo.encode_geohash, so later changes there don't alter history
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def backfill_geohash(apps, schema_editor):
+    UserProfile = apps.get_model('api', 'UserProfile')
+    located = UserProfile.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    profiles = list(located.only('id', 'latitude', 'longitude'))
+    for profile in profiles:
+        profile.geohash = encode_geohash(profile.latitude, profile.longitude)
+    UserProfile.objects.bulk_update(profiles, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=9),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
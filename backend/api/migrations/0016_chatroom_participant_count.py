@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_participant_count(apps, schema_editor):
+    ChatRoom = apps.get_model('api', 'ChatRoom')
+    Membership = ChatRoom.participants.through
+    counts = Membership.objects.filter(chatroom=OuterRef('pk')).order_by().values('chatroom').annotate(
+        n=Count('id')
+    ).values('n')
+    ChatRoom.objects.update(participant_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_userprofile_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_participant_count, migrations.RunPython.noop),
+    ]
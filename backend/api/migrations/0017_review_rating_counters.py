@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:18
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def backfill_rating_counters(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    Review = apps.get_model('api', 'Review')
+    UserProfile = apps.get_model('api', 'UserProfile')
+
+    def from_reviews(lookup, outer, aggregate):
+        reviews = Review.objects.filter(**{lookup: OuterRef(outer)}).order_by().values(lookup)
+        return Coalesce(Subquery(reviews.annotate(v=aggregate).values('v')), 0)
+
+    def average(total, count):
+        return Coalesce(Cast(total, FloatField()) / NullIf(count, 0), Value(0.0))
+
+    total = from_reviews('product', 'pk', Sum('rating'))
+    count = from_reviews('product', 'pk', Count('id'))
+    Product.objects.update(rating_total=total, reviews_count=count, rating=average(total, count))
+
+    total = from_reviews('product__seller', 'user_id', Sum('rating'))
+    count = from_reviews('product__seller', 'user_id', Count('id'))
+    UserProfile.objects.update(
+        seller_rating_total=total, seller_reviews_count=count, seller_rating=average(total, count)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_chatroom_participant_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='seller_rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='seller_rating_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='seller_reviews_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_counters, migrations.RunPython.noop),
+    ]
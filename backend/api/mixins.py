@@ -0,0 +1,223 @@
+import sys
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+SHAPING_PARAMS = ('fields', 'omit', 'expand')
+
+
+def requested_fields(request, param='fields'):
+    """Names from ?<param>=a,b.c, or None when the parameter is absent"""
+    if request is None or not request.query_params.get(param):
+        return None
+    return {name.strip() for name in request.query_params[param].split(',') if name.strip()}
+
+
+def _names_at(entries, path):
+    """First name segment of every entry under path ('' is the response root)"""
+    prefix = f'{path}.' if path else ''
+    return {
+        entry[len(prefix):].split('.')[0]
+        for entry in entries or ()
+        if entry.startswith(prefix) and len(entry) > len(prefix)
+    }
+
+
+def _leaves_at(entries, path):
+    prefix = f'{path}.' if path else ''
+    return {
+        entry[len(prefix):]
+        for entry in entries or ()
+        if entry.startswith(prefix) and '.' not in entry[len(prefix):]
+    }
+
+
+def _serializer_of(field):
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+def _source_root(field):
+    """Model attribute a serializer field reads first"""
+    if field.source == '*':
+        return field.field_name
+    return field.source.split('.')[0]
+
+
+class SparseFieldsMixin:
+    """
+    Shape GET responses from the query string.
+
+    ``?fields=a,b`` keeps only the named fields, ``?omit=a,b`` drops them and
+    ``?expand=a`` renders a relation listed in ``Meta.expandable_fields`` as a
+    nested object instead of its primary key. Names may be dotted to reach
+    nested serializers (``?fields=id,seller.email``); unknown names are
+    ignored.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return fields
+        path = self.field_path()
+
+        for name in _names_at(requested_fields(request, 'expand'), path):
+            fields = self._expand(fields, name)
+        wanted = _names_at(requested_fields(request), path)
+        if wanted & set(fields):
+            fields = {name: field for name, field in fields.items() if name in wanted}
+        omitted = _leaves_at(requested_fields(request, 'omit'), path)
+        return {name: field for name, field in fields.items() if name not in omitted}
+
+    def field_path(self):
+        """Dotted position of this serializer in the response, '' at the root"""
+        parts = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                parts.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(parts))
+
+    def _expand(self, fields, name):
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        if name not in expandable or name not in fields:
+            return fields
+        serializer_class = expandable[name]
+        if isinstance(serializer_class, str):
+            serializer_class = getattr(sys.modules[type(self).__module__], serializer_class)
+        source = fields[name].source
+        kwargs = {'source': source} if source and source != name else {}
+        return {**fields, name: serializer_class(read_only=True, **kwargs)}
+
+
+class EagerLoadingMixin:
+    """
+    Apply a ViewSet's declared eager-loading plan to its queryset.
+
+    ``select_related_fields`` and ``prefetch_related_fields`` list the
+    relations the serializer walks, so list endpoints cost a fixed number
+    of queries regardless of page size. When a GET is shaped with
+    ``?fields=``/``?omit=``/``?expand=`` the plan follows the shaped
+    serializer: relations nobody renders are skipped, expanded ones are
+    joined, and columns nobody renders are deferred.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def get_queryset(self):
+        return self.eager_load(super().get_queryset())
+
+    def eager_load(self, queryset):
+        select_related = list(self.select_related_fields)
+        prefetch_related = list(self.prefetch_related_fields)
+        deferred = []
+
+        serializer = self.get_shaped_serializer()
+        if serializer is not None:
+            select_related = [
+                lookup for lookup in (_rendered_lookup(serializer, f) for f in select_related) if lookup
+            ]
+            prefetch_related = [
+                p for p in prefetch_related
+                if _rendered_lookup(serializer, p.prefetch_through if isinstance(p, Prefetch) else p)
+            ]
+            select_related += _expanded_lookups(serializer, queryset.model)
+            deferred = _deferrable_fields(
+                serializer, queryset.model, keep=set(self.get_keyset_fields()) | {
+                    lookup.split('__')[0] for lookup in select_related
+                }
+            )
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
+
+    def get_shaped_serializer(self):
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        if not any(request.query_params.get(param) for param in SHAPING_PARAMS):
+            return None
+        if not issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            return None
+        return self.get_serializer()
+
+    def get_keyset_fields(self):
+        """Columns keyset pagination reads from the page's edge rows"""
+        ordering = getattr(self, 'keyset_ordering', None)
+        if ordering is None:
+            ordering = getattr(self.pagination_class, 'default_ordering', ())
+        return [field.lstrip('-') for field in ordering]
+
+
+def _rendered_lookup(serializer, lookup):
+    """The leading part of a relation lookup that the serializer still renders"""
+    node, kept = serializer, []
+    for part in lookup.split('__'):
+        field = next((f for f in node.fields.values() if _source_root(f) == part), None)
+        if field is None:
+            break
+        node = _serializer_of(field)
+        if node is None:
+            # A method or primary-key field may use anything below this point
+            return lookup
+        kept.append(part)
+    return '__'.join(kept)
+
+
+def _expanded_lookups(serializer, model):
+    request = serializer.context['request']
+    expandable = getattr(serializer.Meta, 'expandable_fields', {})
+    lookups = []
+    for name in _names_at(requested_fields(request, 'expand'), '') & set(expandable):
+        if name in serializer.fields:
+            lookups += _nested_lookups(serializer.fields[name], model, '')
+    return lookups
+
+
+def _nested_lookups(field, model, prefix):
+    """select_related paths for a nested serializer field and its own nested FKs"""
+    nested = _serializer_of(field)
+    if nested is None or isinstance(field, serializers.ListSerializer):
+        return []
+    try:
+        relation = model._meta.get_field(_source_root(field))
+    except FieldDoesNotExist:
+        return []
+    if not (relation.many_to_one or relation.one_to_one):
+        return []
+    path = f'{prefix}{relation.name}'
+    lookups = [path]
+    for child in nested.fields.values():
+        lookups += _nested_lookups(child, relation.related_model, f'{path}__')
+    return lookups
+
+
+def _deferrable_fields(serializer, model, keep):
+    """Concrete columns no rendered field reads; empty when that cannot be known"""
+    needed = set(keep) | {model._meta.pk.name}
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        # Fields reading several attributes (source='*') may list them in model_fields
+        for root in getattr(field, 'model_fields', None) or [_source_root(field)]:
+            try:
+                model_field = model._meta.get_field(root)
+            except FieldDoesNotExist:
+                model_field = next((f for f in model._meta.concrete_fields if f.attname == root), None)
+                if model_field is None:
+                    return []  # Properties and methods may read any column
+            needed.add(model_field.name)
+    return [
+        field.name for field in model._meta.concrete_fields
+        if field.name not in needed
+    ]
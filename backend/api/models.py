@@ -1,8 +1,31 @@
-from django.db import models
+from django.db import models, router, transaction
+import copy
 import uuid
+from decimal import Decimal, InvalidOperation
 from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, TruncDate
+from django.utils import timezone
 from django.utils.text import slugify
+from .cache import bump_versions
+from .geo import GEOHASH_PRECISION, encode_geohash
+
+
+def _preserve_counters(instance, counter_fields, kwargs):
+    """Keep a plain save() of an existing row from writing back stale columns maintained elsewhere"""
+    if instance._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None:
+        return
+    kwargs['update_fields'] = [
+        f.name for f in instance._meta.concrete_fields
+        if not f.primary_key and f.name not in counter_fields
+    ]
+
+
+def _average(total, count):
+    """total / count as a float, 0 when count is 0"""
+    return Coalesce(Cast(total, FloatField()) / NullIf(count, 0), Value(0.0))
 
 
 class UserProfile(models.Model):
@@ -28,9 +51,77 @@ class UserProfile(models.Model):
     faith_based = models.BooleanField(default=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=GEOHASH_PRECISION, blank=True, default='', db_index=True, editable=False)
+    # Reviews across all of this user's products, maintained by Product.apply_review
+    seller_rating = models.FloatField(default=0, editable=False)
+    seller_rating_total = models.IntegerField(default=0, editable=False)
+    seller_reviews_count = models.IntegerField(default=0, editable=False)
+    # Thumbnail and responsive-width variants per image field, written by api.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    RATING_COUNTER_FIELDS = ('seller_rating', 'seller_rating_total', 'seller_reviews_count')
+    DERIVATIVE_FIELDS = ('avatar', 'banner')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so save() writes only the fields that changed
+        instance._remember_values(field_names)
+        return instance
+
+    def _remember_values(self, field_names=None):
+        """Snapshot the database form of field_names (every loaded field by default)"""
+        loaded = getattr(self, '_loaded_values', {})
+        deferred = self.get_deferred_fields()
+        for f in self._meta.concrete_fields:
+            if f.attname in deferred or (field_names is not None and f.attname not in field_names
+                                         and f.name not in field_names):
+                continue
+            # Prep values are plain data (file names rather than FieldFiles), so later edits can't leak in
+            loaded[f.attname] = copy.deepcopy(f.get_prep_value(getattr(self, f.attname)))
+        self._loaded_values = loaded
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._remember_values(fields)
+
+    def changed_fields(self):
+        """Names of fields that differ from the last loaded or saved row; every field for new profiles"""
+        fields = [f for f in self._meta.concrete_fields if not f.primary_key]
+        loaded = getattr(self, '_loaded_values', None)
+        if self._state.adding or loaded is None:
+            return {f.name for f in fields}
+        changed = set()
+        for f in fields:
+            if f.attname in loaded:
+                if loaded[f.attname] != f.get_prep_value(getattr(self, f.attname)):
+                    changed.add(f.name)
+            elif f.attname in self.__dict__:
+                # A deferred field counts as changed once something assigns it
+                changed.add(f.name)
+        return changed
+
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        elif update_fields is None and not self._state.adding and hasattr(self, '_loaded_values'):
+            # Only implicit saves are narrowed; explicit update_fields are always written
+            changed = self.changed_fields() - set(self.RATING_COUNTER_FIELDS) - {'image_derivatives'}
+            if not changed:
+                return
+            kwargs['update_fields'] = changed | {'updated_at'}
+        _preserve_counters(self, self.RATING_COUNTER_FIELDS + ('image_derivatives',), kwargs)
+        super().save(*args, **kwargs)
+        saved = kwargs.get('update_fields')
+        self._remember_values(None if saved is None else set(saved))
+    
     def __str__(self):
         return f"{self.user.email} - {self.role}"
     
@@ -38,6 +129,45 @@ class UserProfile(models.Model):
         ordering = ['-created_at']
 
 
+class TokenUser(User):
+    """User built from access token claims; its fields load on first use in one query with the profile"""
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, user_id, claims):
+        user = cls.from_db(router.db_for_read(cls), ['id'], [user_id])
+        user.claims = claims
+        return user
+
+    @property
+    def is_loaded(self):
+        return not self.get_deferred_fields()
+
+    def load(self):
+        """Fetch every deferred field and the profile, keeping values assigned since construction"""
+        try:
+            user = User.objects.select_related('profile').get(pk=self.pk)
+        except User.DoesNotExist:
+            raise PermissionDenied('User not found')
+        if not user.is_active:
+            raise PermissionDenied('User is inactive')
+        for field in self._meta.concrete_fields:
+            self.__dict__.setdefault(field.attname, getattr(user, field.attname))
+        try:
+            self.profile = user.profile
+        except UserProfile.DoesNotExist:
+            pass
+
+    def refresh_from_db(self, using=None, fields=None):
+        # Reading one deferred field loads them all rather than querying per field
+        if fields is not None and set(fields) <= self.get_deferred_fields():
+            self.load()
+        else:
+            super().refresh_from_db(using=using, fields=fields)
+
+
 class Category(models.Model):
     """Categories for products and blog posts"""
     name = models.CharField(max_length=100, unique=True)
@@ -77,11 +207,15 @@ class BlogPost(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blog_posts')
     featured = models.BooleanField(default=False)
     image = models.ImageField(upload_to='blog/', blank=True, null=True)
+    # Thumbnail and responsive-width variants per image field, written by api.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     views = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     published = models.BooleanField(default=True)
     
+    DERIVATIVE_FIELDS = ('image',)
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
@@ -112,18 +246,88 @@ class Product(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     images = models.JSONField(default=list, blank=True)  # Additional images
-    rating = models.FloatField(default=0, validators=[MinValueValidator(0), MaxValueValidator(5)])
-    reviews_count = models.IntegerField(default=0)
+    # Thumbnail and responsive-width variants per image field, written by api.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    # Rating counters, maintained by apply_review as reviews change
+    rating = models.FloatField(default=0, validators=[MinValueValidator(0), MaxValueValidator(5)], editable=False)
+    rating_total = models.IntegerField(default=0, editable=False)
+    reviews_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    RATING_COUNTER_FIELDS = ('rating', 'rating_total', 'reviews_count')
+    DERIVATIVE_FIELDS = ('image', 'images')
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        _preserve_counters(self, self.RATING_COUNTER_FIELDS + ('image_derivatives',), kwargs)
         super().save(*args, **kwargs)
     
     def __str__(self):
         return self.title
+
+    @classmethod
+    def apply_review(cls, product_id, rating, sign=1):
+        """Add (sign=1) or remove (sign=-1) one review's rating on the product and its seller"""
+        delta = sign * rating
+        with transaction.atomic():
+            # SET expressions read the pre-update row, so the average uses the new total and count
+            cls.objects.filter(pk=product_id).update(
+                rating_total=F('rating_total') + delta,
+                reviews_count=F('reviews_count') + sign,
+                rating=_average(F('rating_total') + delta, F('reviews_count') + sign),
+            )
+            UserProfile.objects.filter(user__products=product_id).update(
+                seller_rating_total=F('seller_rating_total') + delta,
+                seller_reviews_count=F('seller_reviews_count') + sign,
+                seller_rating=_average(F('seller_rating_total') + delta, F('seller_reviews_count') + sign),
+            )
+            transaction.on_commit(lambda: bump_versions(cls, [product_id]))
+            transaction.on_commit(lambda: bump_versions(UserProfile, []))
+
+    @classmethod
+    def reconcile_ratings(cls, product_ids=None, seller_ids=None):
+        """Recompute rating counters from reviews, optionally only for some products and sellers; returns rows corrected"""
+        def from_reviews(lookup, aggregate):
+            reviews = Review.objects.filter(**{lookup: OuterRef('pk' if lookup == 'product' else 'user_id')})
+            return Coalesce(Subquery(reviews.order_by().values(lookup).annotate(v=aggregate).values('v')), 0)
+
+        product_total = from_reviews('product', Sum('rating'))
+        product_count = from_reviews('product', Count('id'))
+        seller_total = from_reviews('product__seller', Sum('rating'))
+        seller_count = from_reviews('product__seller', Count('id'))
+
+        products, sellers = cls.objects.all(), UserProfile.objects.all()
+        if product_ids is not None or seller_ids is not None:
+            products = products.filter(pk__in=product_ids or [])
+            sellers = sellers.filter(user_id__in=seller_ids or [])
+
+        with transaction.atomic():
+            stale_products = list(products.annotate(expected_total=product_total, expected_count=product_count).filter(
+                ~Q(rating_total=F('expected_total')) | ~Q(reviews_count=F('expected_count'))
+                | ~Q(rating=_average(F('expected_total'), F('expected_count')))
+            ).values_list('pk', flat=True))
+            products_fixed = cls.objects.filter(pk__in=stale_products).update(
+                rating_total=product_total,
+                reviews_count=product_count,
+                rating=_average(product_total, product_count),
+            )
+            stale_sellers = list(sellers.annotate(expected_total=seller_total, expected_count=seller_count).filter(
+                ~Q(seller_rating_total=F('expected_total')) | ~Q(seller_reviews_count=F('expected_count'))
+                | ~Q(seller_rating=_average(F('expected_total'), F('expected_count')))
+            ).values_list('pk', flat=True))
+            sellers_fixed = UserProfile.objects.filter(pk__in=stale_sellers).update(
+                seller_rating_total=seller_total,
+                seller_reviews_count=seller_count,
+                seller_rating=_average(seller_total, seller_count),
+            )
+            # update() sends no post_save, so cached responses rendering these rows are invalidated here
+            if stale_products:
+                transaction.on_commit(lambda: bump_versions(cls, stale_products))
+            if stale_sellers:
+                transaction.on_commit(lambda: bump_versions(UserProfile, stale_sellers))
+        return products_fixed, sellers_fixed
     
     class Meta:
         ordering = ['-created_at']
@@ -148,6 +352,15 @@ class Review(models.Model):
         unique_together = ['product', 'reviewer']
         ordering = ['-created_at']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the product aggregates currently include for this review
+        loaded = dict(zip(field_names, values))
+        if 'product_id' in loaded and 'rating' in loaded:
+            instance._counted_rating = (loaded['product_id'], loaded['rating'])
+        return instance
+    
     def __str__(self):
         return f"Review by {self.reviewer.email} for {self.product.title}"
 
@@ -187,6 +400,64 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so saves can tell which fields changed
+        instance._loaded_values = copy.deepcopy(dict(zip(field_names, values)))
+        return instance
+
+    def has_changed(self, field_name):
+        """True for unsaved orders or when field_name differs from the loaded value"""
+        loaded = getattr(self, '_loaded_values', None)
+        if self._state.adding or loaded is None or field_name not in loaded:
+            return True
+        return loaded[field_name] != getattr(self, field_name)
+
+    def sync_items(self):
+        """Rebuild the normalized OrderItem rows from the products JSON snapshot"""
+        lines = [p for p in (self.products or []) if isinstance(p, dict)]
+        product_ids = {_int_or_none(p.get('id', p.get('product'))) for p in lines} - {None}
+        products = Product.objects.select_related('category').in_bulk(product_ids) if product_ids else {}
+
+        # Only trust seller ids from the JSON blob when they point at real users
+        seller_ids = {_int_or_none(p.get('seller_id')) for p in lines} - {None}
+        known_sellers = set(
+            User.objects.filter(id__in=seller_ids).values_list('id', flat=True)
+        ) if seller_ids else set()
+
+        items = []
+        for p in lines:
+            product = products.get(_int_or_none(p.get('id', p.get('product'))))
+            seller_id = product.seller_id if product else _int_or_none(p.get('seller_id'))
+            if seller_id not in known_sellers and not product:
+                seller_id = None
+
+            category = p.get('category')
+            if isinstance(category, dict):
+                category = category.get('name')
+            if not category and product and product.category:
+                category = product.category.name
+
+            try:
+                unit_price = Decimal(str(p.get('price', product.price if product else 0)))
+            except (InvalidOperation, ValueError):
+                unit_price = Decimal('0')
+
+            items.append(OrderItem(
+                order=self,
+                product=product,
+                seller_id=seller_id,
+                title=str(p.get('title') or (product.title if product else ''))[:255],
+                unit_price=unit_price,
+                quantity=_int_or_none(p.get('quantity')) or 1,
+                category=(category or 'Other')[:100],
+                created_at=self.created_at,
+            ))
+
+        self.items.all().delete()
+        OrderItem.objects.bulk_create(items)
+
     def __str__(self):
         return f"Order {self.order_id}"
     
@@ -194,6 +465,164 @@ class Order(models.Model):
         ordering = ['-created_at']
 
 
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class OrderItem(models.Model):
+    """Normalized order line, one per product in Order.products"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_items')
+    seller = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sold_items')
+    title = models.CharField(max_length=255, blank=True)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=1)
+    category = models.CharField(max_length=100, default='Other')  # Category name at time of order
+    created_at = models.DateTimeField()  # Copied from the order so seller history is range-scannable
+
+    def __str__(self):
+        return f"{self.quantity} x {self.title} ({self.order.order_id})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['seller', 'created_at']),
+            models.Index(fields=['product']),
+        ]
+
+
+class DailySalesRollupQuerySet(models.QuerySet):
+    def orders(self):
+        """Order-level rows: revenue is Order.total_amount, order_count is exact"""
+        return self.filter(category=DailySalesRollup.ORDER_TOTAL)
+
+    def lines(self):
+        """Line-level rows split by seller and category"""
+        return self.exclude(category=DailySalesRollup.ORDER_TOTAL)
+
+
+class DailySalesRollup(models.Model):
+    """Pre-aggregated daily sales, maintained incrementally as orders change.
+
+    Each non-cancelled order adds one order-level row (blank category, no seller)
+    carrying its total_amount, plus one line-level row per (seller, category) it
+    touches. Rows are only ever read through Sum(), so a duplicate bucket row is
+    harmless. rebuild() recomputes them from the orders table to repair drift.
+    """
+    ORDER_TOTAL = ''
+
+    date = models.DateField()
+    seller = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sales_rollups')
+    category = models.CharField(max_length=100, blank=True, default=ORDER_TOTAL)
+    church = models.CharField(max_length=255, blank=True, default='')
+    location = models.CharField(max_length=255, blank=True, default='')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    objects = DailySalesRollupQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.date} {self.category or 'orders'}: {self.revenue}"
+
+    class Meta:
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'category']),
+            models.Index(fields=['seller', 'date']),
+        ]
+
+    @classmethod
+    def apply_order(cls, order, sign=1, total_amount=None):
+        """Add (sign=1) or remove (sign=-1) one order's contribution"""
+        profile = UserProfile.objects.filter(user_id=order.buyer_id).values('home_church', 'location').first() or {}
+        dimensions = {
+            'date': timezone.localtime(order.created_at).date(),
+            'church': profile.get('home_church') or '',
+            'location': profile.get('location') or '',
+        }
+
+        amount = order.total_amount if total_amount is None else total_amount
+        buckets = {(None, cls.ORDER_TOTAL): Decimal(amount or 0)}
+        for item in order.items.all():
+            key = (item.seller_id, item.category or 'Other')
+            buckets[key] = buckets.get(key, Decimal('0')) + item.unit_price * item.quantity
+
+        for (seller_id, category), revenue in buckets.items():
+            bucket = cls.objects.filter(seller_id=seller_id, category=category, **dimensions)
+            updated = bucket.update(
+                revenue=F('revenue') + sign * revenue,
+                order_count=F('order_count') + sign,
+            )
+            if not updated:
+                cls.objects.create(
+                    seller_id=seller_id, category=category,
+                    revenue=sign * revenue, order_count=sign, **dimensions
+                )
+
+    @classmethod
+    def rebuild(cls, batch_size=1000, dates=None):
+        """Recompute every row, or only the given days, from the orders table; returns the number of rows written"""
+        def profile_field(prefix, field):
+            return Coalesce(f'{prefix}buyer__profile__{field}', Value(''))
+
+        orders, items, rows_to_replace = Order.objects.all(), OrderItem.objects.all(), cls.objects.all()
+        if dates is not None:
+            orders = orders.filter(created_at__date__in=dates)
+            items = items.filter(created_at__date__in=dates)
+            rows_to_replace = rows_to_replace.filter(date__in=dates)
+
+        order_rows = orders.exclude(status='cancelled').values(
+            day=TruncDate('created_at'),
+            church_name=profile_field('', 'home_church'),
+            location_name=profile_field('', 'location'),
+        ).annotate(total=Sum('total_amount'), orders=Count('id')).order_by()
+
+        line_rows = items.exclude(order__status='cancelled').values(
+            'seller_id', 'category',
+            day=TruncDate('created_at'),
+            church_name=profile_field('order__', 'home_church'),
+            location_name=profile_field('order__', 'location'),
+        ).annotate(
+            total=Sum(F('unit_price') * F('quantity')),
+            orders=Count('order', distinct=True),
+        ).order_by()
+
+        def rows():
+            for row in order_rows.iterator():
+                yield cls(category=cls.ORDER_TOTAL, **_rollup_fields(row))
+            for row in line_rows.iterator():
+                yield cls(seller_id=row['seller_id'], category=row['category'] or 'Other', **_rollup_fields(row))
+
+        with transaction.atomic():
+            if dates is not None:
+                # Concurrent rebuilds of the same day wait here, so each deletes the rows the other wrote
+                list(orders.select_for_update().order_by('pk').values_list('pk', flat=True))
+            rows_to_replace.delete()
+            written = 0
+            batch = []
+            for row in rows():
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    cls.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+            cls.objects.bulk_create(batch)
+        return written + len(batch)
+
+
+def _rollup_fields(row):
+    return {
+        'date': row['day'],
+        'church': row['church_name'],
+        'location': row['location_name'],
+        'revenue': row['total'] or 0,
+        'order_count': row['orders'],
+    }
+
+
 class Artist(models.Model):
     """Featured artists/vendors profile"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='artist_profile')
@@ -201,11 +630,15 @@ class Artist(models.Model):
     specialty = models.CharField(max_length=255)
     bio = models.TextField()
     profile_image = models.ImageField(upload_to='artists/')
+    # Thumbnail and responsive-width variants per image field, written by api.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     portfolio_url = models.URLField(blank=True, null=True)
     social_media = models.JSONField(default=dict, blank=True)
     featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    DERIVATIVE_FIELDS = ('profile_image',)
+    
     def __str__(self):
         return self.name
     
@@ -261,11 +694,22 @@ class ChatRoom(models.Model):
     church = models.CharField(max_length=255, blank=True, null=True)
     location = models.CharField(max_length=255, blank=True, null=True)
     participants = models.ManyToManyField(User, related_name='chat_rooms')
+    participant_count = models.PositiveIntegerField(default=0, editable=False)
+    last_message = models.ForeignKey(
+        'ChatMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )  # Denormalized pointer so room listings skip a per-room history lookup
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"[{self.room_type.upper()}] {self.name}"
 
+    @classmethod
+    def recount_participants(cls, room_ids):
+        """Recompute participant_count for the given rooms in one UPDATE"""
+        membership = cls.participants.through.objects.filter(chatroom=OuterRef('pk'))
+        counts = membership.order_by().values('chatroom').annotate(n=Count('id')).values('n')
+        cls.objects.filter(pk__in=room_ids).update(participant_count=Coalesce(Subquery(counts), 0))
+
 
 class ChatMessage(models.Model):
     """Individual messages in a chat room"""
@@ -276,6 +720,9 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['room', '-timestamp']),
+        ]
 
     def __str__(self):
         return f"{self.sender.username}: {self.content[:20]}"
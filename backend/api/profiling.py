@@ -0,0 +1,231 @@
+"""
+Opt-in request profiling.
+
+With ``REQUEST_PROFILING`` enabled, ProfilingMiddleware measures every
+request's wall time, SQL query count, database time, repeated queries and
+response cache outcome, tags the sample with the DRF ViewSet action (or URL
+name) that served it, and keeps the most recent ``REQUEST_PROFILING_SAMPLES``
+samples per route in Redis (or in-process when the cache is not Redis).
+``profiling_report()`` turns them into p50/p95/p99 figures per route.
+"""
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .cache import get_redis_client
+from .renderers import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'harvestconnect:profiling'
+ROUTES_KEY = f'{KEY_PREFIX}:routes'
+PERCENTILES = (50, 95, 99)
+MAX_SQL_LENGTH = 300
+
+
+def samples_key(route):
+    return f'{KEY_PREFIX}:samples:{route}'
+
+
+class RedisProfileStore:
+    def __init__(self, client):
+        self.client = client
+
+    def add(self, route, sample, limit):
+        pipe = self.client.pipeline()
+        pipe.lpush(samples_key(route), dumps(sample))
+        pipe.ltrim(samples_key(route), 0, limit - 1)
+        pipe.sadd(ROUTES_KEY, route)
+        pipe.execute()
+
+    def samples(self):
+        routes = sorted(route.decode() for route in self.client.smembers(ROUTES_KEY))
+        pipe = self.client.pipeline()
+        for route in routes:
+            pipe.lrange(samples_key(route), 0, -1)
+        return {
+            route: [loads(sample) for sample in samples]
+            for route, samples in zip(routes, pipe.execute())
+        }
+
+    def clear(self):
+        routes = [route.decode() for route in self.client.smembers(ROUTES_KEY)]
+        self.client.delete(ROUTES_KEY, *[samples_key(route) for route in routes])
+
+
+class LocalProfileStore:
+    """Per-process fallback used when the default cache is not Redis"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, route, sample, limit):
+        with self.lock:
+            samples = self.routes.get(route)
+            if samples is None or samples.maxlen != limit:
+                samples = self.routes[route] = deque(samples or (), maxlen=limit)
+            samples.appendleft(sample)
+
+    def samples(self):
+        with self.lock:
+            return {route: list(samples) for route, samples in sorted(self.routes.items())}
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                client = get_redis_client()
+                _store = RedisProfileStore(client) if client is not None else LocalProfileStore()
+    return _store
+
+
+class QueryRecorder:
+    """Database execute wrapper collecting per-request query statistics"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            try:
+                self.statements[(sql, repr(params))] += 1
+            except Exception:
+                self.statements[(sql, id(params))] += 1
+
+    def duplicates(self):
+        """Number of queries that repeated an earlier statement with the same parameters"""
+        return sum(n - 1 for n in self.statements.values() if n > 1)
+
+    def most_repeated(self):
+        if not self.statements:
+            return None
+        (sql, _), n = self.statements.most_common(1)[0]
+        return sql[:MAX_SQL_LENGTH] if n > 1 else None
+
+
+def route_name(request, view_func):
+    """'ProductViewSet.nearby' for DRF ViewSets, the URL name for other views"""
+    actions = getattr(view_func, 'actions', None)
+    view_class = getattr(view_func, 'cls', None)
+    if actions and view_class is not None:
+        action = actions.get(request.method.lower())
+        if action:
+            return f'{view_class.__name__}.{action}'
+    match = request.resolver_match
+    name = match.view_name if match is not None and match.url_name else None
+    return f'{request.method} {name or getattr(view_func, "__name__", "view")}'
+
+
+def _cache_outcome(response):
+    outcome = response.get('X-Cache') if hasattr(response, 'get') else None
+    return {'HIT': True, 'MISS': False}.get(outcome)
+
+
+class ProfilingMiddleware:
+    """Record per-request query, cache and latency samples when REQUEST_PROFILING is on"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall = time.perf_counter() - started
+
+        route = getattr(request, '_profiling_route', None) or f'{request.method} unresolved'
+        sample = {
+            'status': response.status_code,
+            'wall_ms': round(wall * 1000, 3),
+            'db_ms': round(recorder.duration * 1000, 3),
+            'queries': recorder.count,
+            'duplicates': recorder.duplicates(),
+            'cache_hit': _cache_outcome(response),
+        }
+        repeated = recorder.most_repeated()
+        if repeated:
+            sample['repeated_sql'] = repeated
+        try:
+            get_profile_store().add(route, sample, getattr(settings, 'REQUEST_PROFILING_SAMPLES', 1000))
+        except Exception:
+            logger.warning("Could not store profiling sample for %s", route, exc_info=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(settings, 'REQUEST_PROFILING', False):
+            request._profiling_route = route_name(request, view_func)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of already sorted values"""
+    if not values:
+        return None
+    rank = max(int(-(-pct * len(values) // 100)), 1)
+    return values[rank - 1]
+
+
+def _distribution(values):
+    values = sorted(values)
+    summary = {f'p{pct}': percentile(values, pct) for pct in PERCENTILES}
+    summary['max'] = values[-1] if values else None
+    return summary
+
+
+def profiling_report():
+    """Per-route sample count and p50/p95/p99 of wall time, DB time and query count"""
+    report = {}
+    for route, samples in get_profile_store().samples().items():
+        if not samples:
+            continue
+        cache_lookups = [s['cache_hit'] for s in samples if s.get('cache_hit') is not None]
+        repeated = Counter(s['repeated_sql'] for s in samples if s.get('repeated_sql'))
+        errors = sum(1 for s in samples if s['status'] >= 500)
+        report[route] = {
+            'requests': len(samples),
+            'errors': errors,
+            'wall_ms': _distribution([s['wall_ms'] for s in samples]),
+            'db_ms': _distribution([s['db_ms'] for s in samples]),
+            'queries': _distribution([s['queries'] for s in samples]),
+            'duplicate_queries': {
+                'requests_with_duplicates': sum(1 for s in samples if s['duplicates']),
+                'max': max(s['duplicates'] for s in samples),
+                'most_repeated_sql': repeated.most_common(1)[0][0] if repeated else None,
+            },
+            'cache_hit_ratio': (
+                round(sum(cache_lookups) / len(cache_lookups), 4) if cache_lookups else None
+            ),
+        }
+    return report
+
+
+def reset_profiling():
+    get_profile_store().clear()
@@ -1,9 +1,9 @@
 import graphene
 from graphene_django import DjangoObjectType
-from .models import Order, Product, Category, UserProfile, Project
-from django.db.models import Sum, Count, Avg
-from django.db.models.functions import TruncMonth
-import json
+from .models import Order, DailySalesRollup, Product, Category, UserProfile, Project
+from django.db.models import Sum, Count, Avg, Value
+from django.db.models.functions import Coalesce, NullIf, TruncMonth
+from datetime import datetime, time, timezone as dt_timezone
 
 class CategoryType(DjangoObjectType):
     class Meta:
@@ -51,43 +51,48 @@ class Query(graphene.ObjectType):
         return Project.objects.all()
 
     def resolve_analytics(self, info):
+        # Everything below reads the pre-aggregated rollup, never the orders table
+        order_rows = DailySalesRollup.objects.orders()
+
         # Overall Stats
-        total_sales = Order.objects.exclude(status='cancelled').aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        total_orders = Order.objects.exclude(status='cancelled').count()
+        totals = order_rows.aggregate(total_sales=Sum('revenue'), total_orders=Sum('order_count'))
+        total_sales = totals['total_sales'] or 0
+        total_orders = totals['total_orders'] or 0
         avg_order = total_sales / total_orders if total_orders > 0 else 0
 
         # Monthly Revenue
-        monthly = Order.objects.exclude(status='cancelled') \
-            .annotate(month=TruncMonth('created_at')) \
+        monthly = order_rows \
+            .annotate(month=TruncMonth('date')) \
             .values('month') \
-            .annotate(revenue=Sum('total_amount')) \
+            .annotate(revenue=Sum('revenue')) \
             .order_by('month')
         
-        monthly_data = {str(item['month']): float(item['revenue']) for item in monthly}
+        monthly_data = {
+            str(datetime.combine(item['month'], time.min, tzinfo=dt_timezone.utc)): float(item['revenue'])
+            for item in monthly
+        }
 
         # Church & Location Breakdown
-        church_breakdown = {}
-        location_breakdown = {}
-        
-        all_orders = Order.objects.exclude(status='cancelled')
-        for order in all_orders:
-            church = order.buyer.profile.home_church or "Other"
-            loc = order.buyer.profile.location or "Other"
-            
-            church_breakdown[church] = church_breakdown.get(church, 0) + float(order.total_amount)
-            location_breakdown[loc] = location_breakdown.get(loc, 0) + float(order.total_amount)
-
-        # Category Breakdown (Simplified)
-        cat_breakdown = {}
+        church_breakdown = _grouped_sales(order_rows, 'church')
+        location_breakdown = _grouped_sales(order_rows, 'location')
+
+        # Category Breakdown from the line-level rows
+        cat_breakdown = _grouped_sales(DailySalesRollup.objects.lines(), 'category')
         
         return AnalyticsType(
             total_sales=float(total_sales),
             total_orders=total_orders,
             average_order_value=float(avg_order),
-            monthly_revenue=json.dumps(monthly_data),
-            sales_by_category=json.dumps(cat_breakdown),
-            sales_by_church=json.dumps(church_breakdown),
-            sales_by_location=json.dumps(location_breakdown)
+            monthly_revenue=monthly_data,
+            sales_by_category=cat_breakdown,
+            sales_by_church=church_breakdown,
+            sales_by_location=location_breakdown
         )
 
-import json # needed for json.dumps
+
+def _grouped_sales(queryset, field):
+    """Sum rollup revenue per distinct value of field in a single GROUP BY query"""
+    rows = queryset.values(
+        key=Coalesce(NullIf(field, Value('')), Value('Other'))
+    ).annotate(revenue=Sum('revenue')).order_by()
+    return {row['key']: float(row['revenue'] or 0) for row in rows}
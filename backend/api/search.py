@@ -0,0 +1,169 @@
+"""
+Full-text search for products and blog posts.
+
+On PostgreSQL documents are matched against a weighted ``tsvector``
+expression backed by a GIN expression index; on SQLite they are matched
+against an FTS5 external-content table kept in sync by triggers. Other
+engines fall back to ``icontains``. Every query term is a prefix match, and
+results carry a ``search_rank`` annotation (higher is more relevant).
+The index and FTS5 tables are created by migration 0014_search_index, whose
+index expression must match search_vector() for PostgreSQL to use it.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+
+from .pagination import StandardResultsSetPagination
+
+SEARCH_CONFIG = 'english'
+MAX_TERMS = 10
+
+# Searchable columns per model with their tsvector weight (A is strongest)
+SEARCH_FIELDS = {
+    'api.product': (('title', 'A'), ('description', 'B')),
+    'api.blogpost': (('title', 'A'), ('excerpt', 'B'), ('content', 'C')),
+}
+
+# bm25() column weights mirroring PostgreSQL's default ts_rank weights
+BM25_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 2.0, 'D': 1.0}
+
+
+def search_terms(text):
+    return re.findall(r'\w+', text or '')[:MAX_TERMS]
+
+
+def search_vector(fields):
+    vector = None
+    for name, weight in fields:
+        part = SearchVector(name, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def _fts_table(table):
+    return f'{table}_fts'
+
+
+def full_text_search(queryset, text):
+    """Filter queryset to documents matching every term and annotate search_rank"""
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none()
+    model = queryset.model
+    fields = SEARCH_FIELDS[model._meta.label_lower]
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'postgresql':
+        # Must stay identical to the indexed expression for the GIN index to be used
+        vector = search_vector(fields)
+        query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG
+        )
+        return queryset.annotate(search_document=vector).filter(search_document=query).annotate(
+            search_rank=SearchRank(vector, query)
+        )
+
+    if vendor == 'sqlite':
+        connection = connections[queryset.db]
+        fts = connection.ops.quote_name(_fts_table(model._meta.db_table))
+        pk = f'{connection.ops.quote_name(model._meta.db_table)}.{connection.ops.quote_name(model._meta.pk.column)}'
+        weights = ', '.join(str(BM25_WEIGHTS[weight]) for _, weight in fields)
+        match = ' '.join(f'"{term}"*' for term in terms)
+        matching_ids = RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', (match,))
+        # bm25() is lower for better matches; negate so higher means more relevant
+        rank = RawSQL(
+            f'SELECT -bm25({fts}, {weights}) FROM {fts} WHERE {fts} MATCH %s AND rowid = {pk}',
+            (match,), output_field=FloatField()
+        )
+        return queryset.filter(pk__in=matching_ids).annotate(search_rank=rank)
+
+    condition = Q()
+    for term in terms:
+        term_condition = Q()
+        for name, _ in fields:
+            term_condition |= Q(**{f'{name}__icontains': term})
+        condition &= term_condition
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def _create_sqlite_triggers(connection, model):
+    table = model._meta.db_table
+    fts = _fts_table(table)
+    pk = model._meta.pk.column
+    names = [name for name, _ in SEARCH_FIELDS[model._meta.label_lower]]
+    columns = ', '.join(names)
+    new_values = ', '.join(f'new.{name}' for name in names)
+    old_values = ', '.join(f'old.{name}' for name in names)
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.{pk}, {old_values});"
+    insert_new = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.{pk}, {new_values});"
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END')
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END')
+        cursor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} '
+            f'BEGIN {delete_old} {insert_new} END'
+        )
+
+
+def ensure_search_triggers(sender, using='default', apps=None, **kwargs):
+    """
+    post_migrate hook: SQLite drops triggers whenever a migration rebuilds a
+    table, so recreate any that are missing and reindex that table.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or apps is None:
+        return
+    existing_tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing_triggers = {row[0] for row in cursor.fetchall()}
+    for label in SEARCH_FIELDS:
+        model = apps.get_model(label)
+        fts = _fts_table(model._meta.db_table)
+        if fts not in existing_tables:
+            continue
+        if not {f'{fts}_ai', f'{fts}_ad', f'{fts}_au'} <= existing_triggers:
+            _create_sqlite_triggers(connection, model)
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+class FullTextSearchFilter(filters.BaseFilterBackend):
+    """Drop-in replacement for SearchFilter backed by the full-text index"""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        if not search_terms(text):
+            return queryset
+        return full_text_search(queryset, text)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search terms (prefix matched).',
+            'schema': {'type': 'string'},
+        }]
+
+
+class FullTextSearchMixin:
+    """Adds a ``search/?q=`` list route returning matches in relevance order"""
+
+    @action(detail=False, methods=['get'], pagination_class=StandardResultsSetPagination)
+    def search(self, request):
+        """Full-text search ordered by relevance"""
+        text = request.query_params.get('q', '')
+        if not search_terms(text):
+            raise ValidationError({'q': 'Enter at least one search term.'})
+        queryset = full_text_search(self.get_queryset(), text).order_by('-search_rank', '-pk')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,323 @@
+"""
+High-volume test data generation for ``seed_db --bulk``.
+
+Rows are built in memory from small pools of Faker text (calling Faker per
+row dominates the run time at 100k+ rows) and written with ``bulk_create``
+in fixed-size batches. ``bulk_create`` skips ``save()`` and ``post_save``,
+so everything those would have done is done in bulk instead: profiles are
+inserted alongside their users with geohashes precomputed, order lines are
+written with their orders, and rating counters, the sales rollup and the
+response cache versions are rebuilt once at the end.
+"""
+import random
+import time
+import uuid
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Max
+from django.utils.text import slugify
+from faker import Faker
+
+from .cache import bump_version
+from .geo import encode_geohash
+from .models import (
+    Artist, BlogPost, Category, DailySalesRollup, Order, OrderItem, Product, Review, UserProfile
+)
+
+SCALE_PRESETS = {
+    '1k': {
+        'users': 200, 'categories': 20, 'products': 1_000, 'posts': 200,
+        'reviews': 2_000, 'orders': 500, 'artists': 50,
+    },
+    '100k': {
+        'users': 10_000, 'categories': 50, 'products': 100_000, 'posts': 5_000,
+        'reviews': 200_000, 'orders': 50_000, 'artists': 500,
+    },
+    '1m': {
+        'users': 100_000, 'categories': 100, 'products': 1_000_000, 'posts': 20_000,
+        'reviews': 2_000_000, 'orders': 500_000, 'artists': 2_000,
+    },
+}
+
+# Shared by every seeded account so load tests can log in as any of them
+SEED_PASSWORD = 'harvest123'
+
+ROLE_WEIGHTS = {'buyer': 50, 'farmer': 20, 'seller': 15, 'artisan': 10, 'tradesman': 5}
+PRODUCT_STATUS_WEIGHTS = {'active': 85, 'inactive': 10, 'sold': 5}
+ORDER_STATUS_WEIGHTS = {'pending': 15, 'confirmed': 20, 'shipped': 20, 'delivered': 40, 'cancelled': 5}
+SELLER_ROLES = ('farmer', 'seller', 'artisan', 'tradesman')
+# Orders draw their lines from this many products so memory stays flat at any scale
+ORDER_PRODUCT_SAMPLE = 5_000
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _max_id(model):
+    return model.objects.aggregate(top=Max('id'))['top'] or 0
+
+
+class BulkSeeder:
+    """Generate and insert seed data; ``log(message)`` receives progress lines"""
+
+    def __init__(self, batch_size=1000, seed=None, log=print):
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.log = log
+        self.tag = '%06x' % self.random.getrandbits(24)
+        self.stats = {}
+        self._build_pools(seed)
+
+    def _build_pools(self, seed):
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.first_names = [fake.first_name() for _ in range(200)]
+        self.last_names = [fake.last_name() for _ in range(200)]
+        self.words = sorted({fake.word() for _ in range(600)})
+        self.titles = [fake.sentence(nb_words=4).rstrip('.') for _ in range(500)]
+        self.sentences = [fake.sentence(nb_words=15) for _ in range(300)]
+        self.paragraphs = [fake.text(max_nb_chars=1000) for _ in range(200)]
+        self.cities = [fake.city() for _ in range(100)]
+        self.churches = [
+            f"{fake.last_name()} {self.random.choice(['Community', 'Baptist', 'Grace', 'Methodist'])} Church"
+            for _ in range(50)
+        ]
+        self.addresses = [fake.address() for _ in range(200)]
+        self.phones = [fake.numerify('###-###-####') for _ in range(200)]
+
+    def _weighted(self, weights):
+        return self.random.choices(list(weights), weights=list(weights.values()))[0]
+
+    def _insert(self, model, rows, label):
+        """bulk_create rows in batches; returns the number written"""
+        started = time.monotonic()
+        written = 0
+        for chunk in _chunks(rows, self.batch_size):
+            model.objects.bulk_create(chunk, batch_size=self.batch_size)
+            written += len(chunk)
+        self._report(label, written, time.monotonic() - started)
+        return written
+
+    def _report(self, label, count, elapsed):
+        self.stats[label] = (count, elapsed)
+        rate = count / elapsed if elapsed > 0 else 0
+        self.log(f"✓ Created {count:,} {label} in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+    def run(self, counts):
+        """Seed every model; returns {label: (rows, seconds)}"""
+        started = time.monotonic()
+        user_ids = self.seed_users(counts['users'])
+        if not user_ids:
+            return self.stats
+        category_ids = self.seed_categories(counts['categories'])
+        self.seed_posts(counts['posts'], user_ids)
+        product_ids = self.seed_products(counts['products'], category_ids)
+        self.seed_reviews(counts['reviews'], product_ids, user_ids)
+        self.seed_orders(counts['orders'], product_ids, user_ids)
+        self.seed_artists(counts['artists'])
+        self.finish()
+
+        total = sum(count for count, _ in self.stats.values())
+        elapsed = time.monotonic() - started
+        self.log(f"✓ Wrote {total:,} rows in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/s overall)")
+        return self.stats
+
+    def seed_users(self, count):
+        start = _max_id(User)
+        password = make_password(SEED_PASSWORD)  # Hashing once instead of per user
+
+        def users():
+            for i in range(count):
+                first, last = self.random.choice(self.first_names), self.random.choice(self.last_names)
+                username = f'{first}.{last}.{self.tag}{i:x}'.lower()
+                yield User(
+                    username=username, email=f'{username}@example.com', first_name=first,
+                    last_name=last, password=password, is_active=True
+                )
+
+        self._insert(User, users(), 'users')
+        user_ids = list(User.objects.filter(id__gt=start).order_by('id').values_list('id', flat=True))
+
+        self.roles = {}
+
+        def profiles():
+            for user_id in user_ids:
+                role = self.roles[user_id] = self._weighted(ROLE_WEIGHTS)
+                latitude = round(self.random.uniform(25.0, 48.0), 6)
+                longitude = round(self.random.uniform(-123.0, -70.0), 6)
+                yield UserProfile(
+                    user_id=user_id, role=role, bio=self.random.choice(self.sentences),
+                    phone=self.random.choice(self.phones), location=self.random.choice(self.cities),
+                    home_church=self.random.choice(self.churches), is_verified=self.random.random() < 0.7,
+                    faith_based=self.random.random() < 0.8, latitude=latitude, longitude=longitude,
+                    geohash=encode_geohash(latitude, longitude),
+                )
+
+        self._insert(UserProfile, profiles(), 'profiles')
+        self.seller_ids = [uid for uid in user_ids if self.roles[uid] in SELLER_ROLES] or user_ids
+        return user_ids
+
+    def seed_categories(self, count):
+        taken = set(Category.objects.values_list('name', flat=True))
+        taken_slugs = set(Category.objects.values_list('slug', flat=True))
+        rows = []
+        for word in self.random.sample(self.words, len(self.words)):
+            if len(rows) >= count:
+                break
+            name = word.title()
+            if name in taken or slugify(name) in taken_slugs:
+                continue
+            rows.append(Category(name=name, slug=slugify(name), description=self.random.choice(self.sentences)))
+        for i in range(len(rows), count):
+            name = f'{self.random.choice(self.words).title()} {self.tag}{i:x}'
+            rows.append(Category(name=name, slug=slugify(name)))
+
+        start = _max_id(Category)
+        self._insert(Category, rows, 'categories')
+        return list(Category.objects.filter(id__gt=start).values_list('id', flat=True)) or list(
+            Category.objects.values_list('id', flat=True)
+        )
+
+    def _slug(self, title, i):
+        # Room for '-<tag>-<hex index>' inside the 50 character SlugField
+        return f'{slugify(title)[:30]}-{self.tag}-{i:x}'
+
+    def seed_posts(self, count, user_ids):
+        categories = [value for value, _ in BlogPost.CATEGORY_CHOICES]
+
+        def posts():
+            for i in range(count):
+                title = self.random.choice(self.titles)
+                yield BlogPost(
+                    title=title, slug=self._slug(title, i), excerpt=self.random.choice(self.sentences),
+                    content=self.random.choice(self.paragraphs), category=self.random.choice(categories),
+                    author_id=self.random.choice(user_ids), featured=self.random.random() < 0.1,
+                    views=self.random.randint(0, 10_000), published=True,
+                )
+
+        self._insert(BlogPost, posts(), 'blog posts')
+
+    def seed_products(self, count, category_ids):
+        start = _max_id(Product)
+
+        def products():
+            for i in range(count):
+                title = self.random.choice(self.titles)
+                yield Product(
+                    seller_id=self.seller_ids[i % len(self.seller_ids)], title=title, slug=self._slug(title, i),
+                    description=self.random.choice(self.paragraphs),
+                    category_id=self.random.choice(category_ids) if category_ids else None,
+                    price=Decimal(self.random.randint(100, 50_000)) / 100,
+                    quantity=self.random.randint(1, 100), status=self._weighted(PRODUCT_STATUS_WEIGHTS),
+                    images=[],
+                )
+
+        self._insert(Product, products(), 'products')
+        return list(Product.objects.filter(id__gt=start).order_by('id').values_list('id', flat=True))
+
+    def seed_reviews(self, count, product_ids, user_ids):
+        if not product_ids:
+            return
+        # Each product's reviewers are consecutive users, so (product, reviewer) never repeats
+        count = min(count, len(product_ids) * len(user_ids))
+
+        def reviews():
+            for i in range(count):
+                round_, slot = divmod(i, len(product_ids))
+                yield Review(
+                    product_id=product_ids[slot], reviewer_id=user_ids[(slot + round_) % len(user_ids)],
+                    rating=self.random.choices((1, 2, 3, 4, 5), weights=(5, 5, 15, 35, 40))[0],
+                    title=self.random.choice(self.titles), comment=self.random.choice(self.sentences),
+                    helpful_count=self.random.randint(0, 50),
+                )
+
+        self._insert(Review, reviews(), 'reviews')
+
+    def seed_orders(self, count, product_ids, user_ids):
+        sample_ids = self.random.sample(product_ids, min(len(product_ids), ORDER_PRODUCT_SAMPLE))
+        catalog = []
+        for chunk in _chunks(sample_ids, self.batch_size):
+            catalog += Product.objects.filter(id__in=chunk).values_list(
+                'id', 'seller_id', 'title', 'price', 'category__name'
+            )
+
+        started = time.monotonic()
+        written = lines_written = 0
+        for chunk in _chunks(range(count), self.batch_size):
+            orders, lines = [], []
+            for _ in chunk:
+                picked = self.random.sample(catalog, min(len(catalog), self.random.randint(1, 4)))
+                order_lines = [
+                    (product_id, seller_id, title, price, category or 'Other', self.random.randint(1, 5))
+                    for product_id, seller_id, title, price, category in picked
+                ]
+                orders.append(Order(
+                    order_id=f'HC-{uuid.uuid4()}', buyer_id=self.random.choice(user_ids),
+                    products=[
+                        {'id': p, 'seller_id': s, 'title': t, 'price': float(price), 'quantity': q, 'category': c}
+                        for p, s, t, price, c, q in order_lines
+                    ],
+                    total_amount=sum((price * q for _, _, _, price, _, q in order_lines), Decimal('0')),
+                    status=self._weighted(ORDER_STATUS_WEIGHTS),
+                    shipping_address=self.random.choice(self.addresses),
+                    payment_method=self.random.choice(['credit_card', 'debit_card', 'paypal', 'bank_transfer']),
+                ))
+                lines.append(order_lines)
+            Order.objects.bulk_create(orders, batch_size=self.batch_size)
+            self._fill_order_pks(orders)
+            items = [
+                OrderItem(
+                    order_id=order.pk, product_id=p, seller_id=s, title=t[:255], unit_price=price,
+                    quantity=q, category=c[:100], created_at=order.created_at,
+                )
+                for order, order_lines in zip(orders, lines)
+                for p, s, t, price, c, q in order_lines
+            ]
+            OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+            written += len(orders)
+            lines_written += len(items)
+        elapsed = time.monotonic() - started
+        self._report('orders', written, elapsed)
+        self.stats['order items'] = (lines_written, 0.0)
+
+    def _fill_order_pks(self, orders):
+        if connection.features.can_return_rows_from_bulk_insert:
+            return
+        pks = dict(Order.objects.filter(order_id__in=[o.order_id for o in orders]).values_list('order_id', 'id'))
+        for order in orders:
+            order.pk = pks[order.order_id]
+
+    def seed_artists(self, count):
+        candidates = sorted(self.roles, key=lambda uid: self.roles[uid] != 'artisan')[:count]
+        users = User.objects.in_bulk(candidates)
+
+        def artists():
+            for user_id in candidates:
+                user = users[user_id]
+                yield Artist(
+                    user_id=user_id, name=f'{user.first_name} {user.last_name}',
+                    specialty=self.random.choice(self.words), bio=self.random.choice(self.paragraphs),
+                    portfolio_url=f'https://example.com/{user.username}',
+                    social_media={'instagram': f'@{user.username}'}, featured=self.random.random() < 0.5,
+                )
+
+        self._insert(Artist, artists(), 'artists')
+
+    def finish(self):
+        """Rebuild what post_save signals would have maintained row by row"""
+        started = time.monotonic()
+        Product.reconcile_ratings()
+        DailySalesRollup.rebuild(batch_size=self.batch_size)
+        for model in (Category, Product, BlogPost, Artist, UserProfile):
+            bump_version(model)
+        self.log(f"✓ Rebuilt rating counters and sales rollup in {time.monotonic() - started:.2f}s")
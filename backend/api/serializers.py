@@ -6,19 +6,44 @@ from .models import (
     UserProfile, Category, BlogPost, Product, Review, Order, Artist, SavedItem, Project,
     ChatRoom, ChatMessage
 )
+from .mixins import SparseFieldsMixin
+from .images import srcset
 
+# Participants embedded in a room payload; the full list is paginated separately
+PARTICIPANT_PREVIEW_SIZE = 10
+
+
+class ImageSrcsetField(serializers.Field):
+    """Read-only thumbnail and srcset URLs for an image field, from the model's derivative manifest"""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        self.model_fields = (image_field, 'image_derivatives')
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        value = getattr(instance, self.image_field)
+        entries = (instance.image_derivatives or {}).get(self.image_field) or {}
+        if isinstance(value, (list, tuple)):
+            return [srcset(entries.get(name), name) if isinstance(name, str) else None for name in value]
+        return srcset(entries, value.name) if value else None
+
+
+class UserProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    avatar_srcset = ImageSrcsetField('avatar')
+    banner_srcset = ImageSrcsetField('banner')
 
-class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = [
-            'id', 'role', 'bio', 'avatar', 'banner', 'phone', 'location', 'home_church', 
-            'is_verified', 'faith_based', 'latitude', 'longitude'
+            'id', 'role', 'bio', 'avatar', 'avatar_srcset', 'banner', 'banner_srcset', 'phone', 'location',
+            'home_church', 'is_verified', 'faith_based', 'latitude', 'longitude'
         ]
         read_only_fields = ['id', 'is_verified']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer(read_only=True)
     
     class Meta:
@@ -49,37 +74,43 @@ class RegisterSerializer(DefaultRegisterSerializer):
         return data
 
     def custom_signup(self, request, user):
-        user.first_name = self.validated_data.get('first_name', '')
-        user.last_name = self.validated_data.get('last_name', '')
-        user.save()
-        
-        # Ensure UserProfile is created/updated with the correct role
-        role = self.validated_data.get('role', 'buyer')
-        profile, created = UserProfile.objects.get_or_create(user=user)
-        profile.role = role
+        names = {
+            'first_name': self.validated_data.get('first_name', ''),
+            'last_name': self.validated_data.get('last_name', ''),
+        }
+        changed = [field for field, value in names.items() if getattr(user, field) != value]
+        for field in changed:
+            setattr(user, field, names[field])
+        if changed:
+            user.save(update_fields=changed)
+
+        # The profile was created with the user; only a non-default role needs a write
+        profile = user.profile
+        profile.role = self.validated_data.get('role', 'buyer')
         profile.save()
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'slug', 'description', 'icon']
 
 
-class BlogPostSerializer(serializers.ModelSerializer):
+class BlogPostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     author_id = serializers.PrimaryKeyRelatedField(read_only=True)
+    image_srcset = ImageSrcsetField('image')
     
     class Meta:
         model = BlogPost
         fields = [
             'id', 'title', 'slug', 'excerpt', 'content', 'category',
-            'author', 'author_id', 'featured', 'image', 'views', 'created_at', 'updated_at'
+            'author', 'author_id', 'featured', 'image', 'image_srcset', 'views', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'slug', 'created_at', 'updated_at', 'views']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     seller = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
@@ -88,27 +119,30 @@ class ProductSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False
     )
+    image_srcset = ImageSrcsetField('image')
+    images_srcset = ImageSrcsetField('images')
     
     class Meta:
         model = Product
         fields = [
             'id', 'seller', 'title', 'slug', 'description', 'category',
-            'category_id', 'price', 'quantity', 'status', 'image', 'images',
+            'category_id', 'price', 'quantity', 'status', 'image', 'image_srcset', 'images', 'images_srcset',
             'rating', 'reviews_count', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'slug', 'rating', 'reviews_count', 'created_at', 'updated_at']
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     reviewer = UserSerializer(read_only=True)
     
     class Meta:
         model = Review
         fields = ['id', 'product', 'reviewer', 'rating', 'title', 'comment', 'helpful_count', 'created_at']
         read_only_fields = ['id', 'created_at', 'helpful_count']
+        expandable_fields = {'product': 'ProductSerializer'}
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     buyer = UserSerializer(read_only=True)
     
     class Meta:
@@ -120,16 +154,20 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'order_id', 'created_at', 'updated_at']
 
 
-class ArtistSerializer(serializers.ModelSerializer):
+class ArtistSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    profile_image_srcset = ImageSrcsetField('profile_image')
     
     class Meta:
         model = Artist
-        fields = ['id', 'user', 'name', 'specialty', 'bio', 'profile_image', 'portfolio_url', 'social_media', 'featured', 'created_at']
+        fields = [
+            'id', 'user', 'name', 'specialty', 'bio', 'profile_image', 'profile_image_srcset', 'portfolio_url',
+            'social_media', 'featured', 'created_at'
+        ]
         read_only_fields = ['id', 'created_at']
 
 
-class SavedItemSerializer(serializers.ModelSerializer):
+class SavedItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
@@ -144,7 +182,7 @@ class SavedItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tradesman = UserSerializer(read_only=True)
     client = UserSerializer(read_only=True)
     client_id = serializers.PrimaryKeyRelatedField(
@@ -164,26 +202,37 @@ class ProjectSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class ChatMessageSerializer(serializers.ModelSerializer):
+class ChatMessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
 
     class Meta:
         model = ChatMessage
         fields = ['id', 'room', 'sender', 'content', 'timestamp']
         read_only_fields = ['id', 'timestamp']
+        expandable_fields = {'room': 'ChatRoomSerializer'}
 
 
-class ChatRoomSerializer(serializers.ModelSerializer):
-    participants = UserSerializer(many=True, read_only=True)
-    last_message = serializers.SerializerMethodField()
+class ParticipantSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'email', 'first_name', 'last_name']
+        read_only_fields = fields
+
+
+class ChatRoomSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    participants = serializers.SerializerMethodField()
+    last_message = ChatMessageSerializer(read_only=True)
 
     class Meta:
         model = ChatRoom
-        fields = ['id', 'name', 'room_type', 'church', 'location', 'participants', 'created_at', 'last_message']
-        read_only_fields = ['id', 'created_at']
+        fields = [
+            'id', 'name', 'room_type', 'church', 'location', 'participant_count', 'participants',
+            'created_at', 'last_message'
+        ]
+        read_only_fields = ['id', 'participant_count', 'created_at']
 
-    def get_last_message(self, obj):
-        last = obj.messages.order_by('-timestamp').first()
-        if last:
-            return ChatMessageSerializer(last).data
-        return None
+    def get_participants(self, obj):
+        preview = getattr(obj, 'participant_preview', None)
+        if preview is None:
+            preview = obj.participants.order_by('id')[:PARTICIPANT_PREVIEW_SIZE]
+        return ParticipantSerializer(preview, many=True).data
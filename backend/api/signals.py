@@ -1,15 +1,165 @@
-from django.db.models.signals import post_save
+import copy
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import (
+    UserProfile, Order, DailySalesRollup, ChatRoom, ChatMessage, Category, Product, BlogPost, Artist, Review
+)
+from .cache import bump_version
+from .discovery import forget_memberships, index_room, unindex_room
+from .images import schedule_derivatives, stale_fields
+
+# Models rendered by cached catalog responses (see CachedResponseMixin)
+RESPONSE_CACHE_MODELS = (Category, Product, BlogPost, Artist, UserProfile)
+
+# Models whose image fields get thumbnail and responsive-width derivatives
+DERIVATIVE_MODELS = (UserProfile, Product, BlogPost, Artist)
+
+# Order fields whose changes affect OrderItem rows or the sales rollup
+ORDER_TRACKED_FIELDS = ('products', 'status', 'total_amount')
 
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        UserProfile.objects.get_or_create(user=instance)
+    # The only place profiles are created; later User saves never touch the profile row
+    if created and not kwargs.get('raw'):
+        UserProfile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Order)
+def sync_order_items(sender, instance, created, update_fields=None, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if update_fields is not None and not set(ORDER_TRACKED_FIELDS) & set(update_fields):
+        return
+    if not created and not any(instance.has_changed(f) for f in ORDER_TRACKED_FIELDS):
+        return
+
+    loaded = getattr(instance, '_loaded_values', {})
+    with transaction.atomic():
+        # Back out what the order contributed before this save, then re-add it
+        if not created and loaded.get('status', instance.status) != 'cancelled':
+            DailySalesRollup.apply_order(instance, sign=-1, total_amount=loaded.get('total_amount'))
+        if created or instance.has_changed('products'):
+            instance.sync_items()
+        if instance.status != 'cancelled':
+            DailySalesRollup.apply_order(instance)
+
+    instance._loaded_values = {
+        **loaded,
+        **{f: copy.deepcopy(getattr(instance, f)) for f in ORDER_TRACKED_FIELDS},
+    }
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_from_rollup(sender, instance, **kwargs):
+    if instance.status != 'cancelled':
+        DailySalesRollup.apply_order(instance, sign=-1)
+
+
+@receiver(post_save, sender=Review)
+def update_rating_counters(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    counted = getattr(instance, '_counted_rating', None)
+    current = (instance.product_id, instance.rating)
+    if counted == current:
+        return
+    with transaction.atomic():
+        if counted is not None:
+            Product.apply_review(*counted, sign=-1)
+        Product.apply_review(*current)
+    instance._counted_rating = current
+
+
+@receiver(post_delete, sender=Review)
+def remove_rating_from_counters(sender, instance, **kwargs):
+    counted = getattr(instance, '_counted_rating', (instance.product_id, instance.rating))
+    Product.apply_review(*counted, sign=-1)
+
+
+@receiver(post_save, sender=ChatMessage)
+def update_room_last_message(sender, instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        ChatRoom.objects.filter(pk=instance.room_id).update(last_message=instance)
+
+
+@receiver(post_delete, sender=ChatMessage)
+def reset_room_last_message(sender, instance, **kwargs):
+    # SET_NULL already cleared the pointer; fall back to the next newest message
+    latest = ChatMessage.objects.filter(room_id=OuterRef('pk')).order_by('-timestamp', '-id').values('id')[:1]
+    ChatRoom.objects.filter(pk=instance.room_id, last_message__isnull=True).update(last_message=Subquery(latest))
+
+
+@receiver(post_save, sender=ChatRoom)
+def index_chat_room(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'room_type', 'church', 'location'} & set(update_fields):
+        return
+    index_room(instance)
+
+
+@receiver(post_delete, sender=ChatRoom)
+def unindex_chat_room(sender, instance, **kwargs):
+    unindex_room(instance.pk)
+
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def update_participant_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # The user's rooms are unknown once the rows are gone
+        instance._cleared_room_ids = list(instance.chat_rooms.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        ChatRoom.recount_participants([instance.pk])
+        instance.refresh_from_db(fields=['participant_count'])
+    elif action == 'post_clear':
+        ChatRoom.recount_participants(instance.__dict__.pop('_cleared_room_ids', []))
+    else:
+        ChatRoom.recount_participants(pk_set or [])
+
+
+@receiver(m2m_changed, sender=ChatRoom.participants.through)
+def forget_room_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # user.chat_rooms.add(...): instance is the user
+        forget_memberships([instance.pk])
+    elif action == 'pre_clear':
+        forget_memberships(list(instance.participants.values_list('id', flat=True)))
+    else:
+        forget_memberships(list(pk_set or ()))
+
+
+def invalidate_cached_responses(sender, instance, **kwargs):
+    bump_version(sender, instance.pk)
+
+
+for model in RESPONSE_CACHE_MODELS:
+    post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'resp-cache-save-{model.__name__}')
+    post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'resp-cache-delete-{model.__name__}')
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+def invalidate_cached_user_responses(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no cached payload renders
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_version(User, instance.pk)
+
+
+def queue_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if update_fields is not None and not set(sender.DERIVATIVE_FIELDS) & set(update_fields):
+        return
+    if stale_fields(instance):
+        schedule_derivatives(instance)
+
+
+for model in DERIVATIVE_MODELS:
+    post_save.connect(queue_image_derivatives, sender=model, dispatch_uid=f'image-derivatives-{model.__name__}')
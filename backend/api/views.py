@@ -1,43 +1,65 @@
 from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
 from allauth.socialaccount.providers.github.views import GitHubOAuth2Adapter
 from allauth.socialaccount.providers.oauth2.client import OAuth2Client
+from dj_rest_auth.jwt_auth import get_refresh_view
 from dj_rest_auth.registration.views import SocialLoginView
+from graphene_django.views import GraphQLView
 from rest_framework import viewsets, status, permissions, filters
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from django.db import models
+from django.db.models import Prefetch
+from django.db.models.functions import Coalesce, NullIf
 from django.contrib.auth.models import User
 from django.utils.text import slugify
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 import uuid
 
 from .models import (
-    UserProfile, Category, BlogPost, Product, Review, Order, Artist, SavedItem, Project,
-    ChatRoom, ChatMessage
+    UserProfile, Category, BlogPost, Product, Review, Order, OrderItem, DailySalesRollup, Artist,
+    SavedItem, Project, ChatRoom, ChatMessage
 )
 from .serializers import (
     UserProfileSerializer, CategorySerializer, BlogPostSerializer,
     ProductSerializer, ReviewSerializer, OrderSerializer, ArtistSerializer,
     UserSerializer, SavedItemSerializer, ProjectSerializer,
-    ChatRoomSerializer, ChatMessageSerializer
+    ChatRoomSerializer, ChatMessageSerializer, ParticipantSerializer, PARTICIPANT_PREVIEW_SIZE
 )
 from .permissions import IsOwnerOrReadOnly, IsSellerOrReadOnly
-
-
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+from .mixins import EagerLoadingMixin
+from .pagination import KeysetPagination, ParticipantPagination
+from .cache import CachedResponseMixin, response_cache_stats
+from .counters import record_blog_view
+from .search import FullTextSearchFilter, FullTextSearchMixin
+from .geo import within_radius
+from .discovery import discover_rooms, joinable_rooms
+from .authentication import ProfileTokenRefreshSerializer, get_profile, profile_claim
+from .renderers import dumps
+from .profiling import profiling_report, reset_profiling
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry as metrics_registry
+
+
+class CategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for product and blog categories"""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_timeout = 60 * 60
 
 
-class BlogPostViewSet(viewsets.ModelViewSet):
+class BlogPostViewSet(CachedResponseMixin, FullTextSearchMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     """API endpoint for blog posts"""
     queryset = BlogPost.objects.filter(published=True)
     serializer_class = BlogPostSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    select_related_fields = ('author__profile',)
+    pagination_class = KeysetPagination
+    cache_dependencies = (User, UserProfile)
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'featured']
-    search_fields = ['title', 'excerpt', 'content']
     ordering_fields = ['created_at', 'views']
     ordering = ['-created_at']
     permission_classes = [IsOwnerOrReadOnly]
@@ -48,22 +70,36 @@ class BlogPostViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[permissions.AllowAny])
     def increment_views(self, request, pk=None):
         """Increment view count for a blog post"""
-        blog_post = self.get_object()
-        blog_post.views += 1
-        blog_post.save()
-        return Response({'views': blog_post.views})
-
-
-class ProductViewSet(viewsets.ModelViewSet):
+        try:
+            post = self.get_queryset().filter(pk=int(pk))
+        except ValueError:
+            raise NotFound()
+        # Only published posts that exist get a buffer entry
+        stored_views = post.values_list('views', flat=True).first()
+        if stored_views is None:
+            raise NotFound()
+        pending = record_blog_view(int(pk))
+        if not pending:
+            # The view was written straight to the table (flush or buffer outage); read it back
+            stored_views = post.values_list('views', flat=True).first() or stored_views
+        return Response({'views': stored_views + pending})
+
+
+class ProductViewSet(CachedResponseMixin, FullTextSearchMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     """API endpoint for marketplace products"""
     queryset = Product.objects.filter(status='active')
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    select_related_fields = ('seller__profile', 'category')
+    pagination_class = KeysetPagination
+    cache_dependencies = (Category, User, UserProfile)
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'status', 'seller']
-    search_fields = ['title', 'description']
     ordering_fields = ['price', 'rating', 'created_at']
     ordering = ['-created_at']
     permission_classes = [IsSellerOrReadOnly]
+    nearby_max_radius_km = 200
+    nearby_default_results = 50
+    nearby_max_results = 200
     
     def perform_create(self, serializer):
         serializer.save(seller=self.request.user)
@@ -72,15 +108,31 @@ class ProductViewSet(viewsets.ModelViewSet):
     def reviews(self, request, pk=None):
         """Get reviews for a product"""
         product = self.get_object()
-        reviews = product.reviews.all()
+        reviews = product.reviews.select_related('reviewer__profile')
         serializer = ReviewSerializer(reviews, many=True)
         return Response(serializer.data)
 
-
-class ReviewViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """Active products from sellers within radius_km of lat/lng, nearest first"""
+        lat = _query_float(request, 'lat', -90, 90)
+        lng = _query_float(request, 'lng', -180, 180)
+        radius_km = _query_float(request, 'radius_km', 0, self.nearby_max_radius_km, default=10)
+        limit = int(_query_float(request, 'limit', 1, self.nearby_max_results, default=self.nearby_default_results))
+
+        products = within_radius(self.get_queryset(), 'seller__profile', lat, lng, radius_km)
+        products = list(products.order_by('distance_km', 'id')[:limit])
+        data = self.get_serializer(products, many=True).data
+        for item, product in zip(data, products):
+            item['distance_km'] = round(product.distance_km, 3)
+        return Response({'results': data})
+
+
+class ReviewViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     """API endpoint for product reviews"""
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
+    select_related_fields = ('reviewer__profile',)
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['product', 'rating']
@@ -89,7 +141,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
         serializer.save(reviewer=self.request.user)
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     """API endpoint for orders"""
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
@@ -97,13 +149,16 @@ class OrderViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'buyer']
     ordering = ['-created_at']
+    select_related_fields = ('buyer__profile',)
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         """Users can only see their own orders"""
         user = self.request.user
+        queryset = super().get_queryset()
         if user.is_staff:
-            return Order.objects.all()
-        return Order.objects.filter(buyer=user)
+            return queryset
+        return queryset.filter(buyer=user)
     
     def perform_create(self, serializer):
         # Generate unique order ID
@@ -111,10 +166,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer.save(buyer=self.request.user, order_id=order_id)
 
 
-class ArtistViewSet(viewsets.ReadOnlyModelViewSet):
+class ArtistViewSet(CachedResponseMixin, EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for featured artists"""
     queryset = Artist.objects.filter(featured=True)
     serializer_class = ArtistSerializer
+    select_related_fields = ('user__profile',)
+    cache_dependencies = (User, UserProfile)
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'specialty']
 
@@ -126,31 +183,27 @@ class UserProfileViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get', 'put', 'patch'])
     def me(self, request):
         """Get or update current user's profile"""
-        profile, _ = UserProfile.objects.get_or_create(user=request.user)
+        profile = get_profile(request.user)
         
         if request.method in ['PUT', 'PATCH']:
             serializer = UserProfileSerializer(profile, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save()
                 # If first_name or last_name in request data, update User model
-                if 'first_name' in request.data:
-                    request.user.first_name = request.data['first_name']
-                if 'last_name' in request.data:
-                    request.user.last_name = request.data['last_name']
-                request.user.save()
+                changed = [
+                    field for field in ('first_name', 'last_name')
+                    if field in request.data and getattr(request.user, field) != request.data[field]
+                ]
+                for field in changed:
+                    setattr(request.user, field, request.data[field])
+                if changed:
+                    request.user.save(update_fields=changed)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         # For GET, include user's relevant chat discovery
-        discovery = ChatRoom.objects.filter(
-            models.Q(church=profile.home_church) | 
-            models.Q(location=profile.location) |
-            models.Q(room_type='channel')
-        ).exclude(participants=request.user)[:5]
-
-        discovery_data = ChatRoomSerializer(discovery, many=True).data
         user_data = UserSerializer(request.user).data
-        user_data['discovery'] = discovery_data
+        user_data['discovery'] = discover_rooms(request.user, include_channels=True, limit=5)
         
         return Response(user_data)
 
@@ -158,8 +211,7 @@ class UserProfileViewSet(viewsets.ViewSet):
     def stats(self, request):
         """Get role-specific dashboard statistics"""
         user = request.user
-        profile, _ = UserProfile.objects.get_or_create(user=user)
-        role = profile.role
+        role = profile_claim(user, 'role')
         
         data = {
             'role': role,
@@ -192,36 +244,32 @@ class UserProfileViewSet(viewsets.ViewSet):
         elif role in ['farmer', 'seller']:
             # Sales performance for their products
             products = Product.objects.filter(seller=user)
-            # Find all orders containing any of their products
-            # (Note: In a real app we'd have OrderItems for better indexing)
-            # For now, searching JSON
-            revenue = 0
-            order_ids = set()
-            customers = set()
-            church_distribution = {}
-            
-            for order in Order.objects.all():
-                for p in order.products:
-                    # In mock system, check if product title/id matches
-                    # Implementation detail depend on how we store products in JSON
-                    if p.get('seller_id') == user.id:
-                        revenue += float(p.get('price', 0)) * int(p.get('quantity', 1))
-                        order_ids.add(order.id)
-                        customers.add(order.buyer_id)
-                        
-                        # Church demographic
-                        church = order.buyer.profile.home_church or "Independent"
-                        church_distribution[church] = church_distribution.get(church, 0) + 1
+            items = OrderItem.objects.filter(seller=user)
+            totals = items.aggregate(
+                revenue=models.Sum(models.F('unit_price') * models.F('quantity')),
+                total_orders=models.Count('order', distinct=True),
+                customers=models.Count('order__buyer', distinct=True),
+            )
+
+            # Church demographic, one row per purchased line
+            church_rows = items.values(
+                church=Coalesce(
+                    NullIf('order__buyer__profile__home_church', models.Value('')),
+                    models.Value('Independent'),
+                )
+            ).annotate(count=models.Count('id')).order_by()
+            church_distribution = {row['church']: row['count'] for row in church_rows}
 
             data['stats'] = {
-                'revenue': revenue,
-                'total_orders': len(order_ids),
-                'customers': len(customers),
+                'revenue': float(totals['revenue'] or 0),
+                'total_orders': totals['total_orders'],
+                'customers': totals['customers'],
                 'church_breakdown': church_distribution,
                 'low_stock_count': products.filter(quantity__lt=10).count()
             }
             
         elif role in ['tradesman', 'artisan']:
+            profile = get_profile(user)
             projects = Project.objects.filter(tradesman=user)
             completed = projects.filter(status='completed')
             mtd_earnings = sum(p.budget for p in completed if p.budget) # Simplified MTD
@@ -237,57 +285,67 @@ class UserProfileViewSet(viewsets.ViewSet):
                 'pipeline': pipeline,
                 'earnings': float(mtd_earnings),
                 'project_count': projects.count(),
-                'rating_avg': user.products.aggregate(models.Avg('rating'))['rating__avg'] or 5.0
+                'rating_avg': profile.seller_rating if profile.seller_reviews_count else 5.0
             }
 
         elif role == 'admin':
+            total_sales = DailySalesRollup.objects.orders().aggregate(total=models.Sum('revenue'))['total'] or 0
             data['stats'] = {
                 'total_users': User.objects.count(),
-                'total_sales': float(sum(o.total_amount for o in Order.objects.exclude(status='cancelled'))),
+                'total_sales': float(total_sales),
                 'flagged_reviews': Review.objects.filter(helpful_count__lt=0).count(), # mock flagged
-                'charity_fund': float(sum(o.total_amount for o in Order.objects.exclude(status='cancelled'))) * 0.1
+                'charity_fund': float(total_sales) * 0.1
             }
             
         return Response(data)
 
 
-class SavedItemViewSet(viewsets.ModelViewSet):
+class SavedItemViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     """API endpoint for member's saved items"""
     serializer_class = SavedItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ('user__profile', 'product__seller__profile', 'product__category')
     
     def get_queryset(self):
-        return SavedItem.objects.filter(user=self.request.user)
+        return self.eager_load(SavedItem.objects.filter(user=self.request.user))
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     """API endpoint for projects managed by tradesmen/artisans"""
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'tradesman', 'client']
     ordering = ['-created_at']
+    select_related_fields = ('tradesman__profile', 'client__profile')
     
     def get_queryset(self):
         user = self.request.user
-        if user.profile.role in ['tradesman', 'artisan']:
-            return Project.objects.filter(tradesman=user)
-        return Project.objects.filter(client=user)
+        if profile_claim(user, 'role') in ['tradesman', 'artisan']:
+            return self.eager_load(Project.objects.filter(tradesman=user))
+        return self.eager_load(Project.objects.filter(client=user))
     
     def perform_create(self, serializer):
         serializer.save(tradesman=self.request.user)
 
 
-class ChatRoomViewSet(viewsets.ModelViewSet):
+class ChatRoomViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     """API endpoint for chat rooms (personal, group, channel)"""
     serializer_class = ChatRoomSerializer
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ('last_message__sender__profile',)
+    prefetch_related_fields = (
+        Prefetch(
+            'participants', queryset=User.objects.order_by('id')[:PARTICIPANT_PREVIEW_SIZE],
+            to_attr='participant_preview'
+        ),
+    )
 
     def get_queryset(self):
-        return self.request.user.chat_rooms.all()
+        return self.eager_load(self.request.user.chat_rooms.all())
 
     def perform_create(self, serializer):
         room = serializer.save()
@@ -328,39 +386,101 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def discovery(self, request):
         """Find rooms based on church or location"""
-        user = request.user
-        profile = user.profile
-        rooms = ChatRoom.objects.filter(
-            models.Q(church=profile.home_church) | 
-            models.Q(location=profile.location)
-        ).exclude(participants=user)
-        return Response(ChatRoomSerializer(rooms, many=True).data)
+        return Response(discover_rooms(request.user))
+
+    @action(detail=True, methods=['get'], pagination_class=ParticipantPagination)
+    def participants(self, request, pk=None):
+        """Paginated members of a room"""
+        room = self.get_object()
+        page = self.paginate_queryset(room.participants.all())
+        return self.get_paginated_response(ParticipantSerializer(page, many=True).data)
 
     @action(detail=True, methods=['post'])
     def join(self, request, pk=None):
-        """Join a public channel or group"""
-        room = self.get_object()
-        if room.room_type == 'personal':
-            return Response({'error': 'Cannot join personal chat'}, status=status.HTTP_400_BAD_REQUEST)
+        """Join a public channel or a group discovered through the user's church or location"""
+        # Rooms the user could not discover (personal chats, other churches) are indistinguishable from missing ones
+        room = get_object_or_404(joinable_rooms(request.user), pk=pk)
         room.participants.add(request.user)
         return Response({'status': 'joined'})
 
 
-class ChatMessageViewSet(viewsets.ModelViewSet):
+class ChatMessageViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     """API endpoint for messages"""
     serializer_class = ChatMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ('sender__profile',)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('timestamp', 'id')
 
     def get_queryset(self):
         room_id = self.request.query_params.get('room')
         if room_id:
-            return ChatMessage.objects.filter(room_id=room_id, room__participants=self.request.user)
+            return self.eager_load(
+                ChatMessage.objects.filter(room_id=room_id, room__participants=self.request.user)
+            )
         return ChatMessage.objects.none()
 
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
 
 
+def _query_float(request, name, minimum, maximum, default=None):
+    raw = request.query_params.get(name)
+    if raw in (None, ''):
+        if default is None:
+            raise ValidationError({name: 'This parameter is required.'})
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        raise ValidationError({name: 'A number is required.'})
+    if not minimum <= value <= maximum:
+        raise ValidationError({name: f'Must be between {minimum} and {maximum}.'})
+    return value
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def cache_stats(request):
+    """Response cache hit/miss counters for this worker"""
+    return Response(response_cache_stats())
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([permissions.IsAdminUser])
+def profiling(request):
+    """Per-route latency and query percentiles; DELETE clears the samples"""
+    if request.method == 'DELETE':
+        reset_profiling()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(profiling_report())
+
+
+def metrics(request):
+    """Prometheus scrape endpoint for this worker; needs the METRICS_TOKEN bearer token or a staff session"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not request.user.is_staff:
+        response = HttpResponse(status=401)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+class FastGraphQLView(GraphQLView):
+    """GraphQL endpoint that encodes compact responses with the fast JSON encoder"""
+
+    def json_encode(self, request, d, pretty=False):
+        if self.pretty or pretty or request.GET.get('pretty'):
+            return super().json_encode(request, d, pretty)
+        return dumps(d)
+
+
+class ProfileTokenRefreshView(get_refresh_view()):
+    """dj-rest-auth token refresh that also brings the profile claims up to date"""
+    serializer_class = ProfileTokenRefreshSerializer
+
+
 class GoogleLogin(SocialLoginView):
     adapter_class = GoogleOAuth2Adapter
     callback_url = "http://localhost:3000/auth/callback/google"
@@ -20,13 +20,16 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'harvestconnect.settings')
 django_asgi_app = get_asgi_application()
 
 import api.routing
+from api.authentication import JWTWebSocketMiddleware
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
         AuthMiddlewareStack(
-            URLRouter(
-                api.routing.websocket_urlpatterns
+            JWTWebSocketMiddleware(
+                URLRouter(
+                    api.routing.websocket_urlpatterns
+                )
             )
         )
     ),
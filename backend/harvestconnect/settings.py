@@ -82,6 +82,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -145,6 +147,28 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Chat messages are persisted write-behind, in bulk, per worker
+CHAT_MESSAGE_FLUSH_BATCH = config('CHAT_MESSAGE_FLUSH_BATCH', default=100, cast=int)
+CHAT_MESSAGE_FLUSH_INTERVAL_MS = config('CHAT_MESSAGE_FLUSH_INTERVAL_MS', default=200, cast=int)
+
+# Blog views are buffered and folded into BlogPost.views at most this often (seconds)
+BLOG_VIEW_FLUSH_INTERVAL = config('BLOG_VIEW_FLUSH_INTERVAL', default=30, cast=int)
+
+# Per-request query/latency profiling, reported at /api/profiling/ (off by default)
+REQUEST_PROFILING = config('REQUEST_PROFILING', default=False, cast=bool)
+REQUEST_PROFILING_SAMPLES = config('REQUEST_PROFILING_SAMPLES', default=1000, cast=int)
+
+# Background jobs (ratings, rollups, thumbnails, email), run by `manage.py run_workers`
+JOB_WORKERS = config('JOB_WORKERS', default=2, cast=int)
+# Seconds before the first retry of a failed job; doubled per attempt up to the maximum
+JOB_RETRY_DELAY = config('JOB_RETRY_DELAY', default=5, cast=int)
+JOB_RETRY_MAX_DELAY = config('JOB_RETRY_MAX_DELAY', default=600, cast=int)
+# Run jobs inline as they are queued, ignoring the queue (tests, one-off scripts)
+JOBS_EAGER = config('JOBS_EAGER', default=False, cast=bool)
+
+# Bearer token Prometheus sends to scrape /metrics; while empty only staff sessions can read it
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 # Graphene (GraphQL)
 GRAPHENE = {
     'SCHEMA': 'harvestconnect.schema.schema'
@@ -269,7 +293,7 @@ SITE_ID = 1
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ProfileJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -280,6 +304,15 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.StandardResultsSetPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -293,8 +326,12 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
+    'TOKEN_OBTAIN_SERIALIZER': 'api.authentication.ProfileTokenObtainPairSerializer',
 }
 
+# Validate access tokens without reading the user row; the user loads lazily when a view needs it
+JWT_STATELESS_AUTH = config('JWT_STATELESS_AUTH', default=False, cast=bool)
+
 # CORS Configuration - Allow Next.js frontend
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS',
@@ -323,13 +360,16 @@ REST_AUTH = {
     'JWT_AUTH_REFRESH_COOKIE': 'jwt-refresh-token',
     'OLD_PASSWORD_FIELD_NAME': 'old_password',
     'REGISTER_SERIALIZER': 'api.serializers.RegisterSerializer',
+    'JWT_TOKEN_CLAIMS_SERIALIZER': 'api.authentication.ProfileTokenObtainPairSerializer',
 }
 
 # Email Configuration
-EMAIL_BACKEND = config(
+# EMAIL_DELIVERY_BACKEND sends mail; with QUEUE_EMAIL it is queued as background jobs that workers deliver
+EMAIL_DELIVERY_BACKEND = config(
     'EMAIL_BACKEND',
     default='django.core.mail.backends.console.EmailBackend'
 )
+EMAIL_BACKEND = 'api.mail.QueuedEmailBackend' if config('QUEUE_EMAIL', default=False, cast=bool) else EMAIL_DELIVERY_BACKEND
 EMAIL_HOST = config('EMAIL_HOST', default='localhost')
 EMAIL_PORT = config('EMAIL_PORT', default=1025, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
@@ -22,13 +22,12 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 from api.views import (
     CategoryViewSet, BlogPostViewSet, ProductViewSet,
     ReviewViewSet, OrderViewSet, ArtistViewSet, UserProfileViewSet,
     SavedItemViewSet, ProjectViewSet, ChatRoomViewSet, ChatMessageViewSet,
-    GoogleLogin, GitHubLogin
+    GoogleLogin, GitHubLogin, ProfileTokenRefreshView, FastGraphQLView, cache_stats, profiling, metrics
 )
 
 router = DefaultRouter()
@@ -46,12 +45,16 @@ router.register(r'messages', ChatMessageViewSet, basename='chat-message')
 
 urlpatterns = [
     path(config('ADMIN_URL_PATH', default='hc-secure-access-portal/'), admin.site.urls),
+    path('api/cache-stats/', cache_stats, name='cache-stats'),
+    path('api/profiling/', profiling, name='profiling'),
+    path('metrics', metrics, name='metrics'),
     path('api/', include(router.urls)),
+    path('api/auth/token/refresh/', ProfileTokenRefreshView.as_view(), name='token_refresh'),
     path('api/auth/', include('dj_rest_auth.urls')),
     path('api/auth/registration/', include('dj_rest_auth.registration.urls')),
     path('api/auth/google/', GoogleLogin.as_view(), name='google_login'),
     path('api/auth/github/', GitHubLogin.as_view(), name='github_login'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql/', csrf_exempt(FastGraphQLView.as_view(graphiql=True))),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -44,6 +44,10 @@ else:
     print('Superuser already exists')
 "
 
+# Start background job workers (ratings, rollups, thumbnails, email) alongside the web server
+echo "Starting job workers..."
+python manage.py run_workers &
+
 # Start the application
 echo "Starting Django application..."
 exec gunicorn --bind 0.0.0.0:$PORT --workers 3 --threads 2 --timeout 120 --keep-alive 5 --max-requests 1000 --max-requests-jitter 10 harvestconnect.wsgi:application
\ No newline at end of file
@@ -5,17 +5,50 @@ Tests all endpoints: Authentication, Products, Artists, Reviews, Orders
 
 import pytest
 import json
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import uuid
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, models
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils.text import slugify
+from django.utils.translation import gettext_lazy
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+
+import api.routing
+from api import counters, images, jobs, metrics, profiling
+from api.authentication import JWTWebSocketMiddleware, ProfileTokenObtainPairSerializer
+from api.cache import reset_response_cache_stats
+from api.geo import encode_geohash
+from api.renderers import FastJSONRenderer
+from tests.utils import QueryCountAssertionsMixin
+
 from api.serializers import (
     ProductSerializer, ArtistSerializer, ReviewSerializer, OrderSerializer,
     ChatRoomSerializer, ChatMessageSerializer, ProjectSerializer
 )
-from api.models import Product, Artist, Review, Order, Category, ChatRoom, ChatMessage, Project
+from django.core.management import call_command
+from api.models import (
+    Product, Artist, Review, Order, OrderItem, DailySalesRollup, Category, ChatRoom, ChatMessage, Project,
+    BlogPost, SavedItem, UserProfile
+)
 
 User = get_user_model()
 
@@ -628,12 +661,49 @@ class PaginationTestCase(APITestCase):
             )
     
     def test_pagination_first_page(self):
-        """Test first page of paginated results"""
+        """Test first page of keyset-paginated results carries a cursor but no count"""
         response = self.client.get('/api/products/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('next', response.data)
-        self.assertIn('count', response.data)
+        self.assertIn('cursor=', response.data['next'])
+        self.assertNotIn('count', response.data)
         self.assertLessEqual(len(response.data['results']), 10)
+
+    def test_pagination_page_number_fallback(self):
+        """Test explicit page requests keep page-number pagination with a count"""
+        response = self.client.get('/api/products/?page=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 25)
+
+    def test_keyset_walk_is_stable_across_timestamp_ties(self):
+        """Test following next links visits every product once, without COUNT queries"""
+        Product.objects.update(created_at=Product.objects.first().created_at)
+        seen = []
+        url = '/api/products/?page_size=7'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+            seen.extend(p['id'] for p in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(seen, sorted(Product.objects.values_list('id', flat=True), reverse=True))
+
+    def test_keyset_previous_link(self):
+        """Test the previous link of page two returns page one"""
+        first = self.client.get('/api/products/')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [p['id'] for p in back.data['results']],
+            [p['id'] for p in first.data['results']]
+        )
+
+    def test_invalid_cursor(self):
+        """Test a garbled cursor is rejected"""
+        response = self.client.get('/api/products/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
     
     def test_pagination_second_page(self):
         """Test accessing second page"""
@@ -809,3 +879,1727 @@ class ProjectEndpointTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['status'], 'in_progress')
 
+
+class SellerStatsTestCase(APITestCase):
+    """Test suite for seller dashboard stats backed by OrderItem rows"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.stats_url = '/api/users/stats/'
+
+        self.farmer = User.objects.create_user(username='farmer', password='password')
+        self.farmer.profile.role = 'farmer'
+        self.farmer.profile.save()
+
+        self.buyer = User.objects.create_user(username='buyer', password='password')
+        self.buyer.profile.home_church = 'Grace Fellowship'
+        self.buyer.profile.save()
+        self.other_buyer = User.objects.create_user(username='buyer2', password='password')
+
+        self.category = Category.objects.create(name='Greens')
+        self.product = Product.objects.create(
+            seller=self.farmer, title='Kale', slug='kale', description='Fresh kale',
+            category=self.category, price=5, quantity=3
+        )
+
+    def _order(self, buyer, products, **kwargs):
+        return Order.objects.create(
+            order_id=f'HC-{Order.objects.count() + 1}', buyer=buyer, products=products,
+            total_amount=sum(float(p['price']) * p['quantity'] for p in products),
+            shipping_address='1 Farm Lane', **kwargs
+        )
+
+    def test_order_items_created_from_products_json(self):
+        """Test OrderItem rows mirror the products JSON, resolving seller from product id"""
+        order = self._order(self.buyer, [
+            {'id': self.product.id, 'title': 'Kale', 'price': '5.00', 'quantity': 2},
+            {'id': 99999, 'title': 'Unknown', 'price': 3, 'quantity': 1, 'seller_id': 99999},
+        ])
+        items = {item.title: item for item in order.items.all()}
+        self.assertEqual(items['Kale'].seller_id, self.farmer.id)
+        self.assertEqual(items['Kale'].category, 'Greens')
+        self.assertEqual(items['Kale'].quantity, 2)
+        self.assertIsNone(items['Unknown'].seller_id)
+
+        order.status = 'shipped'
+        order.save()
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 2)
+
+    def test_seller_stats_aggregate_order_items(self):
+        """Test revenue, orders, customers and church breakdown for a farmer"""
+        line = {'id': self.product.id, 'price': '5.00', 'quantity': 2, 'seller_id': self.farmer.id}
+        self._order(self.buyer, [line])
+        self._order(self.buyer, [line, {'price': '7.50', 'quantity': 1, 'seller_id': self.farmer.id}])
+        self._order(self.other_buyer, [line])
+        self._order(self.other_buyer, [{'price': '100', 'quantity': 1, 'seller_id': self.buyer.id}])
+
+        self.client.force_authenticate(user=self.farmer)
+        response = self.client.get(self.stats_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = response.data['stats']
+        self.assertEqual(stats['revenue'], 37.5)
+        self.assertEqual(stats['total_orders'], 3)
+        self.assertEqual(stats['customers'], 2)
+        self.assertEqual(stats['church_breakdown'], {'Grace Fellowship': 3, 'Independent': 1})
+        self.assertEqual(stats['low_stock_count'], 1)
+
+
+@override_settings(JOBS_EAGER=True)
+class AnalyticsQueryTestCase(APITestCase):
+    """Test suite for the GraphQL analytics resolver"""
+
+    QUERY = '{ analytics { totalSales totalOrders salesByCategory salesByChurch salesByLocation } }'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.buyer = User.objects.create_user(username='buyer', password='password')
+        self.buyer.profile.home_church = 'Grace Fellowship'
+        self.buyer.profile.location = 'Accra'
+        self.buyer.profile.save()
+        self.other_buyer = User.objects.create_user(username='buyer2', password='password')
+
+        for i, (buyer, category, amount, order_status) in enumerate([
+            (self.buyer, 'Greens', 10, 'delivered'),
+            (self.buyer, 'Tubers', 20, 'shipped'),
+            (self.other_buyer, 'Greens', 30, 'confirmed'),
+            (self.other_buyer, 'Greens', 500, 'cancelled'),
+        ]):
+            Order.objects.create(
+                order_id=f'HC-A{i}', buyer=buyer, total_amount=amount, status=order_status,
+                products=[{'title': 'Item', 'price': amount, 'quantity': 1, 'category': category}],
+                shipping_address='1 Farm Lane'
+            )
+
+    def test_analytics_breakdowns(self):
+        """Test church, location and category breakdowns exclude cancelled orders"""
+        # Totals, monthly, church, location and category: one query each
+        with self.assertNumQueries(5):
+            response = self.client.post('/graphql/', {'query': self.QUERY}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        analytics = response.json()['data']['analytics']
+        self.assertEqual(analytics['totalSales'], 60.0)
+        self.assertEqual(analytics['totalOrders'], 3)
+
+        self.assertEqual(json.loads(analytics['salesByCategory']), {'Greens': 40.0, 'Tubers': 20.0})
+        self.assertEqual(json.loads(analytics['salesByChurch']), {'Grace Fellowship': 30.0, 'Other': 30.0})
+        self.assertEqual(json.loads(analytics['salesByLocation']), {'Accra': 30.0, 'Other': 30.0})
+
+
+@override_settings(JOBS_EAGER=True)
+class DailySalesRollupTestCase(APITestCase):
+    """Test suite for maintenance of the daily sales rollup"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller', password='password')
+        self.buyer = User.objects.create_user(username='buyer', password='password')
+        self.buyer.profile.home_church = 'Lakeside Bible'
+        self.buyer.profile.save()
+        self.order = Order.objects.create(
+            order_id='HC-R1', buyer=self.buyer, total_amount=25, status='pending',
+            shipping_address='1 Farm Lane',
+            products=[
+                {'title': 'Eggs', 'price': 5, 'quantity': 3, 'category': 'Dairy & Eggs', 'seller_id': self.seller.id},
+                {'title': 'Bread', 'price': 10, 'quantity': 1, 'category': 'Baked Goods', 'seller_id': self.seller.id},
+            ]
+        )
+
+    def _snapshot(self):
+        return sorted(
+            (str(r.date), r.category, r.seller_id or 0, r.church, r.location, r.revenue, r.order_count)
+            for r in DailySalesRollup.objects.all() if r.order_count or r.revenue
+        )
+
+    def test_rollup_tracks_status_changes(self):
+        """Test cancelling an order backs it out of the rollup and reinstating re-adds it"""
+        totals = DailySalesRollup.objects.orders().aggregate(models.Sum('revenue'), models.Sum('order_count'))
+        self.assertEqual(totals, {'revenue__sum': 25, 'order_count__sum': 1})
+        lines = dict(DailySalesRollup.objects.lines().values_list('category', 'revenue'))
+        self.assertEqual(lines, {'Dairy & Eggs': 15, 'Baked Goods': 10})
+
+        order = Order.objects.get(pk=self.order.pk)
+        order.status = 'cancelled'
+        order.save()
+        self.assertEqual(self._snapshot(), [])
+
+        order.status = 'confirmed'
+        order.save()
+        self.assertEqual(DailySalesRollup.objects.orders().aggregate(models.Sum('revenue'))['revenue__sum'], 25)
+
+    def test_rebuild_command_matches_incremental_rows(self):
+        """Test the rebuild command reproduces the incrementally maintained rollup"""
+        order = Order.objects.get(pk=self.order.pk)
+        order.products = order.products[:1]
+        order.total_amount = 15
+        order.save()
+        incremental = self._snapshot()
+
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+        self.assertEqual(self._snapshot(), incremental)
+        self.assertEqual(incremental[0][:4], (str(order.created_at.date()), '', 0, 'Lakeside Bible'))
+
+    def test_admin_stats_read_rollup(self):
+        """Test admin dashboard totals come from the rollup"""
+        admin = User.objects.create_user(username='admin', password='password')
+        admin.profile.role = 'admin'
+        admin.profile.save()
+        self.client.force_authenticate(user=admin)
+
+        response = self.client.get('/api/users/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stats']['total_sales'], 25.0)
+        self.assertEqual(response.data['stats']['charity_fund'], 2.5)
+
+
+class ListQueryCountTestCase(QueryCountAssertionsMixin, APITestCase):
+    """Test suite guarding list endpoints against N+1 queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='member', email='member@example.com', password='password')
+        self.category = Category.objects.create(name='Produce')
+        self.params = {'page_size': 50}
+
+    def _user(self, i, prefix='user'):
+        return User.objects.create(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com')
+
+    def _product(self, i, seller=None):
+        return Product.objects.create(
+            seller=seller or self._user(i, 'seller'), title=f'Product {i}', slug=f'product-{i}',
+            description='Fresh', category=self.category, price=10, quantity=5
+        )
+
+    def test_products_list(self):
+        """Test product list query count is independent of page size"""
+        self.assertConstantQueries('/api/products/', self._product, large=12, params=self.params)
+
+    def test_product_reviews(self):
+        """Test product reviews action query count is independent of review count"""
+        product = self._product(0)
+        self.assertConstantQueries(
+            f'/api/products/{product.id}/reviews/',
+            lambda i: Review.objects.create(product=product, reviewer=self._user(i), rating=5, comment='Great')
+        )
+
+    def test_blog_posts_list(self):
+        """Test blog post list query count is independent of page size"""
+        self.assertConstantQueries('/api/blog-posts/', lambda i: BlogPost.objects.create(
+            title=f'Post {i}', slug=f'post-{i}', excerpt='Excerpt', content='Content',
+            category='farming', author=self._user(i)
+        ), large=12, params=self.params)
+
+    def test_reviews_list(self):
+        """Test review list query count is independent of page size"""
+        product = self._product(0)
+        self.assertConstantQueries('/api/reviews/', lambda i: Review.objects.create(
+            product=product, reviewer=self._user(i), rating=4, comment='Nice'
+        ), large=12, params=self.params)
+
+    def test_artists_list(self):
+        """Test artist list query count is independent of page size"""
+        self.assertConstantQueries('/api/artists/', lambda i: Artist.objects.create(
+            user=self._user(i), name=f'Artist {i}', specialty='Pottery', bio='Bio',
+            profile_image='artists/a.png', featured=True
+        ), large=12, params=self.params)
+
+    def test_orders_list(self):
+        """Test order list query count is independent of page size"""
+        self.client.force_authenticate(user=self.user)
+        self.assertConstantQueries('/api/orders/', lambda i: Order.objects.create(
+            order_id=f'HC-Q{i}', buyer=self.user, products=[], total_amount=10, shipping_address='Lane'
+        ), large=12, params=self.params)
+
+    def test_saved_items_list(self):
+        """Test saved item list query count is independent of page size"""
+        self.client.force_authenticate(user=self.user)
+        self.assertConstantQueries('/api/saved-items/', lambda i: SavedItem.objects.create(
+            user=self.user, product=self._product(i)
+        ), large=12, params=self.params)
+
+    def test_projects_list(self):
+        """Test project list query count is independent of page size"""
+        self.client.force_authenticate(user=self.user)
+        self.assertConstantQueries('/api/projects/', lambda i: Project.objects.create(
+            tradesman=self._user(i), client=self.user, title=f'Project {i}', description='Fix'
+        ), large=12, params=self.params)
+
+    def test_messages_list(self):
+        """Test chat history query count is independent of page size"""
+        room = ChatRoom.objects.create(name='Room', room_type='group')
+        room.participants.add(self.user)
+        self.client.force_authenticate(user=self.user)
+
+        def message(i):
+            sender = self._user(i)
+            room.participants.add(sender)
+            ChatMessage.objects.create(room=room, sender=sender, content=f'Hello {i}')
+
+        self.assertConstantQueries('/api/messages/', message, large=12, params={'room': room.id, **self.params})
+
+    def test_chat_rooms_list(self):
+        """Test chat room list query count is independent of room and participant count"""
+        self.client.force_authenticate(user=self.user)
+
+        def room(i):
+            chat_room = ChatRoom.objects.create(name=f'Room {i}', room_type='group')
+            member = self._user(i)
+            chat_room.participants.add(self.user, member)
+            ChatMessage.objects.create(room=chat_room, sender=member, content=f'Hi {i}')
+
+        self.assertConstantQueries('/api/chat-rooms/', room, large=12, params=self.params)
+
+
+class ChatRoomLastMessageTestCase(APITestCase):
+    """Test suite for the denormalized ChatRoom.last_message pointer"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='chatter', email='chatter@example.com', password='password')
+        self.room = ChatRoom.objects.create(name='Growers', room_type='group')
+        self.room.participants.add(self.user)
+
+    def test_last_message_follows_new_and_deleted_messages(self):
+        """Test the pointer moves on create and falls back on delete"""
+        first = ChatMessage.objects.create(room=self.room, sender=self.user, content='First')
+        second = ChatMessage.objects.create(room=self.room, sender=self.user, content='Second')
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message_id, second.id)
+
+        second.delete()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message_id, first.id)
+
+    def test_rest_message_updates_room_listing(self):
+        """Test a message posted over REST shows up as the room's last message"""
+        self.client.force_authenticate(user=self.user)
+        self.client.post('/api/messages/', {'room': self.room.id, 'content': 'Harvest today'}, format='json')
+
+        response = self.client.get('/api/chat-rooms/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['last_message']['content'], 'Harvest today')
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_MESSAGE_FLUSH_BATCH=3,
+    CHAT_MESSAGE_FLUSH_INTERVAL_MS=50,
+)
+class ChatConsumerTestCase(TransactionTestCase):
+    """Test suite for the async ChatConsumer and its write-behind buffer"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='grower', email='grower@example.com', password='password')
+        self.room = ChatRoom.objects.create(name='Growers', room_type='group')
+        self.room.participants.add(self.user)
+
+    async def _connect(self, room_id, user=None):
+        communicator = WebsocketCommunicator(URLRouter(api.routing.websocket_urlpatterns), f'/ws/chat/{room_id}/')
+        communicator.scope['user'] = user or self.user
+        connected, _ = await communicator.connect()
+        if connected:
+            presence = await communicator.receive_json_from()
+            self.assertEqual(presence['type'], 'presence')
+        return communicator, connected
+
+    def test_messages_broadcast_then_bulk_persisted(self):
+        """Test messages are echoed immediately and written in batches"""
+        async def scenario():
+            communicator, connected = await self._connect(self.room.id)
+            self.assertTrue(connected)
+            for i in range(4):
+                await communicator.send_json_to({'type': 'message', 'message': f'm{i}'})
+                event = await communicator.receive_json_from()
+                self.assertEqual(event, {
+                    'type': 'message', 'message': f'm{i}', 'user_id': self.user.id, 'username': 'grower'
+                })
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+        contents = list(ChatMessage.objects.filter(room=self.room).order_by('id').values_list('content', flat=True))
+        self.assertEqual(contents, ['m0', 'm1', 'm2', 'm3'])
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message.content, 'm3')
+
+    def test_connection_and_group_send_metrics(self):
+        """Test open sockets are gauged per room and broadcasts are timed"""
+        before = metrics.group_send_duration.value(event='chat_message') or (0, 0.0)
+
+        async def scenario():
+            communicator, _ = await self._connect(self.room.id)
+            self.assertEqual(metrics.websocket_connections.value(room=self.room.id), 1)
+            await communicator.send_json_to({'type': 'message', 'message': 'hi'})
+            await communicator.receive_json_from()
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+        self.assertIsNone(metrics.websocket_connections.value(room=self.room.id))
+        self.assertEqual(metrics.group_send_duration.value(event='chat_message')[0], before[0] + 1)
+
+    def test_unknown_room_rejected(self):
+        """Test sockets for missing rooms are closed at connect"""
+        async def scenario():
+            communicator, connected = await self._connect(99999)
+            self.assertFalse(connected)
+
+        async_to_sync(scenario)()
+
+    def test_room_access_checked_at_connect(self):
+        """Test sockets only open for rooms the user is in or could join"""
+        UserProfile.objects.filter(user=self.user).update(home_church='Grace Chapel')
+        self.user = User.objects.select_related('profile').get(pk=self.user.pk)
+        church = ChatRoom.objects.create(name='Grace', room_type='group', church='Grace Chapel')
+        channel = ChatRoom.objects.create(name='Announcements', room_type='channel')
+        other_church = ChatRoom.objects.create(name='Hope', room_type='group', church='Hope Church')
+        personal = ChatRoom.objects.create(name='direct-2-3', room_type='personal')
+
+        async def scenario():
+            for room, allowed in ((church, True), (channel, True), (other_church, False), (personal, False)):
+                communicator, connected = await self._connect(room.id)
+                self.assertEqual(connected, allowed, room.name)
+                if connected:
+                    await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_anonymous_socket_rejected(self):
+        """Test anonymous sockets are closed at connect, so no client can claim a user_id"""
+        async def scenario():
+            communicator, connected = await self._connect(self.room.id, user=AnonymousUser())
+            self.assertFalse(connected)
+
+        async_to_sync(scenario)()
+        self.assertFalse(ChatMessage.objects.exists())
+
+    def test_jwt_query_token_authenticates_socket(self):
+        """Test the WebSocket JWT middleware resolves the user from an access token"""
+        access = str(ProfileTokenObtainPairSerializer.get_token(self.user).access_token)
+        application = JWTWebSocketMiddleware(URLRouter(api.routing.websocket_urlpatterns))
+
+        async def scenario():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{self.room.id}/?token={access}')
+            communicator.scope['user'] = AnonymousUser()
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_json_from()
+            await communicator.send_json_to({'type': 'message', 'message': 'hello', 'user_id': 99999})
+            event = await communicator.receive_json_from()
+            self.assertEqual((event['user_id'], event['username']), (self.user.id, 'grower'))
+            await communicator.disconnect()
+
+            rejected = WebsocketCommunicator(application, f'/ws/chat/{self.room.id}/?token=not-a-token')
+            rejected.scope['user'] = AnonymousUser()
+            connected, _ = await rejected.connect()
+            self.assertFalse(connected)
+
+        async_to_sync(scenario)()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResponseCacheTestCase(APITestCase):
+    """Test suite for versioned anonymous response caching"""
+
+    def setUp(self):
+        cache.clear()
+        reset_response_cache_stats()
+
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller', email='seller@example.com', password='password')
+        self.category = Category.objects.create(name='Produce')
+        self.kale, self.corn = [
+            Product.objects.create(
+                seller=self.seller, title=title, slug=title.lower(), description='Fresh',
+                category=self.category, price=5, quantity=10
+            )
+            for title in ('Kale', 'Corn')
+        ]
+
+    def test_anonymous_list_served_from_cache(self):
+        """Test the second identical request is a hit, with params normalized"""
+        first = self.client.get('/api/products/?page_size=5&category=%d' % self.category.id)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/products/?category=%d&page_size=5' % self.category.id)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+    def test_product_edit_invalidates_only_affected_entries(self):
+        """Test editing one product refreshes lists and its detail but not other details"""
+        self.client.get('/api/products/')
+        self.client.get(f'/api/products/{self.kale.id}/')
+        self.client.get(f'/api/products/{self.corn.id}/')
+
+        self.kale.title = 'Lacinato Kale'
+        self.kale.save()
+
+        listing = self.client.get('/api/products/')
+        self.assertEqual(listing['X-Cache'], 'MISS')
+        self.assertIn('Lacinato Kale', [p['title'] for p in listing.data['results']])
+        self.assertEqual(self.client.get(f'/api/products/{self.kale.id}/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(f'/api/products/{self.corn.id}/')['X-Cache'], 'HIT')
+
+        self.category.name = 'Greens'
+        self.category.save()
+        self.assertEqual(self.client.get(f'/api/products/{self.corn.id}/')['X-Cache'], 'MISS')
+
+    @override_settings(JOBS_EAGER=True)
+    def test_rating_recompute_invalidates_product(self):
+        """Test counters written by queryset update() still invalidate cached products"""
+        self.client.get(f'/api/products/{self.kale.id}/')
+        reviewer = User.objects.create_user(username='taster', password='password')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.kale, reviewer=reviewer, rating=4, title='', comment='Crisp')
+
+        detail = self.client.get(f'/api/products/{self.kale.id}/')
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual((detail.data['rating'], detail.data['reviews_count']), (4.0, 1))
+
+    def test_blog_view_flush_invalidates_post(self):
+        """Test flushed view counts are not hidden behind cached blog responses"""
+        post = BlogPost.objects.create(
+            title='Harvest Notes', slug='harvest-notes', excerpt='Notes', content='Body',
+            category='farming', author=self.seller, views=10
+        )
+        with mock.patch.object(counters, '_buffer', counters.LocalViewBuffer()):
+            self.client.get(f'/api/blog-posts/{post.id}/')
+            counters.record_blog_view(post.id)
+            counters.flush_blog_views()
+        detail = self.client.get(f'/api/blog-posts/{post.id}/')
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual(detail.data['views'], 11)
+
+    def test_authenticated_requests_bypass_cache(self):
+        """Test only anonymous traffic is cached"""
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.get('/api/categories/')
+        self.assertNotIn('X-Cache', response)
+
+    def test_cache_stats_endpoint(self):
+        """Test hit/miss counters are exposed to staff only"""
+        self.client.get('/api/categories/')
+        self.client.get('/api/categories/')
+
+        self.assertEqual(self.client.get('/api/cache-stats/').status_code, status.HTTP_401_UNAUTHORIZED)
+        staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.client.force_authenticate(user=staff)
+        stats = self.client.get('/api/cache-stats/').data
+        self.assertEqual(stats['category']['hits'], 1)
+        self.assertEqual(stats['category']['misses'], 1)
+        self.assertEqual(stats['category']['hit_ratio'], 0.5)
+
+
+@override_settings(BLOG_VIEW_FLUSH_INTERVAL=3600)
+class BlogViewCounterTestCase(APITestCase):
+    """Test suite for buffered, write-coalesced blog view counting"""
+
+    def setUp(self):
+        self.client = APIClient()
+        patcher = mock.patch.object(counters, '_buffer', counters.LocalViewBuffer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        author = User.objects.create_user(username='author', password='password')
+        self.post = BlogPost.objects.create(
+            title='Harvest Notes', slug='harvest-notes', excerpt='Notes', content='Body',
+            category='farming', author=author, views=10
+        )
+        self.url = f'/api/blog-posts/{self.post.id}/increment_views/'
+
+    def test_views_buffered_then_flushed(self):
+        """Test increments return the live count and reach the table in one UPDATE"""
+        updated_at = self.post.updated_at
+        for expected in (11, 12, 13):
+            response = self.client.post(self.url)
+            self.assertEqual(response.data['views'], expected)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 10)
+
+        with self.assertNumQueries(1):
+            call_command('flush_blog_views', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 13)
+        self.assertEqual(self.post.updated_at, updated_at)
+        self.assertEqual(self.client.post(self.url).data['views'], 14)
+
+    @override_settings(BLOG_VIEW_FLUSH_INTERVAL=0)
+    def test_interval_elapsed_flushes_inline(self):
+        """Test a request past the flush interval writes pending views itself"""
+        self.assertEqual(self.client.post(self.url).data['views'], 11)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 11)
+
+    def test_unknown_post(self):
+        """Test incrementing a missing post is a 404"""
+        response = self.client.post('/api/blog-posts/9999/increment_views/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(counters.pending_blog_views(9999), 0)
+
+    def test_unpublished_post_not_counted(self):
+        """Test views on unpublished posts are rejected before anything is buffered"""
+        BlogPost.objects.filter(pk=self.post.pk).update(published=False)
+        self.assertEqual(self.client.post(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(counters.pending_blog_views(self.post.pk), 0)
+
+
+class FullTextSearchTestCase(APITestCase):
+    """Test suite for indexed full-text search on products and blog posts"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller', email='seller@example.com', password='password')
+        self.category = Category.objects.create(name='Produce')
+        self.heirloom = self._product('Heirloom Tomatoes', 'Sweet, sun ripened')
+        self.sauce = self._product('Pasta Sauce', 'Slow cooked from our tomatoes and basil')
+        self._product('Sweet Corn', 'Picked this morning')
+
+    def _product(self, title, description):
+        return Product.objects.create(
+            seller=self.seller, title=title, slug=slugify(title), description=description,
+            category=self.category, price=5, quantity=10
+        )
+
+    def test_search_orders_by_relevance(self):
+        """Test a title match ranks above a description match"""
+        response = self.client.get('/api/products/search/?q=tomato')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.heirloom.id, self.sauce.id]
+        )
+
+    def test_prefix_and_all_terms_match(self):
+        """Test partial words match and every term is required"""
+        response = self.client.get('/api/products/search/?q=tom bas')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.sauce.id])
+
+    def test_index_follows_writes(self):
+        """Test updates and deletes are reflected in the index"""
+        self.heirloom.title = 'Cherry Peppers'
+        self.heirloom.description = 'Hot'
+        self.heirloom.save()
+        self.sauce.delete()
+        self.assertEqual(self.client.get('/api/products/search/?q=tomato').data['results'], [])
+        response = self.client.get('/api/products/search/?q=pepper')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.heirloom.id])
+
+    def test_list_search_param_uses_index(self):
+        """Test ?search= on the list endpoint filters through the full-text index"""
+        response = self.client.get('/api/products/?search=sweet')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_blog_search_respects_published(self):
+        """Test blog search covers excerpt and content and hides drafts"""
+        author = User.objects.create_user(username='author', password='password')
+        live = BlogPost.objects.create(
+            title='Season Notes', slug='season-notes', excerpt='Planting garlic',
+            content='Cloves go in before frost', category='farming', author=author
+        )
+        BlogPost.objects.create(
+            title='Draft', slug='draft', excerpt='Garlic draft', content='Unfinished',
+            category='farming', author=author, published=False
+        )
+        response = self.client.get('/api/blog-posts/search/?q=garlic')
+        self.assertEqual([item['id'] for item in response.data['results']], [live.id])
+
+    def test_empty_query_rejected(self):
+        """Test a query without search terms is a 400"""
+        response = self.client.get('/api/products/search/?q=%20!')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NearbyProductsTestCase(APITestCase):
+    """Test suite for geohash-indexed proximity search"""
+
+    ACCRA = (5.6037, -0.1870)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Produce')
+        # Roughly 1 km, 8 km and 150 km from central Accra
+        self.near = self._seller_product('near', 5.6127, -0.1870)
+        self.mid = self._seller_product('mid', 5.6037, -0.1148)
+        self.far = self._seller_product('far', 6.6885, -1.6244)
+
+    def _seller_product(self, name, latitude, longitude):
+        seller = User.objects.create(username=name, email=f'{name}@example.com')
+        seller.profile.latitude = latitude
+        seller.profile.longitude = longitude
+        seller.profile.save()
+        return Product.objects.create(
+            seller=seller, title=name, slug=name, description='Fresh',
+            category=self.category, price=5, quantity=10
+        )
+
+    def _nearby(self, **params):
+        params.setdefault('lat', self.ACCRA[0])
+        params.setdefault('lng', self.ACCRA[1])
+        return self.client.get('/api/products/nearby/', params)
+
+    def test_geohash_maintained_on_save(self):
+        """Test the profile geohash follows its coordinates"""
+        profile = self.near.seller.profile
+        self.assertEqual(profile.geohash, encode_geohash(5.6127, -0.1870))
+        profile.latitude = None
+        profile.save(update_fields=['latitude'])
+        profile.refresh_from_db()
+        self.assertEqual(profile.geohash, '')
+
+    def test_sorted_by_distance_within_radius(self):
+        """Test only products inside the radius are returned, nearest first"""
+        response = self._nearby(radius_km=10)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([item['id'] for item in results], [self.near.id, self.mid.id])
+        self.assertAlmostEqual(results[0]['distance_km'], 1.0, delta=0.05)
+        self.assertAlmostEqual(results[1]['distance_km'], 8.0, delta=0.1)
+
+        response = self._nearby(radius_km=200)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.near.id, self.mid.id, self.far.id])
+
+    def test_single_query(self):
+        """Test the search runs as one query regardless of the number of sellers"""
+        with self.assertNumQueries(1):
+            self._nearby(radius_km=50)
+
+    def test_inactive_and_unlocated_excluded(self):
+        """Test sold products and sellers without coordinates never match"""
+        self.near.status = 'sold'
+        self.near.save()
+        self._seller_product('nowhere', None, None)
+        response = self._nearby(radius_km=10)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.mid.id])
+
+    def test_invalid_parameters(self):
+        """Test missing or out-of-range parameters are rejected"""
+        self.assertEqual(self.client.get('/api/products/nearby/?lat=5').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._nearby(lat=95).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._nearby(radius_km='far').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._nearby(radius_km=5000).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ChatDiscoveryTestCase(APITestCase):
+    """Test suite for chat room discovery summaries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='member', password='password')
+        self.user.profile.home_church = 'Grace Chapel'
+        self.user.profile.location = 'Accra'
+        self.user.profile.save()
+        self.client.force_authenticate(user=self.user)
+
+        self.church_room = ChatRoom.objects.create(name='Grace Fellowship', room_type='group', church='Grace Chapel')
+        self.town_room = ChatRoom.objects.create(name='Accra Growers', room_type='group', location='Accra')
+        self.channel = ChatRoom.objects.create(name='Announcements', room_type='channel')
+        self.joined = ChatRoom.objects.create(name='Joined', room_type='group', church='Grace Chapel')
+        self.joined.participants.add(self.user)
+        ChatRoom.objects.create(name='Elsewhere', room_type='group', church='Hope Church', location='Kumasi')
+        ChatRoom.objects.create(name='direct-1-2', room_type='personal', location='Accra')
+
+    def test_discovery_returns_compact_summaries(self):
+        """Test church/location matches minus joined and personal rooms, without participants"""
+        response = self.client.get('/api/chat-rooms/discovery/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([room['id'] for room in response.data], [self.town_room.id, self.church_room.id])
+        self.assertEqual(
+            set(response.data[0]), {'id', 'name', 'room_type', 'church', 'location'}
+        )
+
+    def test_profile_discovery_includes_channels(self):
+        """Test the profile payload adds public channels to church/location rooms"""
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(
+            [room['id'] for room in response.data['discovery']],
+            [self.channel.id, self.town_room.id, self.church_room.id]
+        )
+
+    def test_join_discovered_room(self):
+        """Test a discovered room can be joined and then drops out of discovery"""
+        response = self.client.post(f'/api/chat-rooms/{self.town_room.id}/join/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.town_room.participants.filter(id=self.user.id).exists())
+        response = self.client.get('/api/chat-rooms/discovery/')
+        self.assertEqual([room['id'] for room in response.data], [self.church_room.id])
+
+    def test_join_limited_to_discoverable_rooms(self):
+        """Test rooms outside the user's church and location cannot be joined by id"""
+        elsewhere = ChatRoom.objects.get(name='Elsewhere')
+        personal = ChatRoom.objects.get(name='direct-1-2')
+        for room in (elsewhere, personal):
+            response = self.client.post(f'/api/chat-rooms/{room.id}/join/')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+            self.assertFalse(room.participants.filter(id=self.user.id).exists())
+        response = self.client.post(f'/api/chat-rooms/{self.channel.id}/join/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_discovery_query_count_is_constant(self):
+        """Test discovery cost does not grow with candidate rooms or their participants"""
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/chat-rooms/discovery/')
+        for i in range(10):
+            room = ChatRoom.objects.create(name=f'Extra {i}', room_type='group', location='Accra')
+            room.participants.add(User.objects.create(username=f'extra{i}'))
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/chat-rooms/discovery/')
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(len(large), len(small))
+
+
+class ChatRoomParticipantsTestCase(APITestCase):
+    """Test suite for participant counts, previews and the participants sub-resource"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='host', password='password')
+        self.client.force_authenticate(user=self.user)
+        self.room = ChatRoom.objects.create(name='Market Day', room_type='channel')
+        self.members = [User.objects.create(username=f'member{i}', email=f'm{i}@example.com') for i in range(14)]
+        self.room.participants.add(self.user, *self.members)
+
+    def test_participant_count_tracks_membership(self):
+        """Test the count column follows adds and removes from either side"""
+        self.assertEqual(self.room.participant_count, 15)
+        self.room.participants.remove(self.members[0])
+        self.members[1].chat_rooms.remove(self.room)
+        self.members[2].chat_rooms.clear()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.participant_count, 12)
+        self.room.participants.clear()
+        self.assertEqual(self.room.participant_count, 0)
+
+    def test_room_payload_embeds_compact_preview(self):
+        """Test rooms carry a count and a bounded list of compact members"""
+        response = self.client.get(f'/api/chat-rooms/{self.room.id}/')
+        self.assertEqual(response.data['participant_count'], 15)
+        self.assertEqual(len(response.data['participants']), 10)
+        self.assertEqual(set(response.data['participants'][0]), {'id', 'email', 'first_name', 'last_name'})
+
+    def test_participants_are_paginated(self):
+        """Test the participants sub-resource walks every member with cursors"""
+        response = self.client.get(f'/api/chat-rooms/{self.room.id}/participants/?page_size=6')
+        seen = [member['id'] for member in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [member['id'] for member in response.data['results']]
+        self.assertEqual(seen, sorted([self.user.id] + [m.id for m in self.members]))
+
+    def test_participants_hidden_from_non_members(self):
+        """Test only members can list a room's participants"""
+        outsider = User.objects.create(username='outsider')
+        self.client.force_authenticate(user=outsider)
+        response = self.client.get(f'/api/chat-rooms/{self.room.id}/participants/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_sparse_fields_skip_unrendered_relations(self):
+        """Test ?fields= trims the payload and the queries behind dropped fields"""
+        with CaptureQueriesContext(connection) as full:
+            self.client.get('/api/chat-rooms/')
+        with CaptureQueriesContext(connection) as sparse:
+            response = self.client.get('/api/chat-rooms/?fields=id,name,participant_count')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'participant_count'})
+        self.assertEqual(len(sparse), len(full) - 1)
+
+
+class FieldShapingTestCase(APITestCase):
+    """Test suite for ?fields=, ?omit= and ?expand= on serializers and querysets"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create(username='grower', email='grower@example.com')
+        self.category = Category.objects.create(name='Produce')
+        self.products = [
+            Product.objects.create(
+                seller=self.seller, title=f'Crate {i}', slug=f'crate-{i}', description='Long story ' * 50,
+                category=self.category, price=5, quantity=10
+            )
+            for i in range(3)
+        ]
+
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, ' '.join(query['sql'] for query in queries.captured_queries)
+
+    def test_fields_prune_payload_and_columns(self):
+        """Test ?fields= drops unrendered columns and joins"""
+        response, sql = self._get('/api/products/?fields=id,title,price')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'price'})
+        self.assertNotIn('"api_product"."description"', sql)
+        self.assertNotIn('api_userprofile', sql)
+        self.assertNotIn('api_category', sql)
+
+    def test_omit_reaches_nested_serializers(self):
+        """Test dotted ?omit= names trim nested objects and their joins"""
+        response, sql = self._get('/api/products/?omit=description,seller.profile')
+        item = response.data['results'][0]
+        self.assertNotIn('description', item)
+        self.assertEqual(set(item['seller']), {'id', 'email', 'first_name', 'last_name'})
+        self.assertIn('category', item)
+        self.assertNotIn('api_userprofile', sql)
+        self.assertNotIn('"api_product"."description"', sql)
+
+    def test_dotted_fields_select_nested_subset(self):
+        """Test ?fields=seller.email keeps only that nested field"""
+        response, _ = self._get(f'/api/products/{self.products[0].id}/?fields=id,seller.email')
+        self.assertEqual(response.data, {'id': self.products[0].id, 'seller': {'email': 'grower@example.com'}})
+
+    def test_shaped_pages_keep_cursors(self):
+        """Test keyset pagination still walks pages when columns are deferred"""
+        response, _ = self._get('/api/products/?fields=id&page_size=2')
+        seen = [item['id'] for item in response.data['results']]
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data['next'])
+        seen += [item['id'] for item in response.data['results']]
+        self.assertEqual(seen, [p.id for p in reversed(self.products)])
+
+    def test_expand_nests_relation_without_extra_queries(self):
+        """Test ?expand=product embeds products with a constant number of queries"""
+        reviewer = User.objects.create(username='taster')
+        Review.objects.create(product=self.products[0], reviewer=reviewer, rating=5, title='Great', comment='Yum')
+        response = self.client.get('/api/reviews/')
+        self.assertEqual(response.data['results'][0]['product'], self.products[0].id)
+
+        with CaptureQueriesContext(connection) as one:
+            self.client.get('/api/reviews/?expand=product')
+        for product in self.products[1:]:
+            Review.objects.create(product=product, reviewer=reviewer, rating=4, title='Good', comment='Fine')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/api/reviews/?expand=product')
+        expanded = response.data['results'][0]['product']
+        self.assertEqual(expanded['seller']['email'], 'grower@example.com')
+        self.assertEqual(expanded['category']['name'], 'Produce')
+        self.assertEqual(len(many), len(one))
+
+    def test_writes_ignore_shaping(self):
+        """Test ?fields= on a write neither drops input nor output fields"""
+        self.client.force_authenticate(user=self.seller)
+        response = self.client.post('/api/products/?fields=id', {
+            'title': 'Honey', 'description': 'Raw', 'price': '8.00', 'category_id': self.category.id
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['description'], 'Raw')
+
+
+class FastJSONTestCase(APITestCase):
+    """Test suite for the orjson-backed renderer and parser"""
+
+    def test_renderer_matches_stdlib_output(self):
+        """Test Decimals, UUIDs, datetimes, lazy strings and int keys encode like DRF's encoder"""
+        data = {
+            'price': Decimal('12.50'),
+            'order': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'at': datetime(2026, 5, 1, 9, 30, tzinfo=dt_timezone.utc),
+            'on': date(2026, 5, 1),
+            'label': gettext_lazy('Produce'),
+            'by_id': {1: 'one'},
+            'text': 'Akwaaba — ɔdɔ',
+        }
+        fast = FastJSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+        self.assertIn(b'"2026-05-01T09:30:00Z"', fast)
+        self.assertTrue(fast.startswith(b'{"price":12.5,'))
+
+    def test_api_uses_fast_parser(self):
+        """Test JSON request bodies parse and malformed ones are a 400"""
+        user = User.objects.create(username='poster')
+        room = ChatRoom.objects.create(name='Room', room_type='group')
+        room.participants.add(user)
+        self.client.force_authenticate(user=user)
+        response = self.client.post(
+            '/api/messages/', json.dumps({'room': room.id, 'content': 'Ɛte sɛn?'}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['content'], 'Ɛte sɛn?')
+        response = self.client.post('/api/messages/', '{"room": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(JOBS_EAGER=True)
+class RatingCountersTestCase(APITestCase):
+    """Test suite for denormalized product and seller ratings"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create(username='grower')
+        self.seller.profile.role = 'tradesman'
+        self.seller.profile.save()
+        category = Category.objects.create(name='Produce')
+        self.kale, self.corn = [
+            Product.objects.create(
+                seller=self.seller, title=title, slug=title.lower(), description='Fresh',
+                category=category, price=5, quantity=10
+            )
+            for title in ('Kale', 'Corn')
+        ]
+        self.reviewers = [User.objects.create(username=f'taster{i}') for i in range(3)]
+
+    def _review(self, product, reviewer, rating):
+        return Review.objects.create(product=product, reviewer=reviewer, rating=rating, title='', comment='Ok')
+
+    def _assert_counters(self, product, total, count, rating):
+        product.refresh_from_db()
+        self.assertEqual((product.rating_total, product.reviews_count), (total, count))
+        self.assertAlmostEqual(product.rating, rating)
+
+    def test_create_update_delete(self):
+        """Test product and seller counters follow review writes"""
+        first = self._review(self.kale, self.reviewers[0], 5)
+        self._review(self.kale, self.reviewers[1], 2)
+        self._review(self.corn, self.reviewers[2], 4)
+        self._assert_counters(self.kale, 7, 2, 3.5)
+
+        first.rating = 3
+        first.save()
+        self._assert_counters(self.kale, 5, 2, 2.5)
+
+        first.product = self.corn
+        first.save()
+        self._assert_counters(self.kale, 2, 1, 2.0)
+        self._assert_counters(self.corn, 7, 2, 3.5)
+
+        first.delete()
+        self._assert_counters(self.corn, 4, 1, 4.0)
+        profile = UserProfile.objects.get(user=self.seller)
+        self.assertEqual((profile.seller_rating_total, profile.seller_reviews_count), (6, 2))
+        self.assertAlmostEqual(profile.seller_rating, 3.0)
+
+        Review.objects.filter(product=self.corn).get().delete()
+        self._assert_counters(self.corn, 0, 0, 0.0)
+
+    def test_stale_product_save_keeps_counters(self):
+        """Test saving a product loaded before a review does not overwrite its counters"""
+        stale = Product.objects.get(pk=self.kale.pk)
+        self._review(self.kale, self.reviewers[0], 4)
+        stale.price = 6
+        stale.save()
+        self._assert_counters(self.kale, 4, 1, 4.0)
+        profile = self.seller.profile  # cached before the review was written
+        profile.bio = 'Market gardener'
+        profile.save()
+        self.assertEqual(UserProfile.objects.get(user=self.seller).seller_reviews_count, 1)
+
+    def test_counters_not_editable_in_forms(self):
+        """Test model forms do not offer counters that a plain save would drop"""
+        from django.forms import modelform_factory
+
+        form_fields = modelform_factory(Product, fields='__all__').base_fields
+        self.assertFalse({'rating', 'rating_total', 'reviews_count'} & set(form_fields))
+
+    def test_review_api_updates_product(self):
+        """Test reviews posted over the API move the product rating"""
+        self.client.force_authenticate(user=self.reviewers[0])
+        response = self.client.post('/api/reviews/', {
+            'product': self.kale.id, 'rating': 4, 'title': 'Good', 'comment': 'Crisp'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(f'/api/products/{self.kale.id}/')
+        self.assertEqual((response.data['rating'], response.data['reviews_count']), (4.0, 1))
+
+    def test_seller_stats_read_column(self):
+        """Test the tradesman dashboard reads the seller rating column"""
+        self._review(self.kale, self.reviewers[0], 4)
+        self._review(self.corn, self.reviewers[1], 5)
+        # A fresh instance, as authentication loads for every request
+        self.client.force_authenticate(user=User.objects.get(pk=self.seller.pk))
+        response = self.client.get('/api/users/stats/')
+        self.assertAlmostEqual(response.data['stats']['rating_avg'], 4.5)
+
+    def test_reconcile_repairs_drift(self):
+        """Test the reconcile command recomputes drifted counters in bulk"""
+        self._review(self.kale, self.reviewers[0], 4)
+        self._review(self.kale, self.reviewers[1], 2)
+        Product.objects.filter(pk=self.kale.pk).update(rating_total=99, reviews_count=7, rating=1.0)
+        Product.objects.filter(pk=self.corn.pk).update(rating=4.8)
+        UserProfile.objects.filter(user=self.seller).update(seller_reviews_count=0)
+
+        out = StringIO()
+        call_command('reconcile_ratings', stdout=out)
+        self.assertIn('Corrected 2 products and 1 sellers', out.getvalue())
+        self._assert_counters(self.kale, 6, 2, 3.0)
+        self._assert_counters(self.corn, 0, 0, 0.0)
+        profile = UserProfile.objects.get(user=self.seller)
+        self.assertEqual((profile.seller_rating_total, profile.seller_reviews_count), (6, 2))
+
+        out = StringIO()
+        call_command('reconcile_ratings', stdout=out)
+        self.assertIn('Corrected 0 products and 0 sellers', out.getvalue())
+
+
+@override_settings(REQUEST_PROFILING=True)
+class ProfilingTestCase(APITestCase):
+    """Test suite for the request profiling middleware and report"""
+
+    def setUp(self):
+        patcher = mock.patch.object(profiling, '_store', profiling.LocalProfileStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller', password='password')
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        category = Category.objects.create(name='Produce')
+        for i in range(3):
+            Product.objects.create(
+                seller=self.seller, title=f'Item {i}', slug=f'item-{i}', description='Fresh',
+                category=category, price=5, quantity=10
+            )
+
+    def test_samples_tagged_by_action(self):
+        """Test samples are grouped by ViewSet action and carry query counts"""
+        for _ in range(4):
+            self.client.get('/api/products/')
+        product = Product.objects.first()
+        self.client.get(f'/api/products/{product.id}/')
+        self.client.get('/api/does-not-exist/')
+
+        report = profiling.profiling_report()
+        self.assertEqual(report['ProductViewSet.list']['requests'], 4)
+        self.assertEqual(report['ProductViewSet.retrieve']['requests'], 1)
+        self.assertIn('GET unresolved', report)
+        listing = report['ProductViewSet.list']
+        self.assertGreater(listing['queries']['p50'], 0)
+        self.assertLessEqual(listing['wall_ms']['p50'], listing['wall_ms']['p99'])
+        self.assertEqual(set(listing['wall_ms']), {'p50', 'p95', 'p99', 'max'})
+
+    def test_duplicate_queries_detected(self):
+        """Test the recorder counts statements repeated with identical parameters"""
+        recorder = profiling.QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for _ in range(3):
+                list(Product.objects.filter(slug='item-1'))
+            list(Product.objects.filter(slug='item-2'))
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(recorder.duplicates(), 2)
+        self.assertIn('api_product', recorder.most_repeated())
+
+    def test_percentiles(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(profiling.percentile(values, 50), 50)
+        self.assertEqual(profiling.percentile(values, 95), 95)
+        self.assertEqual(profiling.percentile(values, 99), 99)
+        self.assertEqual(profiling.percentile([7], 99), 7)
+        self.assertIsNone(profiling.percentile([], 50))
+
+    def test_report_endpoint_and_command(self):
+        """Test the report is staff-only, printable and resettable"""
+        self.client.get('/api/products/')
+        self.assertEqual(self.client.get('/api/profiling/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get('/api/profiling/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('ProductViewSet.list', response.data)
+
+        out = StringIO()
+        call_command('profiling_report', '--reset', stdout=out)
+        self.assertIn('ProductViewSet.list', out.getvalue())
+        self.assertEqual(profiling.profiling_report(), {})
+
+        self.client.get('/api/products/')
+        self.assertEqual(self.client.delete('/api/profiling/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertNotIn('ProductViewSet.list', profiling.profiling_report())
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_disabled_by_default(self):
+        """Test nothing is recorded while profiling is off"""
+        self.client.get('/api/products/')
+        self.assertEqual(profiling.profiling_report(), {})
+
+
+class MetricsTestCase(APITestCase):
+    """Test suite for the Prometheus metrics registry and endpoint"""
+
+    def test_histogram_exposition(self):
+        """Test histogram buckets are cumulative and labels are escaped"""
+        histogram = metrics.Histogram('test_seconds', 'Test histogram', ('path',), buckets=(0.1, 1))
+        histogram.observe(0.05, path='a"b')
+        histogram.observe(0.5, path='a"b')
+        histogram.observe(5, path='a"b')
+        lines = histogram.render()
+        self.assertIn('# TYPE harvestconnect_test_seconds histogram', lines)
+        self.assertIn('harvestconnect_test_seconds_bucket{path="a\\"b",le="0.1"} 1', lines)
+        self.assertIn('harvestconnect_test_seconds_bucket{path="a\\"b",le="1.0"} 2', lines)
+        self.assertIn('harvestconnect_test_seconds_bucket{path="a\\"b",le="+Inf"} 3', lines)
+        self.assertIn('harvestconnect_test_seconds_count{path="a\\"b"} 3', lines)
+        self.assertIn('harvestconnect_test_seconds_sum{path="a\\"b"} 5.55', lines)
+        with self.assertRaises(ValueError):
+            histogram.observe(1, other='x')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_endpoint_reports_requests_and_cache(self):
+        """Test /metrics exposes request counts, latency, cache and database series"""
+        reset_response_cache_stats()
+        self.client.get('/api/categories/')
+        self.client.get('/api/categories/')
+        self.client.force_login(User.objects.create_user(username='ops', password='password', is_staff=True))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertRegex(
+            body, r'harvestconnect_http_requests_total\{route="CategoryViewSet.list",method="GET",status="200"\} \d+'
+        )
+        self.assertIn('harvestconnect_http_request_duration_seconds_bucket{route="CategoryViewSet.list",le="+Inf"}', body)
+        self.assertIn('harvestconnect_response_cache_hit_ratio{viewset="category"} 0.5', body)
+        self.assertIn('# TYPE harvestconnect_response_cache_lookups_total counter', body)
+        self.assertRegex(body, r'harvestconnect_response_cache_lookups_total\{viewset="category",outcome="hits"\} [1-9]')
+        self.assertIn('harvestconnect_db_connections_open{alias="default"}', body)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_endpoint_token(self):
+        """Test a configured token is required to scrape"""
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN='', CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_endpoint_closed_without_token(self):
+        """Test /metrics is not public when no token is configured"""
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(
+            self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        self.client.force_login(User.objects.create_user(username='grower', password='password'))
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class BulkSeedTestCase(TestCase):
+    """Test suite for seed_db --bulk"""
+
+    def test_bulk_seed_creates_consistent_rows(self):
+        """Test bulk seeding writes profiles, lines, counters and rollups without signals"""
+        out = StringIO()
+        call_command(
+            'seed_db', '--bulk', '--users', '12', '--categories', '3', '--products', '30', '--posts', '5',
+            '--reviews', '60', '--orders', '8', '--artists', '2', '--batch-size', '7', '--seed', '1', stdout=out
+        )
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(User.objects.count(), 12)
+        self.assertEqual(UserProfile.objects.count(), 12)
+        self.assertFalse(UserProfile.objects.filter(latitude__isnull=False, geohash='').exists())
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual((Product.objects.count(), BlogPost.objects.count()), (30, 5))
+        self.assertEqual((Review.objects.count(), Artist.objects.count()), (60, 2))
+        self.assertEqual(Order.objects.count(), 8)
+
+        # Each order's lines match its JSON snapshot and total
+        for order in Order.objects.prefetch_related('items'):
+            self.assertEqual(order.items.count(), len(order.products))
+            self.assertEqual(sum(i.unit_price * i.quantity for i in order.items.all()), order.total_amount)
+        # Counters and rollups were rebuilt after bypassing the signals
+        self.assertEqual(Product.reconcile_ratings(), (0, 0))
+        self.assertEqual(Product.objects.aggregate(n=models.Sum('reviews_count'))['n'], 60)
+        self.assertEqual(
+            DailySalesRollup.objects.orders().aggregate(n=models.Sum('order_count'))['n'],
+            Order.objects.exclude(status='cancelled').count() or None
+        )
+        self.assertTrue(User.objects.first().check_password('harvest123'))
+
+    def test_scale_preset_is_overridable(self):
+        """Test explicit counts take precedence over the --scale preset"""
+        call_command(
+            'seed_db', '--scale', '1k', '--users', '3', '--categories', '1', '--products', '4', '--posts', '0',
+            '--reviews', '5', '--orders', '0', '--artists', '0', stdout=StringIO()
+        )
+        self.assertEqual((User.objects.count(), Product.objects.count(), Review.objects.count()), (3, 4, 5))
+
+
+class ProfileWritesTestCase(APITestCase):
+    """Test UserProfile rows are written only when profile fields change"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ama@example.com', email='ama@example.com', password='pass')
+
+    def _profile_writes(self, queries):
+        return [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith(('INSERT', 'UPDATE')) and '"api_userprofile"' in q['sql']
+        ]
+
+    def test_user_creation_creates_one_profile(self):
+        """Test the User signal is the single creation path and caches the profile"""
+        with CaptureQueriesContext(connection) as queries:
+            user = User.objects.create_user(username='kofi@example.com', email='kofi@example.com')
+        self.assertEqual(len(self._profile_writes(queries)), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.profile.role, 'buyer')
+
+    def test_login_does_not_write_profile(self):
+        """Test updating last_login leaves the profile row alone"""
+        from django.contrib.auth.models import update_last_login
+        user = User.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            update_last_login(None, user)
+            user.save()
+        self.assertEqual(self._profile_writes(queries), [])
+
+    def test_unchanged_profile_save_skips_query(self):
+        """Test saving a loaded profile without changes issues no SQL"""
+        profile = UserProfile.objects.get(user=self.user)
+        profile.role = 'buyer'
+        with self.assertNumQueries(0):
+            profile.save()
+
+    def test_only_changed_columns_are_written(self):
+        """Test a save updates just the changed fields and updated_at"""
+        profile = UserProfile.objects.get(user=self.user)
+        profile.bio = 'Grower in Accra'
+        with CaptureQueriesContext(connection) as queries:
+            profile.save()
+        [sql] = self._profile_writes(queries)
+        self.assertIn('"bio"', sql)
+        self.assertIn('"updated_at"', sql)
+        self.assertNotIn('"role"', sql)
+        with self.assertNumQueries(0):
+            profile.save()
+
+    def test_location_change_writes_geohash(self):
+        """Test moving a profile rewrites its geohash"""
+        profile = UserProfile.objects.get(user=self.user)
+        profile.latitude, profile.longitude = 5.6037, -0.187
+        profile.save()
+        self.assertEqual(
+            UserProfile.objects.get(pk=profile.pk).geohash, encode_geohash(5.6037, -0.187)
+        )
+
+    def test_file_save_after_field_save_is_written(self):
+        """Test saving a new avatar after another save still writes the file name"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        profile = UserProfile.objects.get(user=self.user)
+        profile.bio = 'Grower in Accra'
+        profile.save()
+        with override_settings(MEDIA_ROOT=media_root):
+            profile.avatar.save('a.txt', ContentFile(b'avatar'))
+        self.assertEqual(UserProfile.objects.get(pk=profile.pk).avatar.name, profile.avatar.name)
+        self.assertTrue(profile.avatar.name.startswith('avatars/'))
+
+    def test_save_after_refresh_writes_reverted_value(self):
+        """Test refresh_from_db resets the snapshot so reverting a queryset update is saved"""
+        profile = UserProfile.objects.get(user=self.user)
+        UserProfile.objects.filter(pk=profile.pk).update(role='seller')
+        profile.refresh_from_db()
+        profile.role = 'buyer'
+        profile.save()
+        self.assertEqual(UserProfile.objects.get(pk=profile.pk).role, 'buyer')
+
+    def test_explicit_update_fields_always_written(self):
+        """Test a save naming update_fields is never skipped as unchanged"""
+        profile = UserProfile.objects.get(user=self.user)
+        UserProfile.objects.filter(pk=profile.pk).update(role='seller')
+        profile.save(update_fields=['role'])
+        self.assertEqual(UserProfile.objects.get(pk=profile.pk).role, 'buyer')
+
+    def test_me_patch_without_changes_skips_writes(self):
+        """Test PATCH /api/users/me/ with current values writes nothing"""
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch('/api/users/me/', {'role': 'buyer'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))])
+
+    def test_benchmark_command_reports_flows(self):
+        """Test benchmark_profile_writes prints counts for each flow"""
+        out = StringIO()
+        call_command('benchmark_profile_writes', '--repeat', '1', stdout=out)
+        for flow in ('registration', 'login', 'profile update', 'profile no-op'):
+            self.assertIn(flow, out.getvalue())
+        self.assertEqual(User.objects.count(), 1)
+
+
+class ProfileAuthenticationTestCase(APITestCase):
+    """Test JWT authentication resolves the profile alongside the user"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='yaw@example.com', email='yaw@example.com', password='pass')
+        UserProfile.objects.filter(user=self.user).update(
+            role='tradesman', home_church='Grace Chapel', location='Kumasi'
+        )
+        self.user = User.objects.get(pk=self.user.pk)
+
+    def _authorize(self, user=None):
+        token = ProfileTokenObtainPairSerializer.get_token(user or self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+        return token
+
+    def test_token_carries_profile_claims(self):
+        """Test issued tokens include role, home church and location"""
+        access = self._authorize().access_token
+        self.assertEqual(
+            (access['role'], access['home_church'], access['location']),
+            ('tradesman', 'Grace Chapel', 'Kumasi')
+        )
+
+    def test_profile_loaded_with_user(self):
+        """Test role branching reuses the profile joined into the authentication query"""
+        self._authorize()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['role'], 'tradesman')
+        self.assertIn('"api_userprofile"', queries.captured_queries[0]['sql'])
+        self.assertFalse([
+            q for q in queries.captured_queries[1:] if 'FROM "api_userprofile"' in q['sql']
+        ])
+
+    def test_projects_and_discovery_skip_profile_queries(self):
+        """Test project listing and room discovery read the authenticated profile"""
+        self._authorize()
+        for url in ('/api/projects/', '/api/chat-rooms/discovery/'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            self.assertFalse([
+                q for q in queries.captured_queries[1:] if 'FROM "api_userprofile"' in q['sql']
+            ], url)
+
+    def test_missing_profile_is_created(self):
+        """Test users without a profile row still authenticate and get one"""
+        self._authorize()
+        UserProfile.objects.filter(user=self.user).delete()
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+
+    def test_inactive_user_rejected(self):
+        """Test tokens for deactivated users are refused"""
+        self._authorize()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.get('/api/users/stats/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(JWT_STATELESS_AUTH=True)
+class StatelessJWTTestCase(APITestCase):
+    """Test stateless access token validation with a lazily loaded user"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='esi@example.com', email='esi@example.com', password='pass')
+        UserProfile.objects.filter(user=self.user).update(role='tradesman', home_church='Grace Chapel')
+        self.refresh = ProfileTokenObtainPairSerializer.get_token(User.objects.get(pk=self.user.pk))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def _user_queries(self, queries):
+        return [q for q in queries.captured_queries if 'FROM "auth_user"' in q['sql']]
+
+    def test_discovery_reads_claims(self):
+        """Test room discovery never reads the user row"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/chat-rooms/discovery/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._user_queries(queries), [])
+        self.assertFalse([q for q in queries.captured_queries if 'FROM "api_userprofile"' in q['sql']])
+
+    def test_role_read_from_profile(self):
+        """Test a role change applies to requests made with an existing token"""
+        self.assertEqual(self.client.get('/api/users/stats/').data['role'], 'tradesman')
+        response = self.client.patch('/api/users/me/', {'role': 'buyer'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/users/stats/').data['role'], 'buyer')
+
+    def test_owner_can_edit_own_content(self):
+        """Test ownership checks match the token user against integer foreign keys"""
+        category = Category.objects.create(name='Produce')
+        product = Product.objects.create(
+            seller=self.user, title='Yams', description='Fresh', category=category,
+            price=5, quantity=3, status='active'
+        )
+        post = BlogPost.objects.create(
+            title='Harvest Notes', slug='harvest-notes', excerpt='Notes', content='Body',
+            category='farming', author=self.user
+        )
+        response = self.client.patch(f'/api/products/{product.id}/', {'title': 'Red yams'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        response = self.client.patch(f'/api/blog-posts/{post.id}/', {'title': 'Field Notes'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
+    def test_other_users_content_still_forbidden(self):
+        """Test the coerced token user id does not match other owners"""
+        other = User.objects.create_user(username='kwame@example.com', email='kwame@example.com')
+        post = BlogPost.objects.create(
+            title='Other Notes', slug='other-notes', excerpt='Notes', content='Body',
+            category='farming', author=other
+        )
+        response = self.client.patch(f'/api/blog-posts/{post.id}/', {'title': 'Mine now'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_model_fields_load_once(self):
+        """Test the first field access loads the user and profile in one query"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], 'esi@example.com')
+        [query] = self._user_queries(queries)
+        self.assertIn('"api_userprofile"', query['sql'])
+
+    def test_writes_use_lazy_user(self):
+        """Test the lazy user can be assigned to foreign keys"""
+        response = self.client.post('/api/projects/', {
+            'title': 'Barn roof', 'description': 'Replace shingles'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(Project.objects.get().tradesman, self.user)
+
+    def test_inactive_user_rejected_on_load(self):
+        """Test deactivated users are refused once a view needs their row"""
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/chat-rooms/discovery/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_refresh_updates_claims(self):
+        """Test refreshing the access token picks up profile changes"""
+        UserProfile.objects.filter(user=self.user).update(role='buyer')
+        response = self.client.post('/api/auth/token/refresh/', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        self.assertEqual(self.client.get('/api/users/stats/').data['role'], 'buyer')
+
+    def test_benchmark_command_compares_modes(self):
+        """Test benchmark_auth reports both modes"""
+        out = StringIO()
+        call_command('benchmark_auth', '--requests', '2', '--paths', '/api/projects/', stdout=out)
+        self.assertIn('database', out.getvalue())
+        self.assertIn('stateless', out.getvalue())
+
+
+@override_settings(JOBS_EAGER=True)
+class ImageDerivativesTestCase(APITestCase):
+    """Test thumbnail and responsive-width derivatives for uploaded images"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.seller = User.objects.create_user(username='abena@example.com', email='abena@example.com')
+        self.category = Category.objects.create(name='Produce', slug='produce')
+
+    def _image_file(self, name, size=(2000, 1000), mode='RGB'):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new(mode, size, (40, 120, 60, 200) if mode == 'RGBA' else (40, 120, 60)).save(buffer, 'PNG')
+        return ContentFile(buffer.getvalue(), name=name)
+
+    def _product(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(
+                seller=self.seller, category=self.category, title='Kale', description='Curly', price=4,
+                image=kwargs.pop('image', self._image_file('kale.png')), **kwargs
+            )
+
+    def test_upload_builds_variants(self):
+        """Test saving a new image records a thumbnail and each smaller width in both formats"""
+        product = Product.objects.get(pk=self._product().pk)
+        entry = product.image_derivatives['image']
+        self.assertEqual(entry['source'], product.image.name)
+        self.assertEqual((entry['width'], entry['height']), (2000, 1000))
+        self.assertEqual((entry['thumbnail']['width'], entry['thumbnail']['height']), (320, 320))
+        self.assertEqual([v['width'] for v in entry['widths']], [480, 960, 1600])
+        self.assertEqual(entry['widths'][0]['height'], 240)
+        from PIL import Image
+        with default_storage.open(entry['widths'][1]['webp']) as handle:
+            self.assertEqual(Image.open(handle).format, 'WEBP')
+        with default_storage.open(entry['thumbnail']['jpeg']) as handle:
+            self.assertEqual(Image.open(handle).format, 'JPEG')
+
+    def test_small_images_are_not_upscaled(self):
+        """Test an image narrower than every width gets a single same-size copy"""
+        product = Product.objects.get(pk=self._product(image=self._image_file('pea.png', (300, 200), 'RGBA')).pk)
+        widths = product.image_derivatives['image']['widths']
+        self.assertEqual([(v['width'], v['height']) for v in widths], [(300, 200)])
+
+    def test_serializer_exposes_srcset(self):
+        """Test the API returns thumbnail URLs and a srcset per format"""
+        product = self._product()
+        response = self.client.get(f'/api/products/{product.id}/')
+        srcset = response.data['image_srcset']
+        self.assertTrue(srcset['thumbnail']['webp'].endswith('/thumb.webp'))
+        self.assertEqual(srcset['webp'].count('w, '), 2)
+        self.assertTrue(srcset['jpeg'].endswith('/w1600.jpg 1600w'))
+
+    def test_stale_manifest_is_hidden(self):
+        """Test a manifest for a previous file is not served for the current one"""
+        product = Product.objects.get(pk=self._product().pk)
+        product.image.name = 'products/other.png'
+        self.assertIsNone(ProductSerializer(product).data['image_srcset'])
+
+    def test_replacing_image_removes_old_derivatives(self):
+        """Test a new upload rebuilds the manifest and deletes the previous files"""
+        product = Product.objects.get(pk=self._product().pk)
+        old_files = images._entry_files(product.image_derivatives['image'])
+        product.image = self._image_file('chard.png', (800, 600))
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.image_derivatives['image']['source'], product.image.name)
+        self.assertFalse(any(default_storage.exists(name) for name in old_files))
+
+    def test_image_lists_and_remote_urls(self):
+        """Test stored names in list fields get entries while remote URLs are skipped"""
+        stored = default_storage.save('products/extra.png', self._image_file('extra.png', (600, 400)))
+        product = self._product(images=[stored, 'https://example.com/remote.jpg'])
+        response = self.client.get(f'/api/products/{product.id}/')
+        extra, remote = response.data['images_srcset']
+        self.assertIn('480w', extra['webp'])
+        self.assertIsNone(remote)
+
+    def test_unreadable_image_is_recorded(self):
+        """Test a file Pillow cannot open is noted once instead of failing the save"""
+        broken = ContentFile(b'not an image', name='broken.png')
+        product = Product.objects.get(pk=self._product(image=broken).pk)
+        self.assertIn('error', product.image_derivatives['image'])
+        self.assertEqual(images.stale_fields(product), [])
+        self.assertIsNone(ProductSerializer(product).data['image_srcset'])
+
+    def test_plain_save_keeps_manifest(self):
+        """Test saving an instance loaded before the build does not erase the manifest"""
+        product = self._product()
+        product.price = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertIn('image', Product.objects.get(pk=product.pk).image_derivatives)
+
+    def test_backfill_command(self):
+        """Test build_image_derivatives fills manifests for rows saved without them"""
+        product = self._product()
+        Product.objects.filter(pk=product.pk).update(image_derivatives={})
+        out = StringIO()
+        call_command('build_image_derivatives', '--models', 'product', '--workers', '1', stdout=out)
+        self.assertIn('1 of 1 rows updated', out.getvalue())
+        self.assertIn('image', Product.objects.get(pk=product.pk).image_derivatives)
+
+
+@override_settings(JOB_RETRY_DELAY=0)
+class JobQueueTestCase(APITestCase):
+    """Test the background job queue and the work handed to it"""
+
+    def setUp(self):
+        self.queue = jobs.LocalJobQueue()
+        patcher = mock.patch.object(jobs, '_queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.seller = User.objects.create_user(username='kwame@example.com', email='kwame@example.com')
+        self.buyer = User.objects.create_user(username='efua@example.com', email='efua@example.com')
+        self.product = Product.objects.create(
+            seller=self.seller, title='Yams', slug='yams', description='Fresh', price=4, quantity=10,
+            category=Category.objects.create(name='Produce'),
+        )
+
+    def test_review_counters_update_without_jobs(self):
+        """Test review writes apply counter deltas in the request and queue nothing"""
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(product=self.product, reviewer=self.buyer, rating=4, comment='Good')
+            review.rating = 2
+            review.save()
+        self.assertEqual(self.queue.stats()['ready'], 0)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_total, self.product.reviews_count, self.product.rating), (2, 1, 2.0))
+        self.assertEqual(UserProfile.objects.get(user=self.seller).seller_rating_total, 2)
+
+    def test_order_rollup_updates_without_jobs(self):
+        """Test order writes apply rollup deltas in the request and queue nothing"""
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(
+                order_id='HC-J1', buyer=self.buyer, total_amount=12, status='pending', shipping_address='1 Farm Lane',
+                products=[{'id': self.product.id, 'title': 'Yams', 'price': 4, 'quantity': 3}],
+            )
+        self.assertEqual(self.queue.stats()['ready'], 0)
+        self.assertEqual(DailySalesRollup.objects.orders().get().revenue, 12)
+        self.assertEqual(DailySalesRollup.objects.lines().get().seller_id, self.seller.id)
+
+        order.delete()
+        self.assertEqual(DailySalesRollup.objects.orders().aggregate(total=models.Sum('revenue'))['total'], 0)
+
+    def test_reconcile_commands_queue_repair_jobs(self):
+        """Test --queue hands the full recomputes to the workers, which repair drift"""
+        Review.objects.create(product=self.product, reviewer=self.buyer, rating=4, comment='Good')
+        Product.objects.filter(pk=self.product.pk).update(reviews_count=7)
+        DailySalesRollup.objects.create(date=date(2024, 1, 1), revenue=99, order_count=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_ratings', '--queue', stdout=StringIO())
+            call_command('rebuild_sales_rollup', '--queue', stdout=StringIO())
+        self.assertEqual(self.queue.stats()['ready'], 2)
+        self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).reviews_count, 1)
+        self.assertFalse(DailySalesRollup.objects.exists())
+
+    def test_failed_job_retries_then_moves_to_failed_list(self):
+        """Test failures are retried up to max_attempts and then kept in the failed list"""
+        calls = []
+
+        def flaky(fail_times):
+            calls.append(fail_times)
+            if len(calls) <= fail_times:
+                raise RuntimeError('mail server down')
+
+        with mock.patch.dict(jobs._registry, {'test.flaky': jobs.JobType(flaky, 3)}):
+            with self.captureOnCommitCallbacks(execute=True):
+                jobs.enqueue('test.flaky', 2)
+            jobs.run_pending()
+            self.assertEqual(len(calls), 3)
+            self.assertEqual(self.queue.stats(), {'ready': 0, 'delayed': 0, 'failed': 0})
+
+            calls.clear()
+            with self.captureOnCommitCallbacks(execute=True):
+                jobs.enqueue('test.flaky', 5)
+            jobs.run_pending()
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.queue.stats()['failed'], 1)
+        failed = json.loads(self.queue.failed[0])
+        self.assertEqual((failed['attempts'], failed['error']), (3, 'RuntimeError: mail server down'))
+
+    @override_settings(JOB_RETRY_DELAY=5, JOB_RETRY_MAX_DELAY=60)
+    def test_retry_delay_backs_off(self):
+        """Test retry delays double per attempt up to the maximum"""
+        self.assertTrue(5 <= jobs.retry_delay(1) <= 6)
+        self.assertTrue(20 <= jobs.retry_delay(3) <= 24)
+        self.assertTrue(60 <= jobs.retry_delay(10) <= 72)
+
+    def test_unavailable_queue_runs_job_inline(self):
+        """Test jobs run inline after the commit when the queue cannot be reached"""
+        Product.objects.filter(pk=self.product.pk).update(reviews_count=3)
+        broken = mock.Mock(**{'push.side_effect': ConnectionError('redis down')})
+        with mock.patch.object(jobs, '_queue', broken), self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue('ratings.recompute', [self.product.pk], [self.seller.pk])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_count, 0)
+
+    def test_jobs_run_inline_without_live_workers(self):
+        """Test jobs are not queued while no worker has sent a heartbeat"""
+        Product.objects.filter(pk=self.product.pk).update(reviews_count=3)
+        idle = mock.Mock(**{'has_workers.return_value': False})
+        with mock.patch.object(jobs, '_queue', idle), self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue('ratings.recompute', [self.product.pk], [self.seller.pk])
+        idle.push.assert_not_called()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_count, 0)
+
+    @override_settings(
+        EMAIL_BACKEND='api.mail.QueuedEmailBackend',
+        EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    )
+    def test_email_is_sent_by_worker(self):
+        """Test queued mail keeps its HTML part and attachments and is delivered by the worker"""
+        from django.core import mail
+
+        message = mail.EmailMultiAlternatives('Welcome', 'Hello', 'hello@example.com', ['efua@example.com'])
+        message.attach_alternative('<p>Hello</p>', 'text/html')
+        message.attach('receipt.pdf', b'%PDF-1.4 \x00\xff', 'application/pdf')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(message.send(), 1)
+        self.assertEqual(mail.outbox, [])
+
+        jobs.run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        sent = mail.outbox[0]
+        self.assertEqual((sent.subject, sent.to), ('Welcome', ['efua@example.com']))
+        self.assertEqual(sent.alternatives, [('<p>Hello</p>', 'text/html')])
+        self.assertEqual(sent.attachments, [('receipt.pdf', b'%PDF-1.4 \x00\xff', 'application/pdf')])
+
+    def test_run_workers_requires_redis(self):
+        """Test run_workers refuses to start on the in-process queue"""
+        from django.core.management.base import CommandError
+
+        with self.assertRaises(CommandError):
+            call_command('run_workers', '--burst', stdout=StringIO())
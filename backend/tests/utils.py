@@ -0,0 +1,38 @@
+"""
+Shared helpers for the HarvestConnect API test suite
+"""
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountAssertionsMixin:
+    """Assertions guarding list endpoints against N+1 query regressions"""
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url, make_row, small=1, large=10, params=None):
+        """
+        Assert url costs the same number of queries with `small` and `large` rows.
+
+        `make_row(i)` must create one more row that the endpoint will list.
+        """
+        for i in range(small):
+            make_row(i)
+        baseline = self.count_queries(url, params)
+
+        for i in range(small, large):
+            make_row(i)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url, params or {})
+        self.assertEqual(
+            len(ctx.captured_queries), baseline,
+            f"{url} issued {len(ctx.captured_queries)} queries for {large} rows "
+            f"but {baseline} for {small}:\n"
+            + '\n'.join(q['sql'] for q in ctx.captured_queries)
+        )
+        return baseline
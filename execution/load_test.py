@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+"""
+Script Name: load_test.py
+Purpose: Drive concurrent REST, GraphQL and WebSocket traffic against a running
+         HarvestConnect backend and report throughput and latency percentiles
+Inputs: A running backend (ideally seeded with `manage.py seed_db --scale 1k --seed 1`)
+Outputs: JSON report of requests/second and p50/p95/p99 latency per scenario
+
+Usage:
+    python execution/load_test.py --duration 60 --concurrency 16 --output load-report.json
+    python execution/load_test.py --requests 200 --seed 7 --compare load-report.json
+    python execution/load_test.py --prepare 1k   # seed the local database first
+
+Environment Variables:
+    BACKEND_URL: Backend base URL (default: http://localhost:8000)
+    LOAD_TEST_PASSWORD: Password for the load test accounts (default: Sheaves&Barley-2024)
+
+Every worker thread runs its own seeded random sequence, so the same --seed,
+--concurrency and --requests replay the same traffic mix against the same
+data. Reports carry the git commit they were taken on; pass an older report
+to --compare to print the change per scenario.
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import socket
+import ssl
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode, urlparse
+
+import requests
+
+# Try to load dotenv if available
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = REPO_ROOT / "backend"
+PERCENTILES = (50, 95, 99)
+
+# Relative frequency of each scenario in the traffic mix
+SCENARIO_WEIGHTS = {
+    "browse": 30,
+    "product_detail": 15,
+    "search": 15,
+    "checkout": 10,
+    "stats": 10,
+    "graphql_analytics": 10,
+    "chat": 10,
+}
+
+# Share of browse requests that pick a sort order (page-number pagination) rather than the default (keyset)
+BROWSE_SORTED_SHARE = 0.25
+
+# Accounts are created once (or reused) with these roles so `stats` exercises every dashboard
+ACCOUNT_ROLES = ("buyer", "farmer", "tradesman", "artisan")
+
+SEARCH_FALLBACK_TERMS = ("fresh", "organic", "honey", "bread", "garden", "wood", "farm", "apple")
+
+ANALYTICS_QUERY = (
+    "{ analytics { totalSales totalOrders averageOrderValue salesByCategory "
+    "monthlyRevenue salesByChurch salesByLocation } }"
+)
+
+CHAT_MESSAGES_PER_SESSION = 5
+
+
+class WebSocketClient:
+    """Minimal blocking RFC 6455 client for JSON text frames"""
+
+    def __init__(self, url, origin, timeout=10.0):
+        parsed = urlparse(url)
+        secure = parsed.scheme == "wss"
+        port = parsed.port or (443 if secure else 80)
+        sock = socket.create_connection((parsed.hostname, port), timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parsed.hostname)
+        self.sock = sock
+        self.buffer = b""
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        handshake = (
+            f"GET {parsed.path or '/'}{'?' + parsed.query if parsed.query else ''} HTTP/1.1\r\n"
+            f"Host: {parsed.hostname}:{port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+            f"Origin: {origin}\r\n\r\n"
+        )
+        self.sock.sendall(handshake.encode())
+        while b"\r\n\r\n" not in self.buffer:
+            self._fill()
+        head, self.buffer = self.buffer.split(b"\r\n\r\n", 1)
+        status_line = head.split(b"\r\n", 1)[0].decode(errors="replace")
+        if " 101 " not in f"{status_line} ":
+            self.sock.close()
+            raise ConnectionError(f"WebSocket handshake failed: {status_line}")
+
+    def _fill(self):
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("WebSocket closed by server")
+        self.buffer += chunk
+
+    def _read(self, size):
+        while len(self.buffer) < size:
+            self._fill()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def _send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([0x80 | length])
+        elif length < 1 << 16:
+            header += bytes([0x80 | 126]) + struct.pack("!H", length)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack("!Q", length)
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.sock.sendall(header + mask + masked)
+
+    def send_json(self, data):
+        self._send_frame(0x1, json.dumps(data).encode())
+
+    def recv_json(self):
+        while True:
+            first, second = self._read(2)
+            opcode, length = first & 0x0F, second & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", self._read(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", self._read(8))[0]
+            mask = self._read(4) if second & 0x80 else None
+            payload = self._read(length)
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            if opcode == 0x1:
+                return json.loads(payload)
+            if opcode == 0x8:
+                raise ConnectionError("WebSocket closed by server")
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+
+    def close(self):
+        try:
+            self._send_frame(0x8, struct.pack("!H", 1000))
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class Recorder:
+    """Thread-safe latency samples and error counts per metric"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = defaultdict(list)
+
+    def record(self, name, seconds, ok=True, detail=None):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+                if detail and len(self.error_samples[name]) < 3:
+                    self.error_samples[name].append(detail)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of already sorted values"""
+    if not values:
+        return None
+    rank = max(-(-pct * len(values) // 100), 1)
+    return values[int(rank) - 1]
+
+
+class LoadTest:
+    def __init__(self, base_url, concurrency, seed, password, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.seed = seed
+        self.password = password
+        self.timeout = timeout
+        self.recorder = Recorder()
+        self.accounts = []
+        self.products = []
+        self.search_terms = list(SEARCH_FALLBACK_TERMS)
+        self.room_id = None
+
+    # ----- setup -------------------------------------------------------
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def authenticate(self, session, index, role):
+        """Log in as loadtest account `index`, registering it on first use"""
+        email = f"loadtest-{index}@example.com"
+        response = session.post(
+            self.url("/api/auth/login/"), json={"email": email, "password": self.password}, timeout=self.timeout
+        )
+        if response.status_code != 200:
+            response = session.post(self.url("/api/auth/registration/"), json={
+                "email": email, "password1": self.password, "password2": self.password,
+                "first_name": "Load", "last_name": f"Tester {index}", "role": role,
+            }, timeout=self.timeout)
+            if response.status_code not in (200, 201):
+                raise RuntimeError(f"Could not register {email}: {response.status_code} {response.text[:200]}")
+        data = response.json()
+        token = data.get("access") or data.get("access_token") or data.get("key")
+        user = data.get("user") or {}
+        return {"email": email, "token": token, "user_id": user.get("pk") or user.get("id"), "role": role}
+
+    def setup(self):
+        """Create accounts, sample the catalog and open a chat room; all outside the measured window"""
+        for index in range(self.concurrency):
+            role = ACCOUNT_ROLES[index % len(ACCOUNT_ROLES)]
+            # Fresh session per account: login cookies would turn on CSRF checks for the next one
+            self.accounts.append(self.authenticate(requests.Session(), index, role))
+
+        session = requests.Session()
+
+        response = session.get(self.url("/api/products/"), params={"page_size": 100}, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        self.products = [
+            {"id": p["id"], "title": p["title"], "price": float(p["price"])}
+            for p in (data.get("results", data) if isinstance(data, dict) else data)
+        ]
+        self.products.sort(key=lambda p: p["id"])
+        words = sorted({
+            word.lower() for p in self.products for word in p["title"].split() if len(word) > 3 and word.isalpha()
+        })
+        if words:
+            self.search_terms = words[:50]
+
+        owner = self.accounts[0]
+        # A public channel, since chat sockets only open for rooms the account is in or may join
+        response = session.post(
+            self.url("/api/chat-rooms/"), json={"name": "Load test room", "room_type": "channel"},
+            headers=self.auth_headers(owner), timeout=self.timeout
+        )
+        if response.status_code in (200, 201):
+            self.room_id = response.json()["id"]
+            for account in self.accounts[1:]:
+                session.post(
+                    self.url(f"/api/chat-rooms/{self.room_id}/join/"),
+                    headers=self.auth_headers(account), timeout=self.timeout
+                )
+
+    def auth_headers(self, account):
+        return {"Authorization": f"Bearer {account['token']}"} if account.get("token") else {}
+
+    # ----- scenarios ---------------------------------------------------
+
+    def timed(self, name, session, method, path, expected=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, self.url(path), timeout=self.timeout, **kwargs)
+            ok = response.status_code in expected
+            detail = None if ok else f"{response.status_code} {response.text[:120]}"
+        except requests.RequestException as exc:
+            response, ok, detail = None, False, repr(exc)
+        self.recorder.record(name, time.perf_counter() - started, ok, detail)
+        return response if ok else None
+
+    def browse(self, session, rng, account):
+        # The default order is keyset-paginated; an explicit ordering falls back to page numbers
+        if rng.random() < BROWSE_SORTED_SHARE:
+            name, params = "browse.sorted", {"ordering": rng.choice(["price", "-price", "-rating"])}
+        else:
+            name, params = "browse", {}
+        response = self.timed(name, session, "GET", "/api/products/", params=params)
+        # Follow "next" for a second page, as infinite scroll does: a cursor for browse, ?page=2 for browse.sorted
+        if response is not None:
+            next_url = response.json().get("next")
+            if next_url:
+                self.timed(name, session, "GET", urlparse(next_url)._replace(scheme="", netloc="").geturl())
+
+    def product_detail(self, session, rng, account):
+        if not self.products:
+            return self.browse(session, rng, account)
+        product = rng.choice(self.products)
+        self.timed("product_detail", session, "GET", f"/api/products/{product['id']}/")
+
+    def search(self, session, rng, account):
+        term = rng.choice(self.search_terms)
+        self.timed("search", session, "GET", "/api/products/search/", params={"q": term[:rng.randint(3, len(term))]})
+
+    def checkout(self, session, rng, account):
+        if not self.products:
+            return
+        lines = [
+            {"id": p["id"], "title": p["title"], "price": p["price"], "quantity": rng.randint(1, 3)}
+            for p in rng.sample(self.products, min(len(self.products), rng.randint(1, 3)))
+        ]
+        total = round(sum(line["price"] * line["quantity"] for line in lines), 2)
+        self.timed("checkout", session, "POST", "/api/orders/", expected=(201,), headers=self.auth_headers(account), json={
+            "products": lines, "total_amount": f"{total:.2f}", "shipping_address": "1 Load Test Lane",
+            "payment_method": "credit_card",
+        })
+
+    def stats(self, session, rng, account):
+        self.timed(f"stats.{account['role']}", session, "GET", "/api/users/stats/", headers=self.auth_headers(account))
+
+    def graphql_analytics(self, session, rng, account):
+        response = self.timed("graphql_analytics", session, "POST", "/graphql/", json={"query": ANALYTICS_QUERY})
+        if response is not None and response.json().get("errors"):
+            self.recorder.record("graphql_analytics.errors", 0.0, ok=False, detail=str(response.json()["errors"])[:120])
+
+    def chat(self, session, rng, account):
+        """One socket session: connect, then time each message until its broadcast comes back"""
+        if self.room_id is None or not account.get("token"):
+            return
+        parsed = urlparse(self.base_url)
+        # Sockets authenticate with the account's access token; anonymous ones are refused
+        ws_url = (f"{'wss' if parsed.scheme == 'https' else 'ws'}://{parsed.netloc}/ws/chat/{self.room_id}/"
+                  f"?{urlencode({'token': account['token']})}")
+        started = time.perf_counter()
+        try:
+            client = WebSocketClient(ws_url, origin=self.base_url, timeout=self.timeout)
+        except (OSError, ConnectionError) as exc:
+            self.recorder.record("chat.connect", time.perf_counter() - started, ok=False, detail=repr(exc))
+            return
+        self.recorder.record("chat.connect", time.perf_counter() - started)
+        try:
+            for i in range(CHAT_MESSAGES_PER_SESSION):
+                marker = f"load {account['email']} {rng.random():.12f} {i}"
+                sent = time.perf_counter()
+                try:
+                    client.send_json({"type": "message", "message": marker})
+                    # Other workers share the room; skip their broadcasts and presence events
+                    while client.recv_json().get("message") != marker:
+                        pass
+                    self.recorder.record("chat.message_rtt", time.perf_counter() - sent)
+                except (OSError, ConnectionError, ValueError) as exc:
+                    self.recorder.record("chat.message_rtt", time.perf_counter() - sent, ok=False, detail=repr(exc))
+                    return
+        finally:
+            client.close()
+
+    # ----- driver ------------------------------------------------------
+
+    def worker(self, index, deadline, max_iterations):
+        rng = random.Random(f"{self.seed}:{index}")
+        account = self.accounts[index % len(self.accounts)]
+        session = requests.Session()
+        scenarios, weights = zip(*SCENARIO_WEIGHTS.items())
+        iterations = 0
+        while (max_iterations is None or iterations < max_iterations) and time.monotonic() < deadline:
+            getattr(self, rng.choices(scenarios, weights=weights)[0])(session, rng, account)
+            iterations += 1
+
+    def run(self, duration, iterations):
+        deadline = time.monotonic() + (duration if duration else float("inf"))
+        threads = [
+            threading.Thread(target=self.worker, args=(i, deadline, iterations), daemon=True)
+            for i in range(self.concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    def report(self, elapsed, options):
+        scenarios = {}
+        total_requests = total_errors = 0
+        for name in sorted(self.recorder.latencies):
+            values = sorted(self.recorder.latencies[name])
+            if name.endswith(".errors"):
+                continue
+            errors = self.recorder.errors[name]
+            total_requests += len(values)
+            total_errors += errors
+            scenarios[name] = {
+                "requests": len(values),
+                "errors": errors,
+                "rps": round(len(values) / elapsed, 2) if elapsed else None,
+                "latency_ms": {
+                    **{f"p{pct}": round(percentile(values, pct) * 1000, 2) for pct in PERCENTILES},
+                    "mean": round(sum(values) / len(values) * 1000, 2),
+                    "max": round(values[-1] * 1000, 2),
+                },
+            }
+            if self.recorder.error_samples[name]:
+                scenarios[name]["error_samples"] = self.recorder.error_samples[name]
+        return {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "base_url": self.base_url,
+                "concurrency": self.concurrency,
+                "duration_s": options.duration,
+                "requests_per_worker": options.requests,
+                "seed": self.seed,
+                "elapsed_s": round(elapsed, 3),
+                "products_sampled": len(self.products),
+                "graphql_errors": self.recorder.errors.get("graphql_analytics.errors", 0),
+            },
+            "totals": {
+                "requests": total_requests,
+                "errors": total_errors,
+                "rps": round(total_requests / elapsed, 2) if elapsed else None,
+            },
+            "scenarios": scenarios,
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_database(scale, seed):
+    """Migrate and bulk seed the local database the server under test uses"""
+    manage = [sys.executable, "manage.py"]
+    subprocess.run(manage + ["migrate", "--noinput"], cwd=BACKEND_DIR, check=True)
+    subprocess.run(manage + ["seed_db", "--scale", scale, "--seed", str(seed)], cwd=BACKEND_DIR, check=True)
+
+
+def print_report(report):
+    print(f"\n{'scenario':<26} {'reqs':>7} {'errs':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in report["scenarios"].items():
+        latency = stats["latency_ms"]
+        print(
+            f"{name:<26} {stats['requests']:>7} {stats['errors']:>5} {stats['rps']:>8.1f} "
+            f"{latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f}"
+        )
+    totals = report["totals"]
+    print(f"\nTotal: {totals['requests']} requests, {totals['errors']} errors, {totals['rps']} req/s")
+
+
+def print_comparison(baseline, report):
+    """Per-scenario change from a previous report (negative latency change is better)"""
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    print(f"{'scenario':<26} {'rps':>18} {'p50 ms':>18} {'p95 ms':>18}")
+
+    def change(old, new):
+        if old in (None, 0) or new is None:
+            return f"{'n/a':>18}"
+        return f"{new:>8.1f} ({(new - old) / old:+6.1%})"
+
+    for name, stats in report["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            print(f"{name:<26} (new)")
+            continue
+        print(
+            f"{name:<26} {change(old['rps'], stats['rps'])} "
+            f"{change(old['latency_ms']['p50'], stats['latency_ms']['p50'])} "
+            f"{change(old['latency_ms']['p95'], stats['latency_ms']['p95'])}"
+        )
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="HarvestConnect load test")
+    parser.add_argument("--base-url", default=os.getenv("BACKEND_URL", "http://localhost:8000"))
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run (0 for no limit)")
+    parser.add_argument("--requests", type=int, default=None, help="Scenarios per virtual user")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the traffic mix")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    parser.add_argument("--prepare", metavar="SCALE", help="Migrate and run seed_db --scale SCALE first")
+    options = parser.parse_args()
+
+    if not options.duration and options.requests is None:
+        parser.error("--duration 0 needs --requests")
+
+    if options.prepare:
+        prepare_database(options.prepare, options.seed)
+
+    password = os.getenv("LOAD_TEST_PASSWORD", "Sheaves&Barley-2024")
+    load_test = LoadTest(options.base_url, options.concurrency, options.seed, password, options.timeout)
+    print("=" * 60)
+    print("HarvestConnect Load Test")
+    print("=" * 60)
+    print(f"Target: {options.base_url}  users: {options.concurrency}  seed: {options.seed}")
+    try:
+        load_test.setup()
+    except (requests.RequestException, RuntimeError) as exc:
+        print(f"❌ Setup failed: {exc}")
+        return 1
+
+    elapsed = load_test.run(options.duration, options.requests)
+    report = load_test.report(elapsed, options)
+    print_report(report)
+
+    if options.output:
+        Path(options.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Report written to {options.output}")
+    if options.compare:
+        print_comparison(json.loads(Path(options.compare).read_text()), report)
+
+    return 0 if report["totals"]["errors"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 'use client';
 
+import apiClient from '@/lib/api-client';
 import { useAuth } from '@/lib/auth-context';
 import { MessageSquare, Send, Sparkles } from 'lucide-react';
 import { useEffect, useRef, useState } from 'react';
@@ -18,8 +19,7 @@ export default function ChatWindow({ roomName }: { roomName: string }) {
   const scrollRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
-    const wsUrl = `${process.env.NEXT_PUBLIC_WS_URL || 'ws://localhost:8000'}/ws/chat/${roomName}/`;
-    socketRef.current = new WebSocket(wsUrl);
+    socketRef.current = new WebSocket(apiClient.getChatSocketUrl(roomName));
 
     socketRef.current.onmessage = (event) => {
       const data = JSON.parse(event.data);
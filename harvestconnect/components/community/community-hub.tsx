@@ -91,8 +91,7 @@ export default function CommunityHub({ onRefresh }: { onRefresh?: (refreshFn: ()
     });
 
     // WebSocket Setup
-    const wsUrl = `${process.env.NEXT_PUBLIC_WS_URL || 'ws://localhost:8000'}/ws/chat/${activeRoomId}/`;
-    socketRef.current = new WebSocket(wsUrl);
+    socketRef.current = new WebSocket(apiClient.getChatSocketUrl(activeRoomId));
 
     socketRef.current.onmessage = (event) => {
       const data = JSON.parse(event.data);
@@ -184,6 +184,13 @@ class APIClient {
     }
   }
 
+  public getChatSocketUrl(roomId: string | number): string {
+    const base = process.env.NEXT_PUBLIC_WS_URL || 'ws://localhost:8000';
+    const url = `${base}/ws/chat/${roomId}/`;
+    // Browsers can't set headers on WebSockets, so the access token goes in the query string
+    return this.token ? `${url}?token=${encodeURIComponent(this.token)}` : url;
+  }
+
   public getMediaUrl(path: string): string {
     if (!path) return '';
     if (path.startsWith('http')) return path;